@@ -1,104 +1,281 @@
 import requests
+import hashlib
+import json
 import logging
-from models import Artwork, Type, db, Favorite
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
+from cache import LRUCache, ResponseCache, MemoryCacheBackend, SingleFlight
+from metrics import observe_api_call
+from models import Artwork, db, artworks_ingested
+from recommend import get_suggestion_ids
+from sampling import sampler
+from search import search_artworks
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.sql import func
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 API_URL = "https://api.artic.edu/api/v1/artworks"
+ARTWORK_FIELDS = 'id,title,alt_titles,artist_display,date_start,date_end,date_display,place_of_origin,classification_titles,edition,color,dimensions,description,image_id,artwork_type_title,api_link,medium_display'
 
-def get_artwork_by_ids(artwork_ids):
-    """Fetch detailed info for multiple artworks by their IDs and save to the database."""
-    params = {
-        'ids': ','.join(map(str, artwork_ids)),
-        'fields': 'id,title,alt_titles,artist_display,date_start,date_end,date_display,place_of_origin,classification_titles,edition,color,dimensions,description,image_id,artwork_type_title,api_link,medium_display'
-    }
+# The AIC API allows 60 anonymous requests per minute per client
+API_RATE_LIMIT = 1.0
+API_RATE_BURST = 4
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+stats_lock = threading.Lock()
+
+# Searches answered by the local full-text index need at least this many hits before skipping the API
+LOCAL_SEARCH_MIN_RESULTS = 12
+
+# Read-through cache for search responses; swap the backend for SQLCacheBackend to share hits across workers
+SEARCH_CACHE_TTL = 300
+search_cache = ResponseCache(MemoryCacheBackend(maxsize=256), ttl=SEARCH_CACHE_TTL)
+
+# Artwork IDs the API reported as nonexistent, so repeated hits don't go back to the API until the TTL passes
+MISSING_ARTWORK_TTL = 600
+missing_artworks = LRUCache(maxsize=4096, ttl=MISSING_ARTWORK_TTL)
+artwork_flights = SingleFlight()
+
+# Shared keep-alive session so batches reuse pooled connections instead of reconnecting per call
+http = requests.Session()
+http.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=16))
+http.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, holding at most `capacity`."""
+
+    def __init__(self, rate=API_RATE_LIMIT, capacity=API_RATE_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_for = (1 - self.tokens) / self.rate
+            time.sleep(wait_for)
+
+
+def request_json(url, params, session=None, bucket=None, retries=3, backoff=0.5, stats=None):
+    """GET a JSON document, retrying 429/5xx responses and connection errors with exponential backoff.
+
+    Honors Retry-After on 429. Raises requests.RequestException once retries are exhausted."""
+    session = session or http
+    for attempt in range(retries + 1):
+        if bucket:
+            bucket.acquire()
+        if stats is not None:
+            with stats_lock:
+                stats['requests'] += 1
+        try:
+            response = session.get(url, params=params, timeout=30)
+            observe_api_call(response.elapsed.total_seconds())
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                response.raise_for_status()
+                return response.json()
+            delay = float(response.headers.get('Retry-After') or backoff * 2 ** attempt)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == retries:
+                raise
+            delay = backoff * 2 ** attempt
+
+        if stats is not None:
+            with stats_lock:
+                stats['retries'] += 1
+        time.sleep(delay)
+
+def save_artworks(data):
+    """Write a page of API payloads to the database in one batch and report the counts."""
     try:
-        response = requests.get(API_URL, params=params)
-        response.raise_for_status()
-    except requests.RequestException as e:
-        logger.error(f"API request failed: {e}")
-        return []
+        counts = Artwork.bulk_upsert(data)
+    except SQLAlchemyError as e:
+        db.session.rollback()  # Rollback the whole batch in case of error
+        logger.error(f"Error saving batch of {len(data)} artworks to the database: {e}")
+        return {'inserted': 0, 'updated': 0, 'unchanged': 0, 'failed': len(data)}
+
+    logger.info(f"Saved {len(data)} artworks: {counts['inserted']} inserted, {counts['updated']} updated, {counts['unchanged']} unchanged, {counts['failed']} failed.")
+    return counts
+
+def fetch_artwork(artwork_id):
+    """Fetch and save one artwork that isn't in the database; returns its payload or None.
+
+    Concurrent misses for the same ID share one API call, and IDs the API doesn't know are remembered
+    for MISSING_ARTWORK_TTL. Failed API calls are not remembered, so the next request retries."""
 
-    data = response.json().get('data', [])
-    logger.info(f"Fetched {len(data)} artworks from the API.")
+    if missing_artworks.get(artwork_id):
+        return None
 
-    for artwork_data in data:
+    def fetch():
         try:
-            artwork = Artwork.add_new_artwork(artwork_data)
-            db.session.commit()  # Ensure commit happens after each addition
-            logger.info(f"Added artwork {artwork.id} - {artwork.title} to the database.")
-        except SQLAlchemyError as e:
-            db.session.rollback()  # Rollback in case of error
-            logger.error(f"Error adding artwork {artwork_data.get('id')} to the database: {e}")
+            data = request_json(API_URL, {'ids': str(artwork_id), 'fields': ARTWORK_FIELDS}).get('data', [])
+        except (requests.RequestException, ValueError) as e:
+            logger.error(f"API request for artwork {artwork_id} failed: {e}")
+            return None
+        if not data:
+            missing_artworks.set(artwork_id, True)
+            return None
+        save_artworks(data)
+        return data[0]
 
-    return data
+    return artwork_flights.do(artwork_id, fetch)
+
+
+def forget_missing_artworks(sender, ids=(), **kwargs):
+    """Artworks ingested by a search or the worker are no longer missing."""
+    for artwork_id in ids:
+        missing_artworks.delete(artwork_id)
+
+
+artworks_ingested.connect(forget_missing_artworks, weak=False)
+
+def fetch_artworks_concurrently(start_id, end_id, batch_size, workers=4, rate=API_RATE_LIMIT, burst=API_RATE_BURST,
+                                api_url=None, session=None, keep_data=True, on_batch=None):
+    """Fetch the ID range [start_id, end_id) with a bounded pool of workers and save each batch as it lands.
+
+    Workers share one keep-alive session and one token bucket, so the pool never exceeds the API quota.
+    Database writes happen on the calling thread (which owns the app context) while the next batches are
+    still in flight. Returns a summary of throughput and failures; `artworks` holds the fetched payloads
+    unless keep_data is False (useful when seeding a large catalog). on_batch, if given, is called with
+    the running summary after each batch (used for job progress). api_url defaults to API_URL as it is
+    when called, so pointing the module at another server (e.g. bench/stub_api.py) takes effect."""
+    api_url = api_url or API_URL
+    bucket = TokenBucket(rate, burst)
+    stats = {'requests': 0, 'retries': 0}
+    summary = {'batches': 0, 'failed_batches': [], 'fetched': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0, 'failed': 0, 'artworks': []}
+    ranges = iter([(i, min(i + batch_size, end_id)) for i in range(start_id, end_id, batch_size)])
+    started = time.monotonic()
+
+    def fetch(batch):
+        params = {'ids': ','.join(map(str, range(*batch))), 'fields': ARTWORK_FIELDS, 'limit': batch_size}
+        return request_json(api_url, params, session=session, bucket=bucket, stats=stats).get('data', [])
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Keep at most two batches per worker in flight so fetched pages never pile up in memory
+        pending = {}
+        for batch in ranges:
+            pending[pool.submit(fetch, batch)] = batch
+            if len(pending) >= workers * 2:
+                break
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                batch = pending.pop(future)
+                next_batch = next(ranges, None)
+                if next_batch:
+                    pending[pool.submit(fetch, next_batch)] = next_batch
 
-def fetch_artworks_batches(start_id, end_id, batch_size):
-    """Fetch artworks in batches and save to the database."""
-    all_artworks = []
-    for i in range(start_id, end_id, batch_size):
-        batch_ids = range(i, min(i + batch_size, end_id))
-        artworks = get_artwork_by_ids(batch_ids)
-        all_artworks.extend(artworks)
-        logger.info(f"Fetched batch {i} to {min(i + batch_size, end_id)}, total artworks: {len(all_artworks)}")
-    return all_artworks
+                summary['batches'] += 1
+                try:
+                    data = future.result()
+                except (requests.RequestException, ValueError) as e:
+                    logger.error(f"Batch {batch[0]} to {batch[1]} failed: {e}")
+                    summary['failed_batches'].append(batch)
+                    data = None
+
+                if data is not None:
+                    counts = save_artworks(data)
+                    summary['fetched'] += len(data)
+                    for key in ('inserted', 'updated', 'unchanged', 'failed'):
+                        summary[key] += counts[key]
+                    if keep_data:
+                        summary['artworks'].extend(data)
+                if on_batch:
+                    on_batch(summary)
+
+    summary.update(stats)
+    summary['elapsed'] = time.monotonic() - started
+    summary['per_second'] = summary['fetched'] / summary['elapsed'] if summary['elapsed'] else 0.0
+    logger.info(f"Fetched {summary['fetched']} artworks in {summary['batches']} batches ({summary['per_second']:.1f}/s), "
+                f"{len(summary['failed_batches'])} batches failed, {summary['retries']} retries.")
+    return summary
+
+def search_cache_key(path, params):
+    """Cache key for an API call: the query is case- and whitespace-normalized, params are order-independent."""
+    params = dict(params)
+    if params.get('q'):
+        params['q'] = ' '.join(params['q'].lower().split())
+    return hashlib.sha1(json.dumps([path, params], sort_keys=True, default=str).encode()).hexdigest()
+
+def save_missing_artworks(data):
+    """Upsert only the payloads whose artworks are not in the database yet (one IN query to check)."""
+    ids = [artwork_data['id'] for artwork_data in data if 'id' in artwork_data]
+    existing = {artwork_id for (artwork_id,) in db.session.query(Artwork.id).filter(Artwork.id.in_(ids))}
+    missing = [artwork_data for artwork_data in data if artwork_data.get('id') not in existing]
+    if missing:
+        save_artworks(missing)
 
 def fetch_artworks_by_query(query=None, theme=None):
     """Fetch artworks by search query and save to the database."""
     params = {
-        'fields': 'id,title,alt_titles,artist_display,date_start,date_end,date_display,place_of_origin,classification_titles,edition,color,dimensions,description,image_id,artwork_type_title,api_link,medium_display',
+        'fields': ARTWORK_FIELDS,
         'limit': 100
     }
     if query:
         params['q'] = query
-   
+
+        # Answer from the local full-text index first
+        try:
+            local_results = search_artworks(query, limit=params['limit'])
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            logger.error(f"Local search failed, falling back to the API: {e}")
+            local_results = []
+        if len(local_results) >= LOCAL_SEARCH_MIN_RESULTS:
+            logger.info(f"Found {len(local_results)} artworks locally for the query '{query}'.")
+            return [artwork.to_dict() for artwork in local_results]
+
+    key = search_cache_key('search', params)
+    data = search_cache.get(key)
+    if data is not None:
+        logger.info(f"Search cache hit for the query '{query}'.")
+        save_missing_artworks(data)
+        return data
+
     try:
-        response = requests.get(f"{API_URL}/search", params=params)
-        response.raise_for_status()
-    except requests.RequestException as e:
+        data = request_json(f"{API_URL}/search", params).get('data', [])
+    except (requests.RequestException, ValueError) as e:
         logger.error(f"API request failed: {e}")
         return []
 
-    data = response.json().get('data', [])
     if not data:
         logger.info("No artworks found for the given query.")
     else:
         logger.info(f"Found {len(data)} artworks for the query '{query}'.")
 
-    for artwork_data in data:
-        try:
-            artwork = Artwork.add_new_artwork(artwork_data)
-            db.session.commit()  # Ensure commit happens after each addition
-            logger.info(f"Added artwork {artwork.id} - {artwork.title} to the database.")
-        except SQLAlchemyError as e:
-            db.session.rollback()  # Rollback in case of error
-            logger.error(f"Error adding artwork {artwork_data.get('id')} to the database: {e}")
+    save_artworks(data)
+    search_cache.set(key, data)
 
     return data
 
 def get_suggested_artworks(user, limit=8):
-    """Get suggested artworks based on a user's favorites or randomly if no favorites."""
+    """Get suggested artworks from the user's precomputed candidates (see recommend.py) or randomly if there are none."""
     try:
-        favorites = Favorite.query.filter_by(user_id=user.id).join(Artwork).all()
-        if favorites:
-            favorite_artwork_ids = [fav.artwork_id for fav in favorites]
-            favorite_artists = {fav.artwork.artist_display for fav in favorites}
-            favorite_types = {fav.artwork.artwork_type_title for fav in favorites}
-
-            suggested_artworks = Artwork.query.filter(
-                (Artwork.artist_display.in_(favorite_artists)) | 
-                (Artwork.artwork_type_title.in_(favorite_types)),
-                Artwork.id.notin_(favorite_artwork_ids)
-            ).order_by(func.random()).limit(limit).all()
+        # Built by favorite toggles and recommend.py, never on a page load
+        candidate_ids = get_suggestion_ids(user.id)
+        if candidate_ids:
+            # Vary the suggestions between page loads by sampling from the best candidates
+            suggested_artworks = Artwork.get_many(random.sample(candidate_ids, min(limit, len(candidate_ids))))
         else:
-            suggested_artworks = Artwork.query.order_by(func.random()).limit(limit).all()
+            suggested_artworks = sampler.sample(limit)
 
         logger.info(f"Suggested {len(suggested_artworks)} artworks for user {user.id}.")
         return suggested_artworks
     except SQLAlchemyError as e:
+        db.session.rollback()
         logger.error(f"Error fetching suggested artworks: {e}")
         return []
@@ -0,0 +1,6 @@
+"""Performance benchmarks for Curated: a seeded synthetic catalog (catalog.py), a local stub of the AIC
+API (stub_api.py) and a runner that times the main routes (run.py).
+
+- To run from the project root:
+- Type in:  python -m bench.run
+- Options:  --artworks N --users M --api-latency 0.05 --save-baseline (see python -m bench.run --help) """
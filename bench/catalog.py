@@ -0,0 +1,89 @@
+"""Seeded synthetic catalog: artworks shaped like AIC API payloads, users and their favorites.
+
+Every artwork is a pure function of (seed, id), so the stub API serves the same records the database
+was seeded with, including IDs past the seeded catalog (for the /artwork/<id> miss path)."""
+
+import random
+from sqlalchemy import insert
+from models import Artwork, Favorite, User, db
+
+# (name, weight): roughly the mix of the AIC collection
+TYPES = [('Painting', 30), ('Print', 25), ('Photograph', 18), ('Drawing and Watercolor', 10), ('Sculpture', 6),
+         ('Textile', 4), ('Vessel', 3), ('Book', 2), ('Coin', 1), ('Mask', 1)]
+PLACES = ['France', 'United States', 'Japan', 'Italy', 'England', 'Germany', 'China', 'Netherlands', 'Mexico', 'Spain']
+CLASSIFICATIONS = ['oil on canvas', 'etching', 'woodblock print', 'gelatin silver print', 'watercolor', 'bronze',
+                   'modern and contemporary art', 'european painting', 'asian art', 'photography', 'drawing']
+SUBJECTS = ['Landscape', 'Portrait', 'Still Life', 'Study', 'View', 'Interior', 'Harbor', 'Garden', 'Figure', 'Street']
+DETAILS = ['with River', 'at Dusk', 'in Blue', 'of a Woman', 'with Boats', 'near Paris', 'in Winter', 'with Flowers',
+           'of the Artist', 'at Night']
+FIRST_NAMES = ['Claude', 'Mary', 'Katsushika', 'Georgia', 'Paul', 'Edward', 'Frida', 'Vincent', 'Berthe', 'Winslow']
+LAST_NAMES = ['Monet', 'Cassatt', 'Hokusai', "O'Keeffe", 'Cezanne', 'Hopper', 'Kahlo', 'van Gogh', 'Morisot', 'Homer']
+
+SEARCH_TERMS = ['landscape', 'portrait', 'harbor', 'garden', 'winter', 'flowers', 'monet', 'hokusai', 'blue', 'night']
+
+
+def weighted(rng, choices):
+    names, weights = zip(*choices)
+    return rng.choices(names, weights)[0]
+
+
+def artist_name(rank):
+    return f"{FIRST_NAMES[rank % len(FIRST_NAMES)]} {LAST_NAMES[(rank // len(FIRST_NAMES)) % len(LAST_NAMES)]} {rank // 100 or ''}".strip()
+
+
+def make_artwork(seed, artwork_id, artists=500):
+    """API-shaped payload of one synthetic artwork."""
+    rng = random.Random(f"{seed}:{artwork_id}")
+    # A few prolific artists make most of the catalog (Zipf-like), like a real collection
+    artist = artist_name(min(int(rng.paretovariate(1.2)) - 1, artists - 1))
+    # Warm hues and muted saturation dominate paintings and prints
+    hue = int(rng.gauss(35, 40)) % 360 if rng.random() < 0.6 else rng.randrange(360)
+    start = int(min(max(rng.gauss(1850, 90), 1200), 2020))
+    return {
+        'id': artwork_id,
+        'title': f"{rng.choice(SUBJECTS)} {rng.choice(DETAILS)}",
+        'alt_titles': None,
+        'artist_display': artist,
+        'date_start': start,
+        'date_end': start + rng.randrange(0, 10),
+        'date_display': str(start),
+        'place_of_origin': rng.choice(PLACES),
+        'classification_titles': rng.sample(CLASSIFICATIONS, rng.randrange(1, 4)),
+        'edition': None,
+        'color': {'h': hue, 's': int(min(max(rng.gauss(40, 20), 0), 100)), 'l': int(min(max(rng.gauss(50, 15), 0), 100)),
+                  'percentage': round(rng.random(), 3), 'population': rng.randrange(1, 500)},
+        'dimensions': f"{rng.randrange(10, 200)} x {rng.randrange(10, 200)} cm",
+        'description': f"<p>{rng.choice(SUBJECTS)} by {artist}.</p>",
+        'image_id': f"{rng.getrandbits(64):016x}-bench",
+        'artwork_type_title': weighted(rng, TYPES),
+        'api_link': f"https://api.artic.edu/api/v1/artworks/{artwork_id}",
+        'medium_display': rng.choice(CLASSIFICATIONS),
+        'updated_at': f"2024-0{rng.randrange(1, 10)}-1{rng.randrange(0, 10)}T00:00:00Z",
+    }
+
+
+def seed_catalog(seed=42, artworks=5000, users=200, favorites_per_user=25, batch_size=1000):
+    """Fill an empty database with the synthetic catalog; returns the user IDs."""
+    for start in range(1, artworks + 1, batch_size):
+        Artwork.bulk_upsert([make_artwork(seed, artwork_id) for artwork_id in range(start, min(start + batch_size, artworks + 1))])
+
+    # One shared password hash: hashing per user would dominate seeding time and isn't what's measured
+    password = User.signup('bench_template', 'template@bench.test', 'benchmark', None, 'Bench').password
+    db.session.rollback()
+    db.session.execute(insert(User), [
+        {'username': f"bench{i}", 'email': f"bench{i}@bench.test", 'password': password, 'first_name': f"Bench {i}"}
+        for i in range(users)
+    ])
+    user_ids = [user_id for (user_id,) in db.session.query(User.id).order_by(User.id)]
+
+    # Popular artworks collect most favorites
+    rng = random.Random(seed)
+    rows = []
+    for user_id in user_ids:
+        count = min(int(rng.expovariate(1 / favorites_per_user)), artworks)
+        liked = {min(int(rng.paretovariate(0.8)), artworks) for _ in range(count)}
+        rows += [{'user_id': user_id, 'artwork_id': artwork_id} for artwork_id in liked]
+    if rows:
+        db.session.execute(insert(Favorite), rows)
+    db.session.commit()
+    return user_ids
@@ -0,0 +1,199 @@
+"""Benchmark runner: seeds a fresh database, points the app at the stub API and times each scenario.
+
+For every scenario it reports p50/p95/mean latency, SQL statements per request and the peak Python
+memory allocated while serving it, writes the results as JSON and compares them with a saved baseline.
+
+- To run from the project root:
+- Type in:  python -m bench.run
+- Save a baseline:  python -m bench.run --save-baseline
+- Fail on regressions (e.g. in CI):  python -m bench.run --max-regression 0.2 """
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from bench.catalog import SEARCH_TERMS, seed_catalog
+from bench.stub_api import StubAPI
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+RESULTS_PATH = os.path.join(os.path.dirname(__file__), 'results.json')   # Git-ignored; the baseline is committed
+MEMORY_SAMPLES = 20
+
+sql_statements = 0
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def count_statement(*args):
+    global sql_statements
+    sql_statements += 1
+
+
+def scenarios(args, user_ids):
+    """name -> function(client, i) issuing the i-th request of the scenario."""
+    rng = random.Random(args.seed)
+    artwork_ids = [rng.randrange(1, args.artworks + 1) for _ in range(args.warmup + args.requests + MEMORY_SAMPLES)]
+    return {
+        'dashboard': lambda client, i: client.get('/dashboard'),
+        'explore': lambda client, i: client.get(f'/explore?seed={args.seed}&page={i % max(args.artworks // 36, 1)}'),
+        'results': lambda client, i: client.get(f'/results?query={SEARCH_TERMS[i % len(SEARCH_TERMS)]}'),
+        'search': lambda client, i: client.post('/dashboard', data={'query': SEARCH_TERMS[i % len(SEARCH_TERMS)], 'submit': 'Search'}),
+        'category': lambda client, i: client.get('/category?type=Painting'),
+        'artwork': lambda client, i: client.get(f'/artwork/{artwork_ids[i]}'),
+        # In the API but not yet in the database: fetched once, then served locally
+        'artwork_miss': lambda client, i: client.get(f'/artwork/{args.artworks + 1 + i}'),
+        # Unknown to the API too (see bench/stub_api.py); repeats are answered by the negative cache
+        'artwork_unknown': lambda client, i: client.get(f'/artwork/{args.artworks * 2 + 1 + i % 10}'),
+        'favorite_toggle': lambda client, i: client.post(f'/artwork/{artwork_ids[i]}/favorite'),
+    }
+
+
+def measure(client, request, user_ids, start, count):
+    """Issue `count` requests as rotating users; returns per-request (seconds, SQL statements, status)."""
+    global sql_statements
+    samples = []
+    for i in range(start, start + count):
+        with client.session_transaction() as session:
+            session['curr_user'] = user_ids[i % len(user_ids)]
+        sql_statements = 0
+        started = time.perf_counter()
+        response = request(client, i)
+        samples.append((time.perf_counter() - started, sql_statements, response.status_code))
+    return samples
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def run(args):
+    from app import create_app
+    import api
+    from models import db
+    from search import init_search_index
+
+    logging.getLogger().setLevel(logging.WARNING)  # Per-request INFO logs would dominate the timings
+    random.seed(args.seed)
+    workdir = tempfile.mkdtemp(prefix='curated-bench-')
+    database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    results = {}
+
+    with StubAPI(seed=args.seed, known=args.artworks, latency=args.api_latency) as stub:
+        api.API_URL = f"{stub.url}/api/v1/artworks"
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': database_url, 'SQLALCHEMY_BINDS': {}, 'SECRET_KEY': 'bench', 'WTF_CSRF_ENABLED': False,
+            'IIIF_URL': f"{stub.url}/iiif/2", 'IMAGE_CACHE_DIR': os.path.join(workdir, 'images'),
+            'SLOW_REQUEST_SECONDS': float('inf'),
+        })
+
+        with app.app_context():
+            db.create_all()
+            init_search_index()
+            db.session.commit()
+            if db.session.execute(db.text('SELECT count(*) FROM artworks')).scalar():
+                sys.exit("The benchmark database must be empty.")
+            started = time.perf_counter()
+            user_ids = seed_catalog(args.seed, args.artworks, args.users, args.favorites)
+            print(f"Seeded {args.artworks} artworks and {len(user_ids)} users in {time.perf_counter() - started:.1f}s.")
+
+        client = app.test_client()
+        for name, request in scenarios(args, user_ids).items():
+            if args.only and name not in args.only:
+                continue
+            measure(client, request, user_ids, 0, args.warmup)
+            calls_before = stub.calls
+            samples = measure(client, request, user_ids, args.warmup, args.requests)
+            api_calls = stub.calls - calls_before
+
+            # Memory is traced in a separate pass; tracemalloc slows every allocation down
+            tracemalloc.start()
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+            measure(client, request, user_ids, args.warmup + args.requests, min(MEMORY_SAMPLES, args.requests))
+            peak = tracemalloc.get_traced_memory()[1] - base
+            tracemalloc.stop()
+
+            durations = [duration for duration, _, _ in samples]
+            results[name] = {
+                'p50_ms': round(percentile(durations, 0.5) * 1000, 3),
+                'p95_ms': round(percentile(durations, 0.95) * 1000, 3),
+                'mean_ms': round(statistics.mean(durations) * 1000, 3),
+                'sql_per_request': round(statistics.mean(statements for _, statements, _ in samples), 2),
+                'api_calls_per_request': round(api_calls / len(samples), 2),
+                'peak_memory_kb': round(peak / 1024, 1),
+                'errors': sum(1 for _, _, status in samples if status >= 400),
+            }
+
+    return {
+        'meta': {'seed': args.seed, 'artworks': args.artworks, 'users': args.users, 'favorites': args.favorites,
+                 'requests': args.requests, 'api_latency': args.api_latency, 'database': database_url.split(':')[0],
+                 'python': platform.python_version(), 'machine': platform.machine(), 'created_at': time.strftime('%Y-%m-%dT%H:%M:%S')},
+        'results': results,
+    }
+
+
+def compare(report, baseline, max_regression):
+    """Print each scenario next to the baseline; returns the scenarios that regressed past max_regression."""
+    regressions = []
+    print(f"{'scenario':<18}{'p50 ms':>10}{'p95 ms':>10}{'SQL/req':>9}{'peak KB':>10}   vs baseline (p95, SQL)")
+    for name, result in report['results'].items():
+        line = f"{name:<18}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['sql_per_request']:>9.1f}{result['peak_memory_kb']:>10.0f}"
+        before = baseline['results'].get(name) if baseline else None
+        if before:
+            change = (result['p95_ms'] - before['p95_ms']) / before['p95_ms'] if before['p95_ms'] else 0.0
+            line += f"   {change:+.0%}, {result['sql_per_request'] - before['sql_per_request']:+.1f}"
+            if change > max_regression or result['sql_per_request'] > before['sql_per_request']:
+                regressions.append(name)
+                line += '  REGRESSION'
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the main Curated routes against a synthetic catalog.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--artworks', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--favorites', type=int, default=25, help='Mean favorites per user')
+    parser.add_argument('--requests', type=int, default=200, help='Timed requests per scenario')
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--api-latency', type=float, default=0.05, help='Seconds the stub API waits per call')
+    parser.add_argument('--database-url', help='Empty database to benchmark on (default: a temporary SQLite file)')
+    parser.add_argument('--only', nargs='*', help='Scenarios to run')
+    parser.add_argument('--output', default=RESULTS_PATH)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='Store these results as the new baseline')
+    parser.add_argument('--max-regression', type=float, default=None, help='Exit with status 1 if p95 grows by more than this fraction')
+    args = parser.parse_args()
+
+    report = run(args)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['meta']['artworks'] != args.artworks or baseline['meta']['api_latency'] != args.api_latency:
+            print("Note: the baseline was recorded with a different catalog size or API latency.")
+    regressions = compare(report, baseline, args.max_regression if args.max_regression is not None else float('inf'))
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {args.baseline}.")
+    if regressions and args.max_regression is not None:
+        sys.exit(f"Regressed: {', '.join(regressions)}")
+
+
+if __name__ == '__main__':
+    main()
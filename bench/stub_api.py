@@ -0,0 +1,96 @@
+"""Local stand-in for the AIC artworks endpoints, serving the synthetic catalog with a configurable delay.
+
+- GET /api/v1/artworks?ids=1,2        records for the IDs; the API knows IDs up to twice `known` (the ones
+                                       past `known` are not in the seeded database) and reports larger IDs missing
+- GET /api/v1/artworks/search?q=...   up to `limit` records whose title or artist matches the query
+- GET /api/v1/artworks/search?params={...}   the keyset page sync.py asks for: records modified after
+                                       (updated_at, id), oldest first; every record has a synthetic updated_at
+- GET /iiif/2/<image_id>/full/<w>,/0/default.jpg   a placeholder image of about the right size"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from bench.catalog import make_artwork
+
+
+class StubAPI:
+    """Threaded HTTP server on a free localhost port; use as a context manager."""
+
+    def __init__(self, seed=42, known=5000, latency=0.05):
+        self.seed = seed
+        self.known = known
+        self.last_id = known * 2    # Highest ID the API has a record for
+        self.latency = latency
+        self.calls = 0
+        # Searchable text of the first 2000 records, like the relevance-ranked head of a real index
+        artworks = (make_artwork(seed, artwork_id) for artwork_id in range(1, min(known, 2000) + 1))
+        self.index = [(artwork['id'], f"{artwork['title']} {artwork['artist_display']}".lower()) for artwork in artworks]
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.handler())
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with stub.lock:
+                    stub.calls += 1
+                time.sleep(stub.latency)
+                url = urlparse(self.path)
+                params = {key: values[0] for key, values in parse_qs(url.query).items()}
+                if url.path.startswith('/iiif/'):
+                    width = int(url.path.split('/')[5].rstrip(','))
+                    return self.send(b'\xff\xd8' + b'\0' * width * 20, 'image/jpeg')
+                if url.path.endswith('/search') and 'params' in params:
+                    data = stub.changed_since(json.loads(params['params']))
+                elif url.path.endswith('/search'):
+                    data = stub.search(params.get('q', ''), int(params.get('limit', 10)))
+                else:
+                    ids = [int(artwork_id) for artwork_id in params.get('ids', '').split(',') if artwork_id]
+                    data = [make_artwork(stub.seed, artwork_id) for artwork_id in ids if artwork_id <= stub.last_id]
+                self.send(json.dumps({'data': data}).encode(), 'application/json')
+
+            def send(self, body, content_type):
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def search(self, query, limit):
+        query = query.lower()
+        matches = [artwork_id for artwork_id, text in self.index if query in text][:limit]
+        return [make_artwork(self.seed, artwork_id) for artwork_id in matches]
+
+    @staticmethod
+    def updated_at(artwork_id):
+        """Synthetic modification time; a few hundred records share each timestamp, like a bulk re-index."""
+        return f"2024-07-{artwork_id % 28 + 1:02d}T00:00:00Z"
+
+    def changed_since(self, body):
+        """The page for sync.changed_since_params(): records after (mark, last_id) in (updated_at, id) order."""
+        should = body['query']['bool']['should']
+        mark = should[0]['range']['updated_at']['gt']
+        last_id = should[1]['bool']['must'][1]['range']['id']['gt']
+        keys = sorted((self.updated_at(artwork_id), artwork_id) for artwork_id in range(1, self.known + 1))
+        page = [key for key in keys if key > (mark, last_id)][:body.get('limit', 10)]
+        return [{**make_artwork(self.seed, artwork_id), 'updated_at': updated_at} for updated_at, artwork_id in page]
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
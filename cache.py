@@ -0,0 +1,196 @@
+"""In-process and shared caches for Curated."""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from models import CachedResponse, db, upsert_insert
+
+
+class LRUCache:
+    """Thread-safe LRU cache with an optional per-entry TTL and hit/miss counters.
+
+    With maxbytes set, entries are also evicted once the summed sizeof() of the values exceeds it."""
+
+    def __init__(self, maxsize=256, ttl=None, maxbytes=None, sizeof=len):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self.bytes = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default when missing or expired."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or (entry[1] is not None and entry[1] < time.monotonic()):
+                self._discard(key)
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        """Store value under key, evicting the least recently used entries past maxsize."""
+        ttl = ttl if ttl is not None else self.ttl
+        with self.lock:
+            self._discard(key)
+            self.entries[key] = (value, time.monotonic() + ttl if ttl else None)
+            if self.maxbytes:
+                self.bytes += self.sizeof(value)
+            while len(self.entries) > self.maxsize or (self.maxbytes and self.bytes > self.maxbytes and len(self.entries) > 1):
+                self._discard(next(iter(self.entries)))
+
+    def delete(self, key):
+        with self.lock:
+            self._discard(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def _discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None and self.maxbytes:
+            self.bytes -= self.sizeof(entry[0])
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries), 'maxsize': self.maxsize, 'bytes': self.bytes}
+
+
+class MemoryCacheBackend:
+    """Per-process response cache backend."""
+
+    def __init__(self, maxsize=256):
+        self.store = LRUCache(maxsize=maxsize)
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def set(self, key, value, ttl):
+        self.store.set(key, value, ttl=ttl)
+
+    def clear(self):
+        self.store.clear()
+
+    def size(self):
+        return len(self.store)
+
+
+class SQLCacheBackend:
+    """Response cache backend stored in the api_cache table, shared by every gunicorn worker."""
+
+    def __init__(self, maxsize=1024, touch_after=timedelta(minutes=5)):
+        self.maxsize = maxsize
+        self.touch_after = touch_after
+
+    def get(self, key):
+        """The cached value, or None; expired rows are left for set() to prune."""
+        now = datetime.utcnow()
+        entry = db.session.get(CachedResponse, key)
+        if entry is None or entry.expires_at < now:
+            return None
+        if entry.accessed_at < now - self.touch_after:
+            # LRU order only needs touch_after precision. The touch runs on a connection of its own, so the
+            # caller's session is neither committed nor turned into a write (see replicas.py)
+            with db.engine.begin() as connection:
+                connection.execute(update(CachedResponse).where(
+                    CachedResponse.key == key, CachedResponse.accessed_at < now - self.touch_after
+                ).values(accessed_at=now))
+        return json.loads(entry.value)
+
+    def set(self, key, value, ttl):
+        now = datetime.utcnow()
+        row = {'key': key, 'value': json.dumps(value), 'expires_at': now + timedelta(seconds=ttl), 'accessed_at': now}
+        stmt = upsert_insert(CachedResponse.__table__).values(row)
+        db.session.execute(stmt.on_conflict_do_update(index_elements=['key'], set_={name: stmt.excluded[name] for name in row if name != 'key'}))
+
+        # Drop expired rows, then the least recently used ones past the size bound
+        CachedResponse.query.filter(CachedResponse.expires_at < now).delete(synchronize_session=False)
+        stale = db.session.query(CachedResponse.key).order_by(CachedResponse.accessed_at.desc()).offset(self.maxsize)
+        CachedResponse.query.filter(CachedResponse.key.in_(stale.scalar_subquery())).delete(synchronize_session=False)
+        db.session.commit()
+
+    def clear(self):
+        CachedResponse.query.delete()
+        db.session.commit()
+
+    def size(self):
+        return CachedResponse.query.count()
+
+
+class ResponseCache:
+    """Read-through cache for API responses with a TTL, a pluggable backend and hit/miss counters."""
+
+    def __init__(self, backend=None, ttl=300):
+        self.backend = backend or MemoryCacheBackend()
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.backend.set(key, value, self.ttl)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': self.backend.size(), 'backend': type(self.backend).__name__}
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key: the first caller runs the function and every caller
+    that arrives while it runs waits for, and shares, its result (or exception)."""
+
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key, function):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = {'done': threading.Event()}
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call['done'].wait()
+            if 'error' in call:
+                raise call['error']
+            return call['result']
+
+        try:
+            call['result'] = function()
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call['done'].set()
+        return call['result']
+
+    def stats(self):
+        return {'in_flight': len(self.calls), 'coalesced': self.coalesced}
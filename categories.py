@@ -0,0 +1,50 @@
+"""Category (artwork type) browsing for the dashboard.
+
+The dropdown reads a cached list of types with their artwork counts, computed by one grouped query
+and dropped whenever ingestion adds or updates artworks. Browsing a category is keyset-paginated:
+each page is a single indexed query on (type_id, id)."""
+
+from sqlalchemy import func
+from cache import LRUCache
+from models import Artwork, Type, artworks_ingested, db
+
+CATEGORY_PAGE_SIZE = 24
+
+type_facets_cache = LRUCache(maxsize=1, ttl=600)
+
+
+def type_facets():
+    """[(type name, artwork count)] for every type, sorted by name."""
+    facets = type_facets_cache.get('types')
+    if facets is None:
+        facets = db.session.query(Type.name, func.count(Artwork.id)).outerjoin(
+            Artwork, Artwork.type_id == Type.id
+        ).group_by(Type.name).order_by(Type.name).all()
+        facets = [(name, count) for name, count in facets]
+        type_facets_cache.set('types', facets)
+    return facets
+
+
+def invalidate_type_facets(*args, **kwargs):
+    type_facets_cache.clear()
+
+
+artworks_ingested.connect(invalidate_type_facets, weak=False)
+
+
+def browse_type(type_name, after_id=0, limit=CATEGORY_PAGE_SIZE):
+    """One page of artworks of the given type with IDs greater than after_id.
+
+    Returns (artworks, next_after_id); next_after_id is None on the last page and artworks is None
+    when the type does not exist."""
+    type_instance = Type.query.filter_by(name=type_name).first()
+    if not type_instance:
+        return None, None
+
+    artworks = Artwork.query.filter(
+        Artwork.type_id == type_instance.id, Artwork.id > after_id
+    ).order_by(Artwork.id).limit(limit + 1).all()
+
+    if len(artworks) > limit:
+        return artworks[:limit], artworks[limit - 1].id
+    return artworks, None
@@ -0,0 +1,158 @@
+"""Color similarity search over artwork HSL colors.
+
+Artworks' dominant HSL colors are kept in an in-memory NumPy index as CIELAB coordinates, so a search
+ranks the whole catalog with one vectorized distance computation. Converting through Lab makes the
+distance perceptual and handles hue wraparound (h=359 sits next to h=0).
+
+Ingests in this process update the index right away (artworks_ingested). Artworks saved by other
+processes (the jobs.py worker, sync.py, import_dump.py, other gunicorn workers) are picked up by their
+updated_at at most CATCH_UP_SECONDS later."""
+
+import threading
+import time
+from datetime import timedelta
+import numpy as np
+from sqlalchemy import func
+from models import Artwork, artworks_ingested, db, parse_hsl
+
+# Lab distance (CIE76 delta E) beyond which a color no longer counts as a match
+COLOR_MATCH_DISTANCE = 35.0
+CATCH_UP_SECONDS = 60
+CATCH_UP_OVERLAP = timedelta(minutes=5)   # Rows committed late by long ingest transactions carry older stamps
+
+
+def hsl_to_lab(h, s, l):
+    """Vectorized HSL (degrees, percent, percent) to CIELAB (D65) conversion."""
+    h = np.asarray(h, dtype=np.float64) % 360
+    s = np.asarray(s, dtype=np.float64) / 100
+    l = np.asarray(l, dtype=np.float64) / 100
+
+    # HSL -> sRGB
+    a = s * np.minimum(l, 1 - l)
+    channels = []
+    for n in (0, 8, 4):
+        k = (n + h / 30) % 12
+        channels.append(l - a * np.clip(np.minimum(k - 3, 9 - k), -1, 1))
+    rgb = np.stack(channels, axis=-1)
+
+    # sRGB -> linear RGB -> XYZ, normalized by the D65 white point
+    rgb = np.where(rgb > 0.04045, ((rgb + 0.055) / 1.055) ** 2.4, rgb / 12.92)
+    xyz = rgb @ np.array([[0.4124, 0.2126, 0.0193],
+                          [0.3576, 0.7152, 0.1192],
+                          [0.1805, 0.0722, 0.9505]])
+    xyz = xyz / np.array([0.95047, 1.0, 1.08883])
+
+    # XYZ -> Lab
+    f = np.where(xyz > 216 / 24389, np.cbrt(xyz), (24389 / 27 * xyz + 16) / 116)
+    return np.stack([116 * f[..., 1] - 16, 500 * (f[..., 0] - f[..., 1]), 200 * (f[..., 1] - f[..., 2])], axis=-1)
+
+
+class ColorIndex:
+    """In-memory Lab color index of every artwork with a known color, updated incrementally on ingest."""
+
+    def __init__(self, catch_up_seconds=CATCH_UP_SECONDS):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.lab = np.empty((0, 3), dtype=np.float64)
+        self.positions = {}
+        self.built = False
+        self.catch_up_seconds = catch_up_seconds
+        self.updated_through = None     # Newest updated_at the index has seen
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+    def build(self):
+        """Load every artwork color from the typed HSL columns."""
+        self.updated_through = db.session.query(func.max(Artwork.updated_at)).scalar()
+        self.checked_at = time.monotonic()
+        rows = db.session.query(Artwork.id, Artwork.color_h, Artwork.color_s, Artwork.color_l).filter(Artwork.color_h.isnot(None)).all()
+        with self.lock:
+            self.ids = np.array([row[0] for row in rows], dtype=np.int64)
+            self.lab = hsl_to_lab([row[1] for row in rows], [row[2] for row in rows], [row[3] for row in rows]).reshape(-1, 3)
+            self.positions = {int(artwork_id): i for i, artwork_id in enumerate(self.ids)}
+            self.built = True
+
+    def add(self, ids):
+        """Insert or refresh the given artworks without rebuilding the whole index."""
+        if not self.built:
+            return
+        rows = db.session.query(Artwork.id, Artwork.color_h, Artwork.color_s, Artwork.color_l).filter(Artwork.id.in_(ids), Artwork.color_h.isnot(None)).all()
+        if not rows:
+            return
+        lab = hsl_to_lab([row[1] for row in rows], [row[2] for row in rows], [row[3] for row in rows]).reshape(-1, 3)
+        with self.lock:
+            new_ids, new_lab = [], []
+            for row, row_lab in zip(rows, lab):
+                position = self.positions.get(row[0])
+                if position is None:
+                    self.positions[row[0]] = len(self.ids) + len(new_ids)
+                    new_ids.append(row[0])
+                    new_lab.append(row_lab)
+                else:
+                    self.lab[position] = row_lab
+            if new_ids:
+                self.ids = np.concatenate([self.ids, np.array(new_ids, dtype=np.int64)])
+                self.lab = np.vstack([self.lab, np.array(new_lab)])
+
+    def catch_up(self):
+        """Add the artworks other processes saved since the index last looked, at most every catch_up_seconds."""
+        if time.monotonic() - self.checked_at < self.catch_up_seconds:
+            return
+        self.checked_at = time.monotonic()
+        query = db.session.query(Artwork.id, Artwork.updated_at).filter(Artwork.updated_at.isnot(None))
+        if self.updated_through is not None:
+            query = query.filter(Artwork.updated_at > self.updated_through - CATCH_UP_OVERLAP)
+        rows = query.all()
+        if rows:
+            self.updated_through = max(updated_at for _, updated_at in rows)
+            self.add([artwork_id for artwork_id, _ in rows])
+
+    def search(self, h, s, l, k=36, max_distance=COLOR_MATCH_DISTANCE):
+        """Return [(artwork_id, distance)] for the k closest colors, nearest first."""
+        if not self.built:
+            self.build()
+        else:
+            self.catch_up()
+        with self.lock:
+            ids, lab = self.ids, self.lab
+        if not len(ids):
+            return []
+
+        distances = np.linalg.norm(lab - hsl_to_lab(h, s, l), axis=1)
+        k = min(k, len(ids))
+        nearest = np.argpartition(distances, k - 1)[:k]
+        nearest = nearest[np.argsort(distances[nearest])]
+        return [(int(ids[i]), float(distances[i])) for i in nearest if max_distance is None or distances[i] <= max_distance]
+
+    def on_ingested(self, sender, ids=(), **kwargs):
+        self.add(ids)
+
+
+color_index = ColorIndex()
+artworks_ingested.connect(color_index.on_ingested, weak=False)
+
+
+def search_by_color(color, k=36):
+    """Top-k artworks closest to an {'h', 's', 'l'} color, ranked by perceptual distance."""
+    return Artwork.get_many(artwork_id for artwork_id, _ in color_index.search(color['h'], color['s'], color['l'], k=k))
+
+
+def backfill_color_columns(batch_size=1000):
+    """Fill color_h/color_s/color_l for artworks stored before the typed color columns existed."""
+    updated = 0
+    last_id = 0
+    while True:
+        rows = db.session.query(Artwork.id, Artwork.color).filter(
+            Artwork.id > last_id, Artwork.color_h.is_(None), Artwork.color.isnot(None)
+        ).order_by(Artwork.id).limit(batch_size).all()
+        if not rows:
+            return updated
+        last_id = rows[-1][0]
+
+        mappings = []
+        for artwork_id, color in rows:
+            h, s, l = parse_hsl(color)
+            if h is not None:
+                mappings.append({'id': artwork_id, 'color_h': h, 'color_s': s, 'color_l': l})
+        db.session.bulk_update_mappings(Artwork, mappings)
+        db.session.commit()
+        updated += len(mappings)
@@ -0,0 +1,50 @@
+"""   Config.py
+
+Settings for create_app(), read from the environment so each deployment (and each gunicorn worker)
+configures the app without code changes:
+
+- DATABASE_URL            SQLAlchemy URI of the database (required)
+- DATABASE_REPLICA_URLS   Comma-separated URIs of read replicas (see replicas.py)
+- REPLICA_STICKY_SECONDS  How long a user's reads stay on the primary after they write
+- SECRET_KEY              Session signing key (required)
+- SEARCH_CACHE_BACKEND    'sql' (shared by all workers, default) or 'memory' (per worker)
+- SLOW_REQUEST_SECONDS    Log requests slower than this (see metrics.py)
+- IIIF_URL, IMAGE_CACHE_DIR  Image source and local derivative cache (see images.py)
+- WARM_START              '0' to skip loading the hot caches at startup """
+
+import os
+
+# Config key -> the environment variable that sets it; there are no defaults for these
+REQUIRED_SETTINGS = {'SQLALCHEMY_DATABASE_URI': 'DATABASE_URL', 'SECRET_KEY': 'SECRET_KEY'}
+
+
+def database_uri(url):
+    """Heroku/Render style postgres:// URLs; SQLAlchemy only accepts postgresql://"""
+    if url.startswith('postgres://'):
+        return 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def from_env(environ=os.environ):
+    """App config values from the environment."""
+    replica_urls = [url.strip() for url in environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+
+    return {
+        'SQLALCHEMY_DATABASE_URI': database_uri(environ['DATABASE_URL']) if environ.get('DATABASE_URL') else None,
+        'SQLALCHEMY_BINDS': {f'replica_{i}': database_uri(url) for i, url in enumerate(replica_urls)},
+        'REPLICA_STICKY_SECONDS': float(environ.get('REPLICA_STICKY_SECONDS', 10)),
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'SECRET_KEY': environ.get('SECRET_KEY'),
+        'DEBUG_TB_INTERCEPT_REDIRECTS': False,  # Prevent the debug toolbar from intercepting redirects
+        'SEARCH_CACHE_BACKEND': environ.get('SEARCH_CACHE_BACKEND', 'sql'),
+        'SLOW_REQUEST_SECONDS': float(environ.get('SLOW_REQUEST_SECONDS', 1.0)),
+        'WARM_START': environ.get('WARM_START', '1') != '0',
+        **{key: environ[key] for key in ('IIIF_URL', 'IMAGE_CACHE_DIR') if key in environ},
+    }
+
+
+def check_required(config):
+    """Fail at startup, rather than on the first request, when a required setting is missing."""
+    missing = [variable for key, variable in REQUIRED_SETTINGS.items() if not config.get(key)]
+    if missing:
+        raise RuntimeError(f"Set {' and '.join(missing)} in the environment (see config.py).")
@@ -5,12 +5,20 @@
 - Open Terminal
 - Type in:  python create_tables.py """
 
-from app import app
-from models import db
+from app import create_app
+from models import db, upgrade_schema
+from colors import backfill_color_columns
+from facets import backfill_classifications
+from search import init_search_index
 
-with app.app_context():
+with create_app(with_routes=False).app_context():
     db.create_all()
+    upgrade_schema()  # Columns and indexes added since an existing database was created
+    init_search_index()
+    db.session.commit()
     print("Tables created successfully.")
+    print(f"Backfilled colors for {backfill_color_columns()} artworks.")
+    print(f"Backfilled classifications for {backfill_classifications()} artworks.")
 
 
 
@@ -0,0 +1,175 @@
+"""Faceted filtering of the catalog by artwork type, classification, place of origin, era and color.
+
+Filters combine with AND and each one is an indexed condition: classifications through the
+artwork_classifications association table, eras through the (date_start, date_end) index and origins
+through the place_of_origin index. The facet counts shown beside the results come from a single UNION ALL
+of grouped queries, one branch per facet. Every facet is counted under all filters except its own, so
+after picking a value the other values of that facet still show how many artworks they would give."""
+
+import colorsys
+import json
+import re
+from sqlalchemy import String, case, cast, exists, func, literal, select, union_all
+from cache import LRUCache
+from models import Artwork, ArtworkClassification, Classification, Type, artworks_ingested, db
+
+FILTER_PAGE_SIZE = 24
+FACETS = ('type', 'classification', 'origin', 'era')
+FACET_LIMIT = 12              # Values listed per facet, most common first
+COLOR_FILTER_LIMIT = 2000     # Nearest colors a color filter keeps (see colors.py)
+HEX_COLOR = re.compile(r'#?([0-9a-fA-F]{6})')
+
+facet_counts_cache = LRUCache(maxsize=512, ttl=600)
+color_ids_cache = LRUCache(maxsize=64, ttl=60)   # Follows the color index catching up (see colors.py)
+
+
+def parse_filters(args):
+    """Filters from request args: type, classification, origin, date_from, date_to (years) and color (#rrggbb)."""
+    filters = {}
+    for name in ('type', 'classification', 'origin'):
+        value = (args.get(name) or '').strip()
+        if value:
+            filters[name] = value
+    for name in ('date_from', 'date_to'):
+        value = args.get(name, type=int)
+        if value is not None:
+            filters[name] = value
+    color = HEX_COLOR.fullmatch(args.get('color') or '')
+    if color:
+        filters['color'] = f"#{color.group(1).lower()}"
+    return filters
+
+
+def hex_to_hsl(color):
+    """'#rrggbb' -> (h, s, l) in degrees and percent, the scale of the API's color values."""
+    r, g, b = (int(color[i:i + 2], 16) / 255 for i in (1, 3, 5))
+    h, l, s = colorsys.rgb_to_hls(r, g, b)
+    return round(h * 360), round(s * 100), round(l * 100)
+
+
+def color_ids(color):
+    """IDs of the artworks closest to a '#rrggbb' color; one filtered page asks for them once per facet."""
+    ids = color_ids_cache.get(color)
+    if ids is None:
+        from colors import color_index  # NumPy loads on first use
+        ids = [artwork_id for artwork_id, _ in color_index.search(*hex_to_hsl(color), k=COLOR_FILTER_LIMIT)]
+        color_ids_cache.set(color, ids)
+    return ids
+
+
+def conditions(filters, exclude=None):
+    """WHERE clauses on artworks for every filter except the `exclude` facet."""
+    clauses = []
+    if 'type' in filters and exclude != 'type':
+        clauses.append(Artwork.type_id == select(Type.id).where(Type.name == filters['type']).scalar_subquery())
+    if 'classification' in filters and exclude != 'classification':
+        clauses.append(exists().where(
+            ArtworkClassification.artwork_id == Artwork.id,
+            ArtworkClassification.classification_id == select(Classification.id).where(Classification.name == filters['classification'].lower()).scalar_subquery(),
+        ))
+    if 'origin' in filters and exclude != 'origin':
+        clauses.append(Artwork.place_of_origin == filters['origin'])
+    if exclude != 'era':
+        # An artwork belongs to an era when its date range overlaps it
+        if 'date_to' in filters:
+            clauses.append(Artwork.date_start <= filters['date_to'])
+        if 'date_from' in filters:
+            clauses.append(Artwork.date_end >= filters['date_from'])
+    if 'color' in filters:
+        clauses.append(Artwork.id.in_(color_ids(filters['color'])))
+    return clauses
+
+
+def filter_artworks(filters, after_id=0, limit=FILTER_PAGE_SIZE):
+    """One keyset page of artworks matching every filter, as (artworks, next_after_id) like browse_type."""
+    artworks = Artwork.query.filter(*conditions(filters), Artwork.id > after_id).order_by(Artwork.id).limit(limit + 1).all()
+    if len(artworks) > limit:
+        return artworks[:limit], artworks[limit - 1].id
+    return artworks, None
+
+
+def century(year):
+    """First year of the century of the given year column, as integer SQL (floor division for BC dates)."""
+    return case((year >= 0, year // 100), else_=(year - 99) // 100) * 100
+
+
+def facet_counts(filters):
+    """{facet: [(value, count)]} for the FACETS under the given filters, from one grouped query."""
+    key = json.dumps(filters, sort_keys=True)
+    counts = facet_counts_cache.get(key)
+    if counts is not None:
+        return counts
+
+    era = cast(century(Artwork.date_start), String).label('era')
+    queries = [
+        select(literal('type').label('facet'), Type.name.label('value'), func.count().label('count'))
+        .select_from(Artwork).join(Type, Artwork.type_id == Type.id)
+        .where(*conditions(filters, exclude='type')).group_by(Type.name),
+
+        select(literal('classification'), Classification.name, func.count())
+        .select_from(Artwork).join(ArtworkClassification, ArtworkClassification.artwork_id == Artwork.id)
+        .join(Classification, Classification.id == ArtworkClassification.classification_id)
+        .where(*conditions(filters, exclude='classification')).group_by(Classification.name),
+
+        select(literal('origin'), Artwork.place_of_origin, func.count())
+        .where(Artwork.place_of_origin.isnot(None), *conditions(filters, exclude='origin')).group_by(Artwork.place_of_origin),
+
+        select(literal('era'), era, func.count())
+        .where(Artwork.date_start.isnot(None), *conditions(filters, exclude='era')).group_by(era),
+    ]
+
+    counts = {facet: [] for facet in FACETS}
+    for facet, value, count in db.session.execute(union_all(*queries)):
+        counts[facet].append((value, count))
+    for facet, values in counts.items():
+        values.sort(key=lambda value: (-value[1], value[0]))
+        del values[FACET_LIMIT:]
+    counts['era'].sort(key=lambda value: int(value[0]))  # Oldest first
+
+    facet_counts_cache.set(key, counts)
+    return counts
+
+
+def era_label(start):
+    return f"{start}s" if start >= 0 else f"{-start}s BC"
+
+
+def facet_options(filters, counts):
+    """{facet: [(label, count, filter changes, active)]} for the facet lists; the changes select the value,
+    or clear it when it is already selected."""
+    options = {}
+    for facet in ('type', 'classification', 'origin'):
+        options[facet] = [(value, count, {facet: None if filters.get(facet) == value else value}, filters.get(facet) == value)
+                          for value, count in counts[facet]]
+    options['era'] = []
+    for value, count in counts['era']:
+        start = int(value)
+        active = filters.get('date_from') == start and filters.get('date_to') == start + 99
+        changes = {'date_from': None, 'date_to': None} if active else {'date_from': start, 'date_to': start + 99}
+        options['era'].append((era_label(start), count, changes, active))
+    return options
+
+
+def invalidate_facet_counts(*args, **kwargs):
+    facet_counts_cache.clear()
+    color_ids_cache.clear()
+
+
+artworks_ingested.connect(invalidate_facet_counts, weak=False)
+
+
+def backfill_classifications(batch_size=1000):
+    """Fill artwork_classifications for artworks stored before the table existed."""
+    linked = 0
+    last_id = 0
+    while True:
+        rows = db.session.query(Artwork.id, Artwork.classification_titles).filter(
+            Artwork.id > last_id, Artwork.classification_titles.isnot(None), Artwork.classification_titles != '',
+            ~exists().where(ArtworkClassification.artwork_id == Artwork.id),
+        ).order_by(Artwork.id).limit(batch_size).all()
+        if not rows:
+            return linked
+        last_id = rows[-1][0]
+        ArtworkClassification.replace(dict(rows))
+        db.session.commit()
+        linked += len(rows)
@@ -0,0 +1,56 @@
+"""   Gunicorn.conf.py
+
+Gunicorn settings, picked up automatically by `gunicorn app:app`.
+
+Each worker process serves GUNICORN_THREADS requests at a time (gthread), so requests waiting on the
+AIC API don't hold up the others, and concurrent misses for the same artwork or query within a worker
+share one API call (SingleFlight in cache.py). Processes never share in-flight calls; every worker
+coalesces its own threads' requests.
+
+With preload_app (GUNICORN_PRELOAD=1 or --preload) the app is built and its hot caches are loaded once
+in the master; workers fork from it and share that memory copy-on-write. Database connections are
+never shared across the fork: the master disposes its pool before forking and each worker drops the
+inherited connections without closing them (closing would end the master's sockets). """
+
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '0') == '1'
+
+
+def when_ready(server):
+    """Master: warm the caches, release DB connections, then freeze the heap before forking."""
+    if not server.cfg.preload_app:
+        return
+    import app as application
+    from models import db
+
+    application.warm_start(application.app)
+    with application.app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+    # Keep the garbage collector from touching (and so un-sharing) the preloaded objects in workers
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """Worker: forget any connections inherited from the master."""
+    if not server.cfg.preload_app:
+        return
+    import app as application
+    from models import db
+
+    with application.app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    """Worker without preload: warm its own caches."""
+    if not worker.cfg.preload_app:
+        import app as application
+        application.warm_start(application.app)
@@ -0,0 +1,128 @@
+"""HTTP-level caching: conditional GET for artwork pages, response compression and fingerprinted static files.
+
+- Artwork pages carry a weak ETag built from the artwork's content version, the viewer's favorite state
+  and the deploy's asset version, plus Last-Modified from artworks.updated_at, so a browser or CDN
+  revalidating an unchanged page gets a 304 without the page being rendered. Only the ETag can answer
+  304: Last-Modified does not change when the viewer logs in, likes the artwork or a deploy lands.
+- Text responses above COMPRESS_MIN_BYTES are compressed with brotli (when the brotli package is
+  installed) or gzip, whichever the client accepts.
+- url_for('static', ...) adds a content fingerprint (?v=...) to every static URL; fingerprinted requests
+  are served with a one year immutable Cache-Control, and a changed file gets a new URL."""
+
+import gzip
+import hashlib
+import os
+from flask import current_app, g, make_response, request, session
+
+try:
+    import brotli
+except ImportError:  # Optional; gzip is used without it
+    brotli = None
+
+COMPRESSIBLE_TYPES = {'text/html', 'text/css', 'text/plain', 'application/json', 'application/javascript', 'text/javascript'}
+STATIC_MAX_AGE = 365 * 24 * 3600
+
+# Static filename -> (mtime, fingerprint)
+fingerprints = {}
+
+
+def fingerprint(filename):
+    """Short content hash of a static file, recomputed only when the file changes."""
+    path = os.path.join(current_app.static_folder, filename)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    cached = fingerprints.get(filename)
+    if cached is None or cached[0] != mtime:
+        with open(path, 'rb') as f:
+            cached = fingerprints[filename] = (mtime, hashlib.md5(f.read()).hexdigest()[:12])
+    return cached[1]
+
+
+def asset_version(app):
+    """Hash of every template and static file, so a deploy that changes the markup changes page ETags."""
+    digest = hashlib.md5()
+    for folder in (os.path.join(app.root_path, app.template_folder), app.static_folder):
+        for directory, subdirectories, files in os.walk(folder):
+            subdirectories.sort()
+            for name in sorted(files):
+                with open(os.path.join(directory, name), 'rb') as f:
+                    digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+def page_is_fresh(etag):
+    """Whether the client's cached copy matches the ETag.
+
+    If-Modified-Since alone never answers 304, since updated_at covers only the artwork's content."""
+    return bool(request.if_none_match) and request.if_none_match.contains_weak(etag)
+
+
+def conditional_page(version, last_modified, liked, render):
+    """304 when the client holds this version of the page, otherwise render() with validators attached.
+
+    Pages with pending flash messages are always rendered, since the messages show only once."""
+    etag = hashlib.md5(f"{version}:{bool(g.get('user'))}:{liked}:{current_app.config['ASSET_VERSION']}".encode()).hexdigest()
+    flashes = session.get('_flashes')
+
+    if not flashes and page_is_fresh(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = make_response(render())
+    if not flashes:
+        response.set_etag(etag, weak=True)
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True   # Cache, but revalidate every time
+    if g.get('user'):
+        response.cache_control.private = True
+    else:
+        response.cache_control.public = True
+    response.vary.add('Cookie')
+    return response
+
+
+def compress(response):
+    """Compress eligible responses for clients that accept it."""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    data = response.get_data()
+    if len(data) < current_app.config['COMPRESS_MIN_BYTES']:
+        return response
+
+    encodings = request.accept_encodings
+    if brotli is not None and encodings['br']:
+        response.set_data(brotli.compress(data, quality=5))
+        response.headers['Content-Encoding'] = 'br'
+    elif encodings['gzip']:
+        response.set_data(gzip.compress(data, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_http_cache(app):
+    """Register compression, static fingerprints and immutable static caching."""
+    app.config.setdefault('COMPRESS_MIN_BYTES', 1024)
+    app.config['ASSET_VERSION'] = asset_version(app)
+
+    @app.url_defaults
+    def add_static_fingerprint(endpoint, values):
+        if endpoint == 'static' and 'filename' in values and 'v' not in values:
+            version = fingerprint(values['filename'])
+            if version:
+                values['v'] = version
+
+    # after_request hooks run in reverse order, so compression registered first runs after every other hook
+    app.after_request(compress)
+
+    @app.after_request
+    def cache_static_forever(response):
+        if (request.endpoint == 'static' and response.status_code in (200, 304)
+                and request.args.get('v') == fingerprint(request.view_args['filename'])):
+            response.cache_control.no_cache = None
+            response.cache_control.max_age = STATIC_MAX_AGE
+            response.cache_control.public = True
+            response.cache_control.immutable = True
+        return response
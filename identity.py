@@ -0,0 +1,58 @@
+"""Lightweight identity of the logged-in user.
+
+The few fields templates need (id, username, first_name, image_url) travel in the signed session
+cookie, so most requests never load the users row (or its password hash). The identity is re-checked
+against the database every IDENTITY_TTL seconds, and the full User loads lazily when a route asks for
+a field the identity doesn't carry."""
+
+import time
+from flask import session
+from models import User, db
+
+IDENTITY_KEY = 'curr_identity'
+IDENTITY_TTL = 300
+IDENTITY_FIELDS = ('id', 'username', 'first_name', 'image_url')
+
+
+class CurrentUser:
+    """Session-backed stand-in for User; unknown attributes fall through to the lazily loaded row."""
+
+    def __init__(self, identity):
+        self.__dict__.update({field: identity.get(field) for field in IDENTITY_FIELDS})
+        self._record = None
+
+    @property
+    def record(self):
+        """The full User row, loaded on first use."""
+        if self._record is None:
+            self._record = db.session.get(User, self.id)
+        return self._record
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.record, name)
+
+
+def remember_identity(user):
+    """Store the user's identity fields in the session."""
+    identity = {field: getattr(user, field) for field in IDENTITY_FIELDS}
+    identity['checked_at'] = time.time()
+    session[IDENTITY_KEY] = identity
+    return identity
+
+
+def forget_identity():
+    session.pop(IDENTITY_KEY, None)
+
+
+def load_identity(user_id):
+    """CurrentUser for the session's user, or None when the user no longer exists."""
+    identity = session.get(IDENTITY_KEY)
+    if not identity or identity.get('id') != user_id or time.time() - identity.get('checked_at', 0) > IDENTITY_TTL:
+        user = db.session.get(User, user_id)
+        if user is None:
+            forget_identity()
+            return None
+        identity = remember_identity(user)
+    return CurrentUser(identity)
@@ -0,0 +1,149 @@
+"""Local proxy for artwork images from the AIC IIIF server.
+
+Cards and pages load /images/<image_id>/<width>.jpg instead of hotlinking the 843px IIIF image. Each
+width in IMAGE_WIDTHS is fetched from IIIF once (the IIIF server does the resizing) and kept in a disk
+cache shared by the app's workers, bounded to IMAGE_CACHE_MAX_BYTES by evicting the least recently
+served files. Responses carry an ETag and a one year immutable Cache-Control, since an IIIF image_id
+always names the same picture. Templates use image_url() and image_srcset() so browsers pick the
+smallest width a card needs."""
+
+import logging
+import os
+import re
+import threading
+from flask import abort, current_app, send_file, url_for
+from api import http
+from metrics import observe_api_call
+
+logger = logging.getLogger(__name__)
+
+IIIF_URL = 'https://www.artic.edu/iiif/2'
+IMAGE_WIDTHS = (200, 400, 600, 843)   # 843px is the largest width AIC serves for every image
+IMAGE_MAX_AGE = 365 * 24 * 3600
+IMAGE_ID_PATTERN = re.compile(r'^[0-9A-Za-z-]{8,64}$')
+
+
+class DiskImageCache:
+    """Directory of image files with a total size bound; file mtimes record the last time each was served."""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.bytes = None           # Scanned from disk on first use
+        self.lock = threading.Lock()
+        self.fetch_locks = {}       # One fetch per missing file at a time
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        """Path of the cached file, or None."""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, content):
+        """Store content atomically (workers may read the file while another writes it) and return its path."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(content)
+        os.replace(temp_path, path)
+
+        with self.lock:
+            if self.bytes is None:
+                self.bytes = self.scan_size()
+            else:
+                self.bytes += len(content)
+            if self.bytes > self.max_bytes:
+                self.evict()
+        return path
+
+    def scan_size(self):
+        return sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.is_file())
+
+    def evict(self):
+        """Delete the least recently served files until the cache is back under 90% of its bound."""
+        entries = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in os.scandir(self.directory) if entry.is_file())
+        self.bytes = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self.bytes <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+                self.bytes -= size
+            except FileNotFoundError:
+                pass
+        logger.info(f"Image cache evicted down to {self.bytes} bytes.")
+
+    def fetch_lock(self, key):
+        with self.lock:
+            return self.fetch_locks.setdefault(key, threading.Lock())
+
+    def stats(self):
+        return {'bytes': self.bytes or 0, 'max_bytes': self.max_bytes}
+
+
+def fetch_derivative(image_id, width):
+    """Download one width of an image from IIIF; None when IIIF has no such image."""
+    url = f"{current_app.config['IIIF_URL']}/{image_id}/full/{width},/0/default.jpg"
+    response = http.get(url, timeout=15)
+    observe_api_call(response.elapsed.total_seconds(), 'iiif')
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return response.content
+
+
+def serve_image(image_id, width):
+    """Response for /images/<image_id>/<width>.jpg, fetching the derivative on a cache miss."""
+    if width not in IMAGE_WIDTHS or not IMAGE_ID_PATTERN.match(image_id):
+        abort(404)
+
+    cache = current_app.extensions['image_cache']
+    key = f"{image_id}_{width}.jpg"
+    path = cache.get(key)
+    if path is None:
+        with cache.fetch_lock(key):
+            path = cache.get(key)
+            if path is None:
+                try:
+                    content = fetch_derivative(image_id, width)
+                except Exception as e:
+                    logger.error(f"IIIF fetch failed for {image_id} at {width}px: {e}")
+                    abort(502)
+                if content is None:
+                    abort(404)
+                path = cache.put(key, content)
+        cache.fetch_locks.pop(key, None)
+
+    response = send_file(path, mimetype='image/jpeg', etag=f"{image_id}-{width}", max_age=IMAGE_MAX_AGE, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def image_url(image_id, width=IMAGE_WIDTHS[-1]):
+    if not image_id:  # Some artworks have no image
+        return ''
+    return url_for('main.image', image_id=image_id, width=width)
+
+
+def image_srcset(image_id, max_width=IMAGE_WIDTHS[-1]):
+    """srcset listing every cached width up to max_width."""
+    if not image_id:
+        return ''
+    return ', '.join(f"{image_url(image_id, width)} {width}w" for width in IMAGE_WIDTHS if width <= max_width)
+
+
+def init_images(app):
+    """Set up the disk cache and the template helpers."""
+    app.config.setdefault('IIIF_URL', IIIF_URL)
+    app.config.setdefault('IMAGE_CACHE_DIR', os.path.join(app.instance_path, 'image_cache'))
+    app.config.setdefault('IMAGE_CACHE_MAX_BYTES', 512 * 1024 * 1024)
+    app.extensions['image_cache'] = DiskImageCache(app.config['IMAGE_CACHE_DIR'], app.config['IMAGE_CACHE_MAX_BYTES'])
+    app.jinja_env.globals.update(image_url=image_url, image_srcset=image_srcset)
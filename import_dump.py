@@ -0,0 +1,171 @@
+"""   Import_dump.py
+
+Bulk-load the catalog from a local AIC data dump (https://github.com/art-institute-of-chicago/api-data)
+instead of the rate-limited API. The dump is streamed, either an extracted directory or the .tar.bz2 /
+.tar.gz archive itself, so memory stays flat however large it is. Files are parsed and mapped with
+Artwork.normalize in worker processes, and the rows are written on the main process in batches of
+multi-row upserts (Artwork.upsert_rows). A checkpoint after every batch lets an interrupted import
+resume, and the newest updated_at in the dump becomes the delta sync high-water mark (see sync.py).
+
+- To import a dump:
+- Open Terminal
+- Type in:  python import_dump.py artic-api-data.tar.bz2
+- Options:  --workers N parse processes, --batch-size N rows per insert, --restart to ignore the checkpoint """
+
+import argparse
+import json
+import logging
+import os
+import tarfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import PurePosixPath
+from models import Artwork, SyncCheckpoint
+from sync import CHECKPOINT_NAME as SYNC_CHECKPOINT_NAME
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = 1000
+PROGRESS_SECONDS = 5
+
+
+def is_artwork_file(name):
+    """Artwork records live in json/artworks/<id>.json; the dump also holds agents, places, etc.
+
+    `name` is relative to the dump root, so the directories the dump was unpacked into never match."""
+    path = PurePosixPath(name.replace(os.sep, '/'))
+    return path.suffix == '.json' and len(path.parts) > 1 and path.parts[-2] == 'artworks'
+
+
+def read_entries(path, skip=0):
+    """Yield (name, raw bytes) of every artwork file in dump order, without reading the first `skip`."""
+    if os.path.isdir(path):
+        seen = 0
+        for directory, subdirectories, files in os.walk(path):
+            subdirectories.sort()
+            for name in sorted(files):
+                full_path = os.path.join(directory, name)
+                if not is_artwork_file(os.path.relpath(full_path, path)):
+                    continue
+                seen += 1
+                if seen > skip:
+                    with open(full_path, 'rb') as f:
+                        yield full_path, f.read()
+        return
+
+    # 'r|*' reads the archive as a stream, so it is never extracted or held in memory
+    seen = 0
+    with tarfile.open(path, 'r|*') as archive:
+        for member in archive:
+            if not member.isfile() or not is_artwork_file(member.name):
+                continue
+            seen += 1
+            if seen > skip:
+                yield member.name, archive.extractfile(member).read()
+
+
+def read_batches(entries, batch_size):
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def parse_batch(batch):
+    """Worker process: raw files -> (normalized rows, failed count, newest updated_at)."""
+    rows, failed, newest = [], 0, None
+    for name, raw in batch:
+        try:
+            data = json.loads(raw)
+            data = data.get('data', data)  # API-shaped files wrap the record in 'data'
+            rows.append(Artwork.normalize(data))
+        except (ValueError, KeyError, TypeError, AttributeError):
+            failed += 1
+            continue
+        updated_at = data.get('updated_at')
+        if updated_at and (newest is None or updated_at > newest):
+            newest = updated_at
+    return rows, failed, newest, len(batch)
+
+
+def import_dump(path, workers=None, batch_size=IMPORT_BATCH_SIZE, restart=False):
+    """Import every artwork file of a dump directory or archive; returns a summary."""
+    checkpoint_name = f"import:{os.path.abspath(path)}"[:200]
+    if restart:
+        SyncCheckpoint.clear(checkpoint_name)
+    checkpoint = SyncCheckpoint.load(checkpoint_name, {'files': 0, 'newest': None})
+    if checkpoint['files']:
+        logger.info(f"Resuming import of {path} after {checkpoint['files']} files.")
+
+    workers = workers or os.cpu_count() or 1
+    summary = {'files': checkpoint['files'], 'inserted': 0, 'updated': 0, 'unchanged': 0, 'failed': 0}
+    started = last_report = time.monotonic()
+    batches = read_batches(read_entries(path, skip=checkpoint['files']), batch_size)
+
+    def save(result):
+        """Main process: write one parsed batch, then advance the checkpoint past it."""
+        rows, failed, newest, files = result
+        counts = Artwork.upsert_rows(rows, failed=failed)
+        for key in ('inserted', 'updated', 'unchanged', 'failed'):
+            summary[key] += counts[key]
+        summary['files'] += files
+        if newest and (checkpoint['newest'] is None or newest > checkpoint['newest']):
+            checkpoint['newest'] = newest
+        checkpoint['files'] = summary['files']
+        SyncCheckpoint.save(checkpoint_name, checkpoint)
+
+    def report(final=False):
+        nonlocal last_report
+        now = time.monotonic()
+        if final or now - last_report >= PROGRESS_SECONDS:
+            last_report = now
+            elapsed = now - started
+            logger.info(f"Imported {summary['files']} files ({summary['inserted']} new, {summary['updated']} updated, "
+                        f"{summary['unchanged']} unchanged, {summary['failed']} failed) in {elapsed:.0f}s.")
+
+    if workers == 1:
+        for batch in batches:
+            save(parse_batch(batch))
+            report()
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Results are written in dump order so the checkpoint is exact; a bounded queue keeps memory flat
+            pending = deque()
+            for batch in batches:
+                pending.append(pool.submit(parse_batch, batch))
+                if len(pending) >= workers * 2:
+                    save(pending.popleft().result())
+                    report()
+            while pending:
+                save(pending.popleft().result())
+                report()
+
+    report(final=True)
+
+    # Let the delta sync pick up from the dump instead of walking the whole catalog through the API
+    sync_checkpoint = SyncCheckpoint.load(SYNC_CHECKPOINT_NAME)
+    if checkpoint['newest'] and (sync_checkpoint is None or sync_checkpoint['updated_at'] < checkpoint['newest']):
+        SyncCheckpoint.save(SYNC_CHECKPOINT_NAME, {'updated_at': checkpoint['newest'], 'last_id': 0})
+    SyncCheckpoint.clear(checkpoint_name)
+
+    summary['elapsed'] = time.monotonic() - started
+    return summary
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description='Import artworks from a local AIC data dump.')
+    parser.add_argument('path', help='Dump directory or .tar/.tar.gz/.tar.bz2 archive')
+    parser.add_argument('--workers', type=int, help='Parse processes (default: one per CPU)')
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help='Rows per insert statement')
+    parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint of an earlier run')
+    args = parser.parse_args()
+
+    with create_app(with_routes=False).app_context():
+        import_dump(args.path, workers=args.workers, batch_size=args.batch_size, restart=args.restart)
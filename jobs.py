@@ -0,0 +1,174 @@
+"""   Jobs.py
+
+Background catalog ingestion. Web requests only enqueue work (enqueue_id_range);
+a separate worker process claims queued jobs from the ingest_jobs table, runs them and records
+progress the UI can poll on /jobs/<id>. Duplicate requests for the same ID range merge
+into the job that is already queued or running. enqueue_sync() queues an incremental catalog sync
+(see sync.py), e.g. from a scheduler. A failed job, or an ID range with failed batches, is queued
+again after an exponential backoff until it runs out of attempts. Ingest jobs that add or change
+artworks queue a refresh of the similar artworks (see similar.py); the worker keeps the similarity
+matrix in memory between refreshes.
+
+- To run the worker:
+- Open Terminal
+- Type in:  python jobs.py """
+
+import json
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from api import fetch_artworks_concurrently
+from models import IngestJob, db
+from sync import sync
+
+logger = logging.getLogger(__name__)
+
+POLL_SECONDS = 2
+STALE_AFTER = timedelta(minutes=10)   # Running jobs without a heartbeat this long are reclaimed
+MAX_ATTEMPTS = 3
+RETRY_BACKOFF = timedelta(seconds=30)  # Doubled after every failed attempt
+
+
+def enqueue(kind, dedupe_key, params, total=None):
+    """Queue a job, or return the queued/running job doing the same work."""
+    existing = IngestJob.query.filter(IngestJob.dedupe_key == dedupe_key, IngestJob.status.in_(IngestJob.ACTIVE_STATUSES)).first()
+    if existing:
+        return existing
+
+    job = IngestJob(kind=kind, dedupe_key=dedupe_key, params=json.dumps(params), total=total, status='queued')
+    db.session.add(job)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another request queued the same work between our check and insert
+        db.session.rollback()
+        return IngestJob.query.filter(IngestJob.dedupe_key == dedupe_key, IngestJob.status.in_(IngestJob.ACTIVE_STATUSES)).first()
+    return job
+
+
+def enqueue_id_range(start_id, end_id, batch_size=100):
+    """Queue fetching the artwork IDs [start_id, end_id)."""
+    return enqueue('id_range', f"id_range:{start_id}:{end_id}",
+                   {'start_id': start_id, 'end_id': end_id, 'batch_size': batch_size}, total=end_id - start_id)
+
+
+def enqueue_sync():
+    """Queue an incremental catalog sync (see sync.py); a sync already queued or running absorbs it."""
+    return enqueue('delta_sync', 'delta_sync', {})
+
+
+def enqueue_similar_refresh():
+    """Queue recomputing the similar artworks of new and changed artworks."""
+    return enqueue('similar_refresh', 'similar_refresh', {})
+
+
+def claim_job():
+    """Atomically move the oldest queued (or abandoned running) job to running and return it."""
+    now = datetime.utcnow()
+    ready = (IngestJob.status == 'queued') & (IngestJob.run_after.is_(None) | (IngestJob.run_after <= now))
+    candidates = IngestJob.query.filter(
+        ready | ((IngestJob.status == 'running') & (IngestJob.heartbeat_at < now - STALE_AFTER))
+    ).order_by(IngestJob.id).limit(5).all()
+
+    for job in candidates:
+        # Compare-and-set on the state we saw, so two workers never claim the same job
+        condition = [IngestJob.id == job.id, IngestJob.status == job.status]
+        if job.status == 'running':
+            condition.append(IngestJob.heartbeat_at == job.heartbeat_at)
+        claimed = IngestJob.query.filter(*condition).update(
+            {'status': 'running', 'heartbeat_at': now, 'attempts': IngestJob.attempts + 1}, synchronize_session=False
+        )
+        db.session.commit()
+        if claimed:
+            db.session.refresh(job)
+            return job
+    return None
+
+
+def record_progress(job, progress):
+    job.progress = progress
+    job.heartbeat_at = datetime.utcnow()
+    db.session.commit()
+
+
+def retry_or_fail(job, error, result=None):
+    """Requeue a failed job after an exponential backoff, or mark it failed once it is out of attempts."""
+    if job.attempts < MAX_ATTEMPTS:
+        job.status = 'queued'
+        job.run_after = datetime.utcnow() + RETRY_BACKOFF * 2 ** (job.attempts - 1)
+    else:
+        job.status = 'failed'
+        job.finished_at = datetime.utcnow()
+    job.error = error
+    job.result = json.dumps(result) if result is not None else job.result
+    db.session.commit()
+    logger.error(f"Job {job.id} ({job.kind}) attempt {job.attempts} failed: {error}; {job.status}.")
+
+
+def run_job(job):
+    """Execute one claimed job and store its outcome."""
+    params = json.loads(job.params)
+    error = None
+    try:
+        if job.kind == 'id_range':
+            summary = fetch_artworks_concurrently(
+                params['start_id'], params['end_id'], params['batch_size'], keep_data=False,
+                on_batch=lambda summary: record_progress(job, min(summary['batches'] * params['batch_size'], job.total))
+            )
+            result = {key: summary[key] for key in ('fetched', 'inserted', 'updated', 'unchanged', 'failed', 'failed_batches', 'elapsed')}
+            if summary['failed_batches']:
+                # Retried as a whole; the batches already saved come back unchanged and are skipped.
+                # A range the API simply has no artworks for is done, not retried
+                error = f"{len(summary['failed_batches'])} of {summary['batches']} batches failed, {summary['fetched']} artworks fetched"
+        elif job.kind == 'delta_sync':
+            summary = sync(on_page=lambda summary: record_progress(job, summary['fetched']))
+            result = {key: summary[key] for key in ('fetched', 'inserted', 'updated', 'unchanged', 'failed', 'complete', 'elapsed')}
+            if not summary['complete']:
+                # Stopped by an API or database error; the retry resumes from the stored checkpoint
+                error = summary['error'] or 'Sync stopped before the last page'
+        elif job.kind == 'similar_refresh':
+            from similar import similarity_index  # NumPy loads in the worker only
+            result = similarity_index.refresh()
+        else:
+            raise ValueError(f"Unknown job kind {job.kind}")
+    except Exception as e:
+        db.session.rollback()
+        retry_or_fail(job, str(e))
+        return
+
+    if error:
+        retry_or_fail(job, error, result)
+    else:
+        job.status = 'done'
+        job.error = None
+        job.progress = job.total or job.progress
+        job.result = json.dumps(result)
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        logger.info(f"Job {job.id} ({job.kind}) finished: {result}")
+
+    if job.kind != 'similar_refresh' and (result.get('inserted') or result.get('updated')):
+        enqueue_similar_refresh()
+
+
+def work(poll_seconds=POLL_SECONDS, once=False):
+    """Worker loop: claim and run jobs until interrupted (or until the queue is empty when once=True)."""
+    logger.info(f"Ingestion worker {socket.gethostname()}:{os.getpid()} started.")
+    while True:
+        job = claim_job()
+        if job:
+            run_job(job)
+        elif once:
+            return
+        else:
+            time.sleep(poll_seconds)
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    with create_app(with_routes=False).app_context():
+        work()
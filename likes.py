@@ -0,0 +1,47 @@
+"""Favorite ("liked") state for artwork grids.
+
+Each worker caches a user's set of favorited artwork IDs, keyed by a favorites version token kept in the
+user's session. A toggle issues a new token, so whichever worker serves that browser's next request
+sees a fresh set, and the worker that handled the toggle carries its cached set over in place.
+Toggles made from another browser show up once the short TTL expires."""
+
+import secrets
+from flask import session
+from cache import LRUCache
+from models import Favorite, db
+
+FAVORITES_VERSION_KEY = 'favorites_version'
+
+favorite_sets = LRUCache(maxsize=2048, ttl=60)
+
+
+def favorite_ids(user_id):
+    """The user's favorited artwork IDs, loaded with one indexed query on a cache miss."""
+    key = (user_id, session.get(FAVORITES_VERSION_KEY))
+    ids = favorite_sets.get(key)
+    if ids is None:
+        ids = frozenset(artwork_id for (artwork_id,) in db.session.query(Favorite.artwork_id).filter_by(user_id=user_id))
+        favorite_sets.set(key, ids)
+    return ids
+
+
+def mark_liked(user, *grids):
+    """Set is_liked on every artwork (model or API payload dict) of the given grids before rendering."""
+    ids = favorite_ids(user.id) if user else frozenset()
+    for grid in grids:
+        for artwork in grid:
+            if isinstance(artwork, dict):
+                artwork['is_liked'] = artwork.get('id') in ids
+            else:
+                artwork.is_liked = artwork.id in ids
+
+
+def record_toggle(user_id, artwork_id, liked):
+    """Issue a new favorites version for this session and carry this worker's cached set over to it."""
+    version = session.get(FAVORITES_VERSION_KEY)
+    ids = favorite_sets.get((user_id, version))
+    favorite_sets.delete((user_id, version))
+
+    version = session[FAVORITES_VERSION_KEY] = secrets.token_hex(8)
+    if ids is not None:
+        favorite_sets.set((user_id, version), ids | {artwork_id} if liked else ids - {artwork_id})
@@ -0,0 +1,178 @@
+"""Per-request performance instrumentation and the /metrics endpoint.
+
+For every request this records wall time, SQL statement count and time (SQLAlchemy cursor events),
+outbound AIC API calls and latency, and template render time, per endpoint. Results are exposed as
+Prometheus-style histograms on /metrics; requests slower than SLOW_REQUEST_SECONDS are logged with
+their slowest queries."""
+
+import bisect
+import logging
+import threading
+import time
+from flask import Response, g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with one series per label value."""
+
+    def __init__(self, name, help_text, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, label, value):
+        with self.lock:
+            counts, total = self.series.get(label, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.series[label] = (counts, total + value)
+
+    def render(self, label_name):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = sorted(self.series.items())
+        for label, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_name}="{label}",le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_name}="{label}"}} {total}')
+            lines.append(f'{self.name}_count{{{label_name}="{label}"}} {cumulative}')
+        return lines
+
+
+request_duration = Histogram('curated_request_duration_seconds', 'Wall time per request.')
+sql_statements = Histogram('curated_sql_statements_per_request', 'SQL statements executed per request.', COUNT_BUCKETS)
+sql_duration = Histogram('curated_sql_duration_seconds', 'Total SQL time per request.')
+api_calls = Histogram('curated_api_calls_per_request', 'Outbound AIC API calls per request.', COUNT_BUCKETS)
+api_latency = Histogram('curated_api_call_duration_seconds', 'Latency of each outbound AIC API call.')
+render_duration = Histogram('curated_template_render_seconds', 'Template render time per request.')
+
+REQUEST_HISTOGRAMS = (request_duration, sql_statements, sql_duration, api_calls, render_duration)
+
+# Extra gauges (e.g. cache hit/miss counters) registered as name -> callable returning {label: value}
+gauges = {}
+
+
+def register_gauge(name, collect):
+    gauges[name] = collect
+
+
+def request_stats():
+    """The current request's counters, or None outside a request."""
+    if not has_request_context():
+        return None
+    stats = g.get('perf')
+    if stats is None:
+        stats = g.perf = {'started': time.perf_counter(), 'sql_count': 0, 'sql_time': 0.0, 'queries': [],
+                          'api_count': 0, 'api_time': 0.0, 'render_time': 0.0, 'render_stack': []}
+    return stats
+
+
+def observe_api_call(seconds, endpoint='aic'):
+    """Record one outbound API call; called by api.request_json from request and worker threads alike."""
+    api_latency.observe(endpoint, seconds)
+    stats = request_stats()
+    if stats is not None:
+        stats['api_count'] += 1
+        stats['api_time'] += seconds
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    stats = request_stats()
+    if stats is not None:
+        stats['sql_count'] += 1
+        stats['sql_time'] += elapsed
+        stats['queries'].append((elapsed, statement))
+
+
+@event.listens_for(Engine, 'handle_error')
+def discard_failed_statement(context):
+    """A failed statement never reaches after_cursor_execute; drop its start time so the stack stays paired."""
+    if context.connection is not None and context.statement is not None:
+        started = context.connection.info.get('query_started')
+        if started:
+            started.pop()
+
+
+def before_render(sender, template, context, **extra):
+    stats = request_stats()
+    if stats is not None:
+        stats['render_stack'].append(time.perf_counter())
+
+
+def after_render(sender, template, context, **extra):
+    stats = request_stats()
+    if stats is not None and stats['render_stack']:
+        started = stats['render_stack'].pop()
+        if not stats['render_stack']:  # Only count the outermost render; fragments render inside pages
+            stats['render_time'] += time.perf_counter() - started
+
+
+def render_metrics():
+    lines = []
+    for histogram in REQUEST_HISTOGRAMS:
+        lines += histogram.render('endpoint')
+    lines += api_latency.render('api')
+    for name, collect in sorted(gauges.items()):
+        lines.append(f"# TYPE {name} gauge")
+        for label, value in sorted(collect().items()):
+            lines.append(f'{name}{{key="{label}"}} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def init_metrics(app):
+    """Hook the instrumentation into the app and add the /metrics endpoint."""
+    app.config.setdefault('SLOW_REQUEST_SECONDS', 1.0)
+    app.config.setdefault('SLOW_REQUEST_QUERIES', 5)
+
+    before_render_template.connect(before_render, app, weak=False)
+    template_rendered.connect(after_render, app, weak=False)
+
+    @app.before_request
+    def start_request_timer():
+        request_stats()
+
+    @app.after_request
+    def record_request(response):
+        stats = request_stats()
+        endpoint = request.endpoint or 'unmatched'
+        if endpoint == 'metrics' or stats is None:
+            return response
+
+        elapsed = time.perf_counter() - stats['started']
+        request_duration.observe(endpoint, elapsed)
+        sql_statements.observe(endpoint, stats['sql_count'])
+        sql_duration.observe(endpoint, stats['sql_time'])
+        api_calls.observe(endpoint, stats['api_count'])
+        render_duration.observe(endpoint, stats['render_time'])
+
+        if elapsed >= app.config['SLOW_REQUEST_SECONDS']:
+            worst = sorted(stats['queries'], key=lambda query: -query[0])[:app.config['SLOW_REQUEST_QUERIES']]
+            logger.warning(
+                f"Slow request {request.method} {request.path} ({endpoint}): {elapsed:.3f}s, "
+                f"{stats['sql_count']} SQL statements in {stats['sql_time']:.3f}s, "
+                f"{stats['api_count']} API calls in {stats['api_time']:.3f}s, render {stats['render_time']:.3f}s"
+                + ''.join(f"\n  {duration * 1000:.1f} ms: {' '.join(statement.split())[:300]}" for duration, statement in worst)
+            )
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        """Prometheus text exposition of the request histograms and cache counters."""
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
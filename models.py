@@ -1,12 +1,25 @@
 """SQLAlchemy models for Curated."""
 
-from datetime import datetime
+from blinker import Namespace
+from datetime import datetime, timedelta
+import hashlib
 from flask_bcrypt import Bcrypt
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy import func, inspect, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 import json
+import logging
+from replicas import RoutingSession
+
+logger = logging.getLogger(__name__)
 
 bcrypt = Bcrypt()
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})  # Reads may go to a replica (see replicas.py)
+
+# Sent with the affected artwork IDs after artworks are added or updated, so caches and indexes can refresh
+signals = Namespace()
+artworks_ingested = signals.signal('artworks-ingested')
 
 ##########################################################################################################################################
 
@@ -21,6 +34,7 @@ class User(db.Model):
     email = db.Column(db.String(75), nullable=False, unique=True)
     first_name = db.Column(db.String, nullable=True)
     image_url = db.Column(db.Text, default="static/images/default-img.jpg")
+    suggestions_built_at = db.Column(db.DateTime, nullable=True)   # Last full build of the user's suggestion candidates
 
     favorites = db.relationship('Favorite', backref='user', cascade="all, delete-orphan")
     search_histories = db.relationship('SearchHistory', backref='searched_user', cascade="all, delete-orphan")
@@ -58,7 +72,7 @@ class Artwork(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String, nullable=False)
     alt_titles = db.Column(db.String, nullable=True)
-    artist_display = db.Column(db.String, nullable=True)
+    artist_display = db.Column(db.String, nullable=True, index=True)
     date_start = db.Column(db.Integer, nullable=True)
     date_end = db.Column(db.Integer, nullable=True)
     date_display = db.Column(db.String, nullable=True)
@@ -66,47 +80,122 @@ class Artwork(db.Model):
     classification_titles = db.Column(db.String, nullable=True)
     edition = db.Column(db.String, nullable=True)
     color = db.Column(db.String, nullable=True)
+    color_h = db.Column(db.Integer, nullable=True)
+    color_s = db.Column(db.Integer, nullable=True)
+    color_l = db.Column(db.Integer, nullable=True)
     dimensions = db.Column(db.String, nullable=True)
     description = db.Column(db.String, nullable=True)
     image_id = db.Column(db.String, nullable=True)
-    artwork_type_title = db.Column(db.String, nullable=True)
+    artwork_type_title = db.Column(db.String, nullable=True, index=True)
     api_link = db.Column(db.String, nullable=True)
     medium_display = db.Column(db.String, nullable=True)
-    type_id = db.Column(db.Integer, db.ForeignKey('types.id'), nullable=True)
+    type_id = db.Column(db.Integer, db.ForeignKey('types.id'), nullable=True, index=True)
+    content_hash = db.Column(db.String(32), nullable=True)   # Hash of the normalized values; unchanged payloads skip the write
+    updated_at = db.Column(db.DateTime, nullable=True, index=True)   # Last ingest that changed the content (Last-Modified of its page)
+
+    __table_args__ = (
+        db.Index('ix_artworks_color_hsl', 'color_h', 'color_s', 'color_l'),
+        db.Index('ix_artworks_date_range', 'date_start', 'date_end'),   # Era filter (see facets.py)
+        db.Index('ix_artworks_date_end', 'date_end'),
+        db.Index('ix_artworks_place_of_origin', 'place_of_origin'),
+    )
 
     @classmethod
-    def add_new_artwork(cls, data):
-        """Adds a new artwork entry to records."""
-        type_instance = Type.get_or_create(data.get('artwork_type_title'))  # Get or create the type
-        
-        # Convert color to JSON string if it's a dictionary
+    def get_many(cls, ids):
+        """Load artworks for a list of IDs with one IN query, keeping the order of the IDs."""
+        ids = list(ids)
+        if not ids:
+            return []
+        artworks = {artwork.id: artwork for artwork in cls.query.filter(cls.id.in_(ids))}
+        return [artworks[artwork_id] for artwork_id in ids if artwork_id in artworks]
+
+    def to_dict(self):
+        """Column values of this artwork, shaped like an API payload for templates and JSON."""
+        return {column.name: getattr(self, column.name) for column in self.__table__.columns}
+
+    @staticmethod
+    def normalize(data):
+        """Map one API artwork payload onto artworks column values."""
+
+        # Convert color to JSON string if it's a dictionary and keep its HSL values as typed columns
         color = json.dumps(data.get('color')) if isinstance(data.get('color'), dict) else data.get('color')
-        
+        hsl = parse_hsl(data.get('color'))
+
         # Handle possible missing fields with defaults
-        artwork = cls(
+        row = dict(
             id=data['id'],
-            title=data.get('title', 'Untitled'),
+            title=data.get('title') or 'Untitled',
             alt_titles=data.get('alt_titles', None),
             artist_display=data.get('artist_display', 'Unknown Artist'),
             date_start=data.get('date_start', None),
             date_end=data.get('date_end', None),
             date_display=data.get('date_display', 'Unknown Date'),
             place_of_origin=data.get('place_of_origin', 'Unknown Place'),
-            classification_titles=', '.join(data.get('classification_titles', [])),
+            classification_titles=', '.join(data.get('classification_titles') or []),
             edition=data.get('edition', 'Unknown Edition'),
             color=color,
+            color_h=hsl[0],
+            color_s=hsl[1],
+            color_l=hsl[2],
             dimensions=data.get('dimensions', 'Unknown Dimensions'),
             description=data.get('description', 'No Description Available'),
             image_id=data.get('image_id', None),
             artwork_type_title=data.get('artwork_type_title', 'Unknown Type'),
             api_link=data.get('api_link', None),
             medium_display=data.get('medium_display', 'Unknown Medium'),
-            type=type_instance
         )
-        db.session.merge(artwork)
+        row['content_hash'] = hashlib.md5(json.dumps(row, sort_keys=True, default=str).encode()).hexdigest()
+        return row
+
+    @classmethod
+    def bulk_upsert(cls, payloads):
+        """Insert or update a whole page of API payloads in one statement and one commit.
+
+        Types are resolved for the page in a single set-based step and every new or changed row is
+        written with a multi-row INSERT ... ON CONFLICT DO UPDATE; rows whose content hash matches the
+        stored one are skipped. Returns inserted/updated/unchanged/failed counts."""
+
+        rows = []
+        failed = 0
+        for data in payloads:
+            try:
+                rows.append(cls.normalize(data))
+            except (KeyError, TypeError):
+                failed += 1  # Payload without an id or with malformed fields
+        return cls.upsert_rows(rows, failed=failed)
+
+    @classmethod
+    def upsert_rows(cls, normalized_rows, failed=0):
+        """bulk_upsert() for rows already mapped by normalize(), e.g. in import worker processes."""
+
+        rows = {row['id']: row for row in normalized_rows}  # Later duplicates of the same id win
+
+        existing = dict(db.session.query(cls.id, cls.content_hash).filter(cls.id.in_(rows))) if rows else {}
+        unchanged = [artwork_id for artwork_id, row in rows.items() if existing.get(artwork_id, '') == row['content_hash']]
+        for artwork_id in unchanged:
+            del rows[artwork_id]
+
+        if not rows:
+            return {'inserted': 0, 'updated': 0, 'unchanged': len(unchanged), 'failed': failed}
+
+        type_ids = Type.get_or_create_many(row['artwork_type_title'] for row in rows.values())
+        now = datetime.utcnow()
+        for row in rows.values():
+            row['type_id'] = type_ids.get(row['artwork_type_title'])
+            row['updated_at'] = now
+
+        stmt = upsert_insert(cls.__table__).values(list(rows.values()))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['id'],
+            set_={name: stmt.excluded[name] for name in rows[next(iter(rows))] if name != 'id'}
+        )
+        db.session.execute(stmt)
+        ArtworkClassification.replace({artwork_id: row['classification_titles'] for artwork_id, row in rows.items()})
         db.session.commit()
-        
-        return artwork
+        artworks_ingested.send(cls, ids=list(rows))
+
+        updated = sum(1 for artwork_id in rows if artwork_id in existing)
+        return {'inserted': len(rows) - updated, 'updated': updated, 'unchanged': len(unchanged), 'failed': failed}
 
 
 class Type(db.Model):
@@ -120,19 +209,51 @@ class Type(db.Model):
     artworks = db.relationship('Artwork', backref='type', lazy=True)
 
     @classmethod
-    def get_or_create(cls, name):
-        """Get an existing type or create a new one if it does not exist."""
-        type_instance = cls.query.filter_by(name=name).first()
-        if not type_instance:
-            type_instance = cls(name=name)
-            db.session.add(type_instance)
-            db.session.commit()
-        return type_instance
+    def get_or_create_many(cls, names):
+        """Resolve a set of type names to ids, creating missing types in one statement."""
+        return get_or_create_names(cls, names)
     
     def get_artwork_ids(self):
         """Get all artwork IDs for this type."""
         return [artwork.id for artwork in self.artworks]
 
+class Classification(db.Model):
+    """AIC classification titles (e.g. "painting", "woodblock print"), normalized out of artworks for filtering"""
+
+    __tablename__ = 'classifications'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String, nullable=False, unique=True)
+
+    @classmethod
+    def get_or_create_many(cls, names):
+        """Resolve a set of classification titles to ids, creating missing ones in one statement."""
+        return get_or_create_names(cls, names)
+
+class ArtworkClassification(db.Model):
+    """Mapping each artwork to each of its classifications"""
+
+    __tablename__ = 'artwork_classifications'
+
+    artwork_id = db.Column(db.Integer, db.ForeignKey('artworks.id', ondelete="cascade"), primary_key=True)
+    classification_id = db.Column(db.Integer, db.ForeignKey('classifications.id', ondelete="cascade"), primary_key=True)
+
+    # The primary key serves lookups by artwork; this one serves filtering by classification
+    __table_args__ = (db.Index('ix_artwork_classifications_classification', 'classification_id', 'artwork_id'),)
+
+    @classmethod
+    def replace(cls, titles_by_artwork):
+        """Link each artwork to exactly the classifications in its comma-joined classification_titles."""
+        if not titles_by_artwork:
+            return
+        names = {artwork_id: split_classifications(titles) for artwork_id, titles in titles_by_artwork.items()}
+        ids = Classification.get_or_create_many(name for artwork_names in names.values() for name in artwork_names)
+
+        cls.query.filter(cls.artwork_id.in_(list(names))).delete(synchronize_session=False)
+        links = [{'artwork_id': artwork_id, 'classification_id': ids[name]} for artwork_id, artwork_names in names.items() for name in artwork_names]
+        if links:
+            db.session.execute(cls.__table__.insert(), links)
+
 class Favorite(db.Model):
     """Mapping a favorited artwork to user's profile"""
 
@@ -145,6 +266,44 @@ class Favorite(db.Model):
     # Define the relationship to Artwork
     artwork = db.relationship('Artwork', backref='favorites')
 
+    # An index rather than a constraint, so upgrade_schema() adds it to favorites tables created before it
+    __table_args__ = (db.Index('uq_favorites_user_artwork', 'user_id', 'artwork_id', unique=True),)
+
+class ArtworkSimilarity(db.Model):
+    """Precomputed item-to-item similarity - the nearest neighbors of each favorited artwork"""
+
+    __tablename__ = 'artwork_similarities'
+
+    artwork_id = db.Column(db.Integer, db.ForeignKey('artworks.id', ondelete="cascade"), primary_key=True)
+    similar_id = db.Column(db.Integer, db.ForeignKey('artworks.id', ondelete="cascade"), primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+
+class SimilarArtwork(db.Model):
+    """Precomputed content neighbors of each artwork (color, date, type, classification, origin, description) - see similar.py"""
+
+    __tablename__ = 'similar_artworks'
+
+    artwork_id = db.Column(db.Integer, db.ForeignKey('artworks.id', ondelete="cascade"), primary_key=True)
+    similar_id = db.Column(db.Integer, db.ForeignKey('artworks.id', ondelete="cascade"), primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+    computed_at = db.Column(db.DateTime, nullable=False)   # Neighbors older than the artwork's updated_at are recomputed
+
+    @classmethod
+    def artworks_for(cls, artwork_id, limit=6):
+        """The most similar artworks of one artwork, most similar first, with one indexed query."""
+        return Artwork.query.join(cls, cls.similar_id == Artwork.id).filter(cls.artwork_id == artwork_id).order_by(cls.score.desc()).limit(limit).all()
+
+class Suggestion(db.Model):
+    """Precomputed top-N suggestion candidates per user, read back ordered by score"""
+
+    __tablename__ = 'suggestions'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete="cascade"), primary_key=True)
+    artwork_id = db.Column(db.Integer, db.ForeignKey('artworks.id', ondelete="cascade"), primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (db.Index('ix_suggestions_user_score', 'user_id', 'score'),)
+
 class SearchHistory(db.Model):
     """Store all searches that user previously made"""
 
@@ -162,6 +321,186 @@ class SearchHistory(db.Model):
         db.session.commit()
 
 
+class CachedResponse(db.Model):
+    """Cached API responses shared between worker processes"""
+
+    __tablename__ = 'api_cache'
+
+    key = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.Text, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    accessed_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class ResultSet(db.Model):
+    """Ordered artwork IDs of one search, kept for paging through /results until it expires"""
+
+    __tablename__ = 'result_sets'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete="cascade"), nullable=True)
+    artwork_ids = db.Column(db.Text, nullable=False)  # Comma-separated IDs in result order
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    @classmethod
+    def save(cls, user_id, artwork_ids, ttl=3600):
+        """Store the IDs of a search result and prune expired result sets."""
+        now = datetime.utcnow()
+        cls.query.filter(cls.expires_at < now).delete(synchronize_session=False)
+        result_set = cls(user_id=user_id, artwork_ids=','.join(map(str, artwork_ids)), expires_at=now + timedelta(seconds=ttl))
+        db.session.add(result_set)
+        db.session.commit()
+        return result_set
+
+    @classmethod
+    def get_active(cls, result_set_id):
+        """Return the result set if it exists and has not expired."""
+        return cls.query.filter(cls.id == result_set_id, cls.expires_at >= datetime.utcnow()).first()
+
+    def ids(self):
+        return [int(artwork_id) for artwork_id in self.artwork_ids.split(',') if artwork_id]
+
+
+class IngestJob(db.Model):
+    """Background catalog ingestion job (an ID range, a delta sync or a similar refresh) run by the jobs.py worker"""
+
+    __tablename__ = 'ingest_jobs'
+
+    ACTIVE_STATUSES = ('queued', 'running')
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)            # 'id_range', 'delta_sync' or 'similar_refresh'
+    dedupe_key = db.Column(db.String(200), nullable=False)     # Identical work shares one key
+    params = db.Column(db.Text, nullable=False)                # JSON arguments for the job
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer, nullable=True)
+    result = db.Column(db.Text, nullable=True)                 # JSON summary once finished
+    error = db.Column(db.Text, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    run_after = db.Column(db.DateTime, nullable=True)          # A failed job waits until then before its retry
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    # Only one queued or running job per key, so duplicate requests merge into it
+    __table_args__ = (
+        db.Index('uq_ingest_jobs_active_key', 'dedupe_key', unique=True,
+                 postgresql_where=db.text("status IN ('queued', 'running')"),
+                 sqlite_where=db.text("status IN ('queued', 'running')")),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id, 'kind': self.kind, 'status': self.status, 'progress': self.progress, 'total': self.total,
+            'result': json.loads(self.result) if self.result else None, 'error': self.error,
+        }
+
+
+class SyncCheckpoint(db.Model):
+    """Resume point of a long-running sync or import, stored as JSON under a name"""
+
+    __tablename__ = 'sync_checkpoints'
+
+    name = db.Column(db.String(200), primary_key=True)
+    value = db.Column(db.Text, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    @classmethod
+    def load(cls, name, default=None):
+        checkpoint = db.session.get(cls, name)
+        return json.loads(checkpoint.value) if checkpoint else default
+
+    @classmethod
+    def save(cls, name, value):
+        """Store the checkpoint and commit, together with whatever work it records."""
+        db.session.merge(cls(name=name, value=json.dumps(value), updated_at=datetime.utcnow()))
+        db.session.commit()
+
+    @classmethod
+    def clear(cls, name):
+        cls.query.filter_by(name=name).delete()
+        db.session.commit()
+
+
+def parse_hsl(color):
+    """(h, s, l) integers from an API color dict or its JSON string, or Nones when unavailable."""
+    if isinstance(color, str):
+        try:
+            color = json.loads(color)
+        except ValueError:
+            color = None
+    if not isinstance(color, dict):
+        return (None, None, None)
+    try:
+        return (int(color['h']) % 360, int(color['s']), int(color['l']))
+    except (KeyError, TypeError, ValueError):
+        return (None, None, None)
+
+
+def split_classifications(titles):
+    """Classification titles from the comma-joined artworks.classification_titles column, without duplicates."""
+    return list(dict.fromkeys(title.strip().lower() for title in (titles or '').split(',') if title.strip()))
+
+
+def get_or_create_names(model, names):
+    """{name: id} of a lookup table with a unique name column (types, classifications), inserting missing names."""
+    names = {name for name in names if name}
+    if not names:
+        return {}
+
+    db.session.execute(upsert_insert(model.__table__).values([{'name': name} for name in names]).on_conflict_do_nothing(index_elements=['name']))
+    return dict(db.session.query(model.name, model.id).filter(model.name.in_(names)))
+
+
+def upsert_insert(table):
+    """INSERT construct supporting ON CONFLICT for the bound database (PostgreSQL or SQLite)."""
+    if db.engine.dialect.name == 'sqlite':
+        return sqlite_insert(table)
+    return postgresql_insert(table)
+
+
+# Columns added to tables after they were first created; db.create_all() never alters an existing table
+ADDED_COLUMNS = {
+    'artworks': ('color_h', 'color_s', 'color_l', 'content_hash', 'updated_at'),
+    'ingest_jobs': ('run_after',),
+    'users': ('suggestions_built_at',),
+}
+
+
+def drop_duplicates(connection, index):
+    """Delete the rows a new unique index would reject, keeping the oldest row (lowest id) of each group."""
+    table = index.table
+    primary_key = list(table.primary_key.columns)[0]
+    keep = select(func.min(primary_key)).group_by(*index.columns)
+    deleted = connection.execute(table.delete().where(primary_key.notin_(keep))).rowcount
+    if deleted:
+        logger.warning(f"Deleted {deleted} duplicate rows from {table.name} before creating {index.name}.")
+
+
+def upgrade_schema():
+    """Add the ADDED_COLUMNS, and every index declared on the models, to tables created before them.
+
+    Rows that would violate a new unique index are deleted first. Safe to run again; run it after
+    db.create_all() and before anything reads the new columns."""
+    connection = db.session.connection()
+    inspector = inspect(connection)
+    for table_name, column_names in ADDED_COLUMNS.items():
+        table = db.metadata.tables[table_name]
+        existing = {column['name'] for column in inspector.get_columns(table_name)}
+        for name in column_names:
+            if name not in existing:
+                column_type = table.c[name].type.compile(dialect=connection.dialect)
+                connection.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {name} {column_type}"))
+    for table in db.metadata.sorted_tables:
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                if index.unique:
+                    drop_duplicates(connection, index)
+                index.create(connection, checkfirst=True)
+
+
 def connect_db(app):
     """Connects this 'curated' database to the Flask app.py"""
     db.app = app
@@ -0,0 +1,196 @@
+"""   Recommend.py
+
+Precomputed artwork recommendations behind get_suggested_artworks.
+
+- Item-to-item similarity combines a sparse co-favorite matrix (cosine over users who favorited both
+  artworks) with artist, type and date features, and is stored as the top neighbors of each favorited artwork
+- Each user keeps a top-N candidate list (suggestions table) that favorite toggles update incrementally,
+  so serving suggestions is one indexed read; a user whose list was never built gets a full build on
+  their next toggle (or from the scheduled rebuild), never while a page is served
+- Co-favorite counts drift as other users toggle favorites; run the full rebuild on a schedule:
+- Open Terminal
+- Type in:  python recommend.py """
+
+import math
+from collections import Counter, defaultdict
+from datetime import datetime
+from sqlalchemy import func
+from models import Artwork, ArtworkSimilarity, Favorite, Suggestion, User, db, upsert_insert
+
+CO_FAVORITE_WEIGHT = 1.0
+ARTIST_WEIGHT = 0.6
+TYPE_WEIGHT = 0.2
+DATE_WEIGHT = 0.2
+DATE_SCALE_YEARS = 50
+
+NEIGHBORS_PER_ARTWORK = 30
+FEATURE_CANDIDATES = 50
+SUGGESTIONS_PER_USER = 48
+UNKNOWN_ARTISTS = {None, '', 'Unknown Artist'}
+
+
+def date_closeness(a, b):
+    """1.0 for artworks from the same year, decaying as their start dates move apart."""
+    if a is None or b is None:
+        return 0.0
+    return 1.0 / (1.0 + abs(a - b) / DATE_SCALE_YEARS)
+
+
+def compute_neighbors(artwork, co_counts, favorite_counts):
+    """Score candidate neighbors of one artwork and return its top [(similar_id, score)].
+
+    co_counts maps other artwork IDs to the number of users who favorited both; favorite_counts maps
+    artwork IDs to their total number of favorites."""
+    scores = defaultdict(float)
+    for other_id, count in co_counts.items():
+        scores[other_id] += CO_FAVORITE_WEIGHT * count / math.sqrt(favorite_counts[artwork.id] * favorite_counts[other_id])
+
+    # Feature neighbors: same artist, and same type closest in date
+    if artwork.artist_display not in UNKNOWN_ARTISTS:
+        rows = db.session.query(Artwork.id, Artwork.date_start).filter(
+            Artwork.artist_display == artwork.artist_display, Artwork.id != artwork.id
+        ).limit(FEATURE_CANDIDATES)
+        for other_id, date_start in rows:
+            scores[other_id] += ARTIST_WEIGHT + DATE_WEIGHT * date_closeness(artwork.date_start, date_start)
+
+    if artwork.artwork_type_title:
+        query = db.session.query(Artwork.id, Artwork.date_start).filter(
+            Artwork.artwork_type_title == artwork.artwork_type_title, Artwork.id != artwork.id
+        )
+        if artwork.date_start is not None:
+            query = query.order_by(func.abs(Artwork.date_start - artwork.date_start))
+        for other_id, date_start in query.limit(FEATURE_CANDIDATES):
+            scores[other_id] += TYPE_WEIGHT + DATE_WEIGHT * date_closeness(artwork.date_start, date_start)
+
+    return sorted(scores.items(), key=lambda item: -item[1])[:NEIGHBORS_PER_ARTWORK]
+
+
+def save_neighbors(artwork_id, neighbors):
+    ArtworkSimilarity.query.filter_by(artwork_id=artwork_id).delete(synchronize_session=False)
+    if neighbors:
+        db.session.execute(ArtworkSimilarity.__table__.insert(), [
+            {'artwork_id': artwork_id, 'similar_id': similar_id, 'score': score} for similar_id, score in neighbors
+        ])
+
+
+def refresh_artwork_neighbors(artwork_id):
+    """Recompute one artwork's neighbors from current favorites (used when it is first favorited)."""
+    artwork = db.session.get(Artwork, artwork_id)
+    if artwork is None:
+        return []
+
+    other = db.aliased(Favorite)
+    co_counts = dict(db.session.query(other.artwork_id, func.count()).join(
+        Favorite, Favorite.user_id == other.user_id
+    ).filter(Favorite.artwork_id == artwork_id, other.artwork_id != artwork_id).group_by(other.artwork_id))
+    favorite_counts = dict(db.session.query(Favorite.artwork_id, func.count()).filter(
+        Favorite.artwork_id.in_(list(co_counts) + [artwork_id])
+    ).group_by(Favorite.artwork_id))
+
+    neighbors = compute_neighbors(artwork, co_counts, favorite_counts)
+    save_neighbors(artwork_id, neighbors)
+    return neighbors
+
+
+def get_neighbors(artwork_id):
+    """Stored neighbors of an artwork, computing them on first use."""
+    neighbors = db.session.query(ArtworkSimilarity.similar_id, ArtworkSimilarity.score).filter_by(artwork_id=artwork_id).all()
+    return neighbors or refresh_artwork_neighbors(artwork_id)
+
+
+def favorite_ids(user_id):
+    return {artwork_id for (artwork_id,) in db.session.query(Favorite.artwork_id).filter_by(user_id=user_id)}
+
+
+def trim_suggestions(user_id):
+    """Keep only the user's SUGGESTIONS_PER_USER best candidates."""
+    Suggestion.query.filter(Suggestion.user_id == user_id, Suggestion.score <= 1e-9).delete(synchronize_session=False)
+    keep = db.session.query(Suggestion.artwork_id).filter_by(user_id=user_id).order_by(Suggestion.score.desc()).limit(SUGGESTIONS_PER_USER)
+    Suggestion.query.filter(Suggestion.user_id == user_id, Suggestion.artwork_id.notin_(keep.scalar_subquery())).delete(synchronize_session=False)
+
+
+def rebuild_user_suggestions(user_id):
+    """Recompute a user's candidate list from the neighbors of all of their favorites."""
+    favorites = favorite_ids(user_id)
+    scores = defaultdict(float)
+    if favorites:
+        rows = db.session.query(ArtworkSimilarity.artwork_id, ArtworkSimilarity.similar_id, ArtworkSimilarity.score).filter(
+            ArtworkSimilarity.artwork_id.in_(favorites)
+        ).all()
+        with_neighbors = {row[0] for row in rows}
+        rows += [(artwork_id, similar_id, score) for artwork_id in favorites - with_neighbors for similar_id, score in refresh_artwork_neighbors(artwork_id)]
+        for _, similar_id, score in rows:
+            if similar_id not in favorites:
+                scores[similar_id] += score
+
+    Suggestion.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+    top = sorted(scores.items(), key=lambda item: -item[1])[:SUGGESTIONS_PER_USER]
+    if top:
+        db.session.execute(Suggestion.__table__.insert(), [
+            {'user_id': user_id, 'artwork_id': artwork_id, 'score': score} for artwork_id, score in top
+        ])
+    User.query.filter_by(id=user_id).update({'suggestions_built_at': datetime.utcnow()}, synchronize_session=False)
+    db.session.commit()
+
+
+def update_for_favorite(user_id, artwork_id, liked):
+    """Apply one favorite toggle to the user's candidate list without recomputing it."""
+    if db.session.query(User.suggestions_built_at).filter_by(id=user_id).scalar() is None:
+        # Favorites saved before the candidate list existed: build it in full, once
+        rebuild_user_suggestions(user_id)
+        return
+
+    favorites = favorite_ids(user_id)
+    sign = 1.0 if liked else -1.0
+    rows = [
+        {'user_id': user_id, 'artwork_id': similar_id, 'score': sign * score}
+        for similar_id, score in get_neighbors(artwork_id) if similar_id not in favorites
+    ]
+    if rows:
+        stmt = upsert_insert(Suggestion.__table__).values(rows)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['user_id', 'artwork_id'],
+            set_={'score': Suggestion.__table__.c.score + stmt.excluded.score}
+        ))
+
+    if liked:
+        Suggestion.query.filter_by(user_id=user_id, artwork_id=artwork_id).delete(synchronize_session=False)
+    trim_suggestions(user_id)
+    db.session.commit()
+
+
+def get_suggestion_ids(user_id, limit=SUGGESTIONS_PER_USER):
+    """The user's best candidate IDs, one indexed read."""
+    return [artwork_id for (artwork_id,) in db.session.query(Suggestion.artwork_id).filter_by(user_id=user_id).order_by(Suggestion.score.desc()).limit(limit)]
+
+
+def rebuild_all():
+    """Recompute every favorited artwork's neighbors from the full co-favorite matrix, then every user's candidates."""
+    favorites_by_user = defaultdict(list)
+    for user_id, artwork_id in db.session.query(Favorite.user_id, Favorite.artwork_id):
+        favorites_by_user[user_id].append(artwork_id)
+
+    # Sparse co-favorite matrix: artwork -> Counter(other artwork -> users who favorited both)
+    co_favorites = defaultdict(Counter)
+    favorite_counts = Counter()
+    for artwork_ids in favorites_by_user.values():
+        favorite_counts.update(artwork_ids)
+        for artwork_id in artwork_ids:
+            co_favorites[artwork_id].update(other_id for other_id in artwork_ids if other_id != artwork_id)
+
+    ArtworkSimilarity.query.delete()
+    for artwork in Artwork.query.filter(Artwork.id.in_(list(favorite_counts))).all():
+        save_neighbors(artwork.id, compute_neighbors(artwork, co_favorites[artwork.id], favorite_counts))
+    db.session.commit()
+
+    for user_id in favorites_by_user:
+        rebuild_user_suggestions(user_id)
+    return len(favorite_counts), len(favorites_by_user)
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    with create_app(with_routes=False).app_context():
+        artworks, users = rebuild_all()
+        print(f"Rebuilt neighbors for {artworks} artworks and suggestions for {users} users.")
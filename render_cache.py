@@ -0,0 +1,86 @@
+"""Render cache for artwork card fragments and artwork detail pages.
+
+Rendered HTML is cached per artwork, keyed by the artwork ID and stamped with a data version (a hash
+of the artwork's values), so an updated row never serves stale markup; ingestion also drops the
+entries of the artworks it touched. The per-user favorite star is rendered as marker strings and
+filled in after the cache lookup, so one cached copy serves every user. The similar artworks section
+of a detail page is spliced in the same way from cached cards, so the page stays cached while its
+neighbors change."""
+
+import hashlib
+import json
+from flask import g, render_template, request, session
+from markupsafe import Markup
+from cache import LRUCache
+from models import artworks_ingested
+
+LIKED_MARK = '__curated_liked__'
+STAR_MARK = '__curated_star__'
+SIMILAR_MARK = '__curated_similar__'
+CARD_VARIANTS = ('grid', 'results', 'compact')
+
+# At most 4096 fragments and pages, and 8 MB of HTML per worker
+render_cache = LRUCache(maxsize=4096, maxbytes=8 * 1024 * 1024, sizeof=lambda entry: len(entry[1]))
+
+
+def artwork_version(artwork):
+    """Data version of an artwork model or API payload dict; a digest of its values, so every worker
+    (and every restart) computes the same version, as the ETag on artwork pages needs."""
+    if isinstance(artwork, dict):
+        values = {key: value for key, value in artwork.items() if key != 'is_liked'}
+    else:
+        values = {column.name: getattr(artwork, column.name) for column in artwork.__table__.columns}
+    return hashlib.sha1(json.dumps(values, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def fill_liked(html, liked):
+    """Put the user's favorite state into cached markup."""
+    return Markup(html.replace(LIKED_MARK, 'true' if liked else 'false').replace(STAR_MARK, 'fa-solid' if liked else 'fa-regular'))
+
+
+def is_liked(artwork):
+    return artwork.get('is_liked', False) if isinstance(artwork, dict) else getattr(artwork, 'is_liked', False)
+
+
+def cached_render(key, version, render):
+    entry = render_cache.get(key)
+    if entry is None or entry[0] != version:
+        entry = (version, render())
+        render_cache.set(key, entry)
+    return entry[1]
+
+
+def render_card(artwork, variant='grid'):
+    """Card markup for one artwork in a grid; exposed to templates as render_card()."""
+    artwork_id = artwork['id'] if isinstance(artwork, dict) else artwork.id
+    key = ('card', artwork_id, variant, bool(g.get('user')))
+    html = cached_render(key, artwork_version(artwork), lambda: render_template('art/_artwork_card.html', artwork=artwork, variant=variant))
+    return fill_liked(html, is_liked(artwork))
+
+
+def render_artwork_page(artwork, similar=()):
+    """Full artwork detail page, served from the cache unless the request carries flashes or query args."""
+    similar_html = Markup(render_template('art/_similar_artworks.html', similar=similar))
+    if request.args or session.get('_flashes'):
+        return fill_liked(render_template('art/artwork_details.html', artwork=artwork), is_liked(artwork)).replace(SIMILAR_MARK, similar_html)
+
+    key = ('page', artwork.id, bool(g.get('user')))
+    html = cached_render(key, artwork_version(artwork), lambda: render_template('art/artwork_details.html', artwork=artwork))
+    return fill_liked(html, is_liked(artwork)).replace(SIMILAR_MARK, similar_html)
+
+
+def invalidate_artworks(sender, ids=(), **kwargs):
+    """Drop cached fragments and pages of newly ingested or updated artworks."""
+    for artwork_id in ids:
+        for logged_in in (True, False):
+            render_cache.delete(('page', artwork_id, logged_in))
+            for variant in CARD_VARIANTS:
+                render_cache.delete(('card', artwork_id, variant, logged_in))
+
+
+artworks_ingested.connect(invalidate_artworks, weak=False)
+
+
+def init_render_cache(app):
+    """Make render_card and the favorite markers available in templates."""
+    app.jinja_env.globals.update(render_card=render_card, LIKED_MARK=LIKED_MARK, STAR_MARK=STAR_MARK, SIMILAR_MARK=SIMILAR_MARK)
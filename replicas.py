@@ -0,0 +1,144 @@
+"""Read-replica routing for db.session.
+
+Plain SELECTs issued while handling a request go to a read replica; writes, raw SQL, SELECT ... FOR
+UPDATE and everything outside a request (scripts, the ingestion worker) use the primary. Once a
+request writes, the rest of its reads use the primary, and the user's session sticks to the primary
+for REPLICA_STICKY_SECONDS so their next pages see their own favorites and edits.
+
+Replicas are the SQLALCHEMY_BINDS named replica_<n> (DATABASE_REPLICA_URLS, see config.py). Each one
+is probed at most every HEALTH_CHECK_SECONDS (a SELECT 1, plus the replay lag on PostgreSQL) and taken
+out of rotation on connection errors; with no healthy replica every read falls back to the primary.
+
+To try it locally, copy a SQLite database and point the app at both files:
+    DATABASE_URL=sqlite:////tmp/primary.db DATABASE_REPLICA_URLS=sqlite:////tmp/replica.db python app.py"""
+
+import logging
+import random
+import time
+from flask import current_app, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.dml import UpdateBase
+
+logger = logging.getLogger(__name__)
+
+REPLICA_BIND_PREFIX = 'replica_'
+STICKY_KEY = 'read_primary_until'
+HEALTH_CHECK_SECONDS = 5
+
+POSTGRES_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+# Bind key -> (healthy, checked_at); shared by the sessions of a worker process
+replica_health = {}
+
+
+def replica_keys(engines):
+    return sorted(key for key in engines if key and key.startswith(REPLICA_BIND_PREFIX))
+
+
+def probe_replica(key, engine):
+    """Check that the replica answers and, on PostgreSQL, is within REPLICA_MAX_LAG_SECONDS of the primary."""
+    try:
+        with engine.connect() as connection:
+            if engine.dialect.name == 'postgresql':
+                lag = connection.execute(POSTGRES_LAG_SQL).scalar()
+                healthy = lag is None or float(lag) <= current_app.config['REPLICA_MAX_LAG_SECONDS']
+                if not healthy:
+                    logger.warning(f"Replica {key} is {float(lag):.1f}s behind; reading from the primary.")
+            else:
+                connection.execute(text('SELECT 1'))
+                healthy = True
+    except Exception as e:
+        logger.warning(f"Replica {key} is unavailable: {e}")
+        healthy = False
+    replica_health[key] = (healthy, time.monotonic())
+    return healthy
+
+
+def is_healthy(key, engine):
+    healthy, checked_at = replica_health.get(key, (None, 0))
+    if time.monotonic() - checked_at >= HEALTH_CHECK_SECONDS:
+        healthy = probe_replica(key, engine)
+    return healthy
+
+
+def mark_down(key):
+    replica_health[key] = (False, time.monotonic())
+
+
+def is_write(clause):
+    return isinstance(clause, UpdateBase)
+
+
+def is_replica_safe(clause):
+    """Only plain SELECTs may be answered by a replica."""
+    return isinstance(clause, Select) and clause._for_update_arg is None
+
+
+def sticky_to_primary():
+    return session.get(STICKY_KEY, 0) > time.time()
+
+
+def stick_to_primary():
+    """Send this user's reads to the primary for the next REPLICA_STICKY_SECONDS."""
+    session[STICKY_KEY] = time.time() + current_app.config['REPLICA_STICKY_SECONDS']
+
+
+class RoutingSession(Session):
+    """db.session class that sends replica-safe reads to a healthy replica."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        primary = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None or not has_request_context():
+            return primary
+
+        if self._flushing or is_write(clause):
+            if not self.info.get('wrote'):
+                self.info['wrote'] = True
+                stick_to_primary()
+            return primary
+
+        if self.info.get('wrote') or not is_replica_safe(clause) or sticky_to_primary():
+            return primary
+        return self.replica() or primary
+
+    def replica(self):
+        """The replica this session reads from, picked once per session among the healthy ones."""
+        engines = self._db.engines
+        key = self.info.get('replica')
+        if key and is_healthy(key, engines[key]):
+            return engines[key]
+
+        healthy = [key for key in replica_keys(engines) if is_healthy(key, engines[key])]
+        if not healthy:
+            self.info.pop('replica', None)
+            return None
+        key = self.info['replica'] = random.choice(healthy)
+        return engines[key]
+
+
+def init_replicas(app):
+    """Take replicas out of rotation as soon as they raise connection errors."""
+    app.config.setdefault('REPLICA_STICKY_SECONDS', 10)
+    app.config.setdefault('REPLICA_MAX_LAG_SECONDS', 5)
+
+    from models import db
+
+    with app.app_context():
+        for key in replica_keys(db.engines):
+            def on_error(context, key=key):
+                if context.is_disconnect or context.connection is None:
+                    logger.warning(f"Replica {key} failed: {context.original_exception}")
+                    mark_down(key)
+
+            event.listen(db.engines[key], 'handle_error', on_error)
+            logger.info(f"Routing reads to replica {key} ({db.engines[key].url.render_as_string()}).")
+
+
+def replica_stats():
+    """Replica health for /metrics: 1 healthy, 0 out of rotation."""
+    return {key: int(bool(healthy)) for key, (healthy, _) in replica_health.items()}
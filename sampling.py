@@ -0,0 +1,89 @@
+"""Random artwork sampling without ORDER BY random().
+
+Sampling draws from pools of artwork IDs that are loaded once and refreshed periodically (or as soon as
+ingestion adds artworks), so a page view costs a few random picks plus one primary-key IN query
+instead of sorting the whole artworks table."""
+
+import math
+import random
+from cache import LRUCache
+from models import Artwork, artworks_ingested, db
+
+POOL_REFRESH_SECONDS = 300
+
+
+class ArtworkSampler:
+    """Pick n distinct random artworks, optionally filtered by type/artist and excluding some IDs."""
+
+    def __init__(self, refresh_seconds=POOL_REFRESH_SECONDS, max_pools=64):
+        self.pools = LRUCache(maxsize=max_pools, ttl=refresh_seconds)
+
+    def pool(self, types=None, artists=None):
+        """Sorted artwork IDs matching any of the given types or artists (all artworks when neither is given)."""
+        key = (frozenset(types or ()), frozenset(artists or ()))
+        ids = self.pools.get(key)
+        if ids is None:
+            query = db.session.query(Artwork.id)
+            if types and artists:
+                query = query.filter(Artwork.artwork_type_title.in_(types) | Artwork.artist_display.in_(artists))
+            elif types:
+                query = query.filter(Artwork.artwork_type_title.in_(types))
+            elif artists:
+                query = query.filter(Artwork.artist_display.in_(artists))
+            ids = [artwork_id for (artwork_id,) in query.order_by(Artwork.id)]
+            self.pools.set(key, ids)
+        return ids
+
+    def sample_ids(self, n, types=None, artists=None, exclude_ids=()):
+        """Return up to n distinct random IDs from the matching pool."""
+        ids = self.pool(types, artists)
+        exclude_ids = set(exclude_ids)
+
+        # Draw random positions while the pool is large compared to what we need; otherwise filter and sample
+        if len(ids) > 2 * (n + len(exclude_ids)):
+            picks = []
+            seen = set(exclude_ids)
+            attempts = 0
+            while len(picks) < n and attempts < n * 20:
+                artwork_id = ids[random.randrange(len(ids))]
+                if artwork_id not in seen:
+                    seen.add(artwork_id)
+                    picks.append(artwork_id)
+                attempts += 1
+            if len(picks) == n:
+                return picks
+
+        candidates = [artwork_id for artwork_id in ids if artwork_id not in exclude_ids]
+        return random.sample(candidates, min(n, len(candidates)))
+
+    def sample(self, n, types=None, artists=None, exclude_ids=()):
+        """Return up to n distinct random artworks from the matching pool."""
+        return Artwork.get_many(self.sample_ids(n, types, artists, exclude_ids))
+
+    def shuffled_page(self, seed, page, n):
+        """Return page `page` of a seeded shuffle of every artwork and whether more pages follow.
+
+        Position i of the shuffle is (a * i + b) mod N with a coprime to N, so each page is computed
+        directly and the sequence never repeats an artwork until it wraps around."""
+        ids = self.pool()
+        size = len(ids)
+        if not size:
+            return [], False
+
+        rng = random.Random(seed)
+        step = rng.randrange(1, size) if size > 1 else 1
+        while math.gcd(step, size) != 1:
+            step += 1
+        offset = rng.randrange(size)
+
+        start = page * n
+        positions = range(start, min(start + n, size))
+        return Artwork.get_many(ids[(step * i + offset) % size] for i in positions), start + n < size
+
+    def invalidate(self, *args, **kwargs):
+        """Drop every pool so the next sample sees newly ingested artworks."""
+        self.pools.clear()
+
+
+sampler = ArtworkSampler()
+artworks_ingested.connect(sampler.invalidate, weak=False)
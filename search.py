@@ -0,0 +1,77 @@
+"""Local full-text search over the artworks table.
+
+PostgreSQL keeps a weighted tsvector as a generated column on artworks with a GIN index.
+SQLite (used for local runs and tests) keeps an external-content FTS5 table that triggers keep in sync.
+Either way `search_artworks` returns artworks ranked by relevance without calling the remote API."""
+
+import re
+from sqlalchemy import event, text
+from models import Artwork, db
+
+POSTGRES_DDL = [
+    """ALTER TABLE artworks ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(artist_display, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(classification_titles, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(medium_display, '')), 'C') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'D')
+    ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_artworks_search_vector ON artworks USING GIN (search_vector)",
+]
+
+SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS artworks_fts USING fts5(
+        title, artist_display, classification_titles, medium_display, description,
+        content='artworks', content_rowid='id'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS artworks_fts_insert AFTER INSERT ON artworks BEGIN
+        INSERT INTO artworks_fts(rowid, title, artist_display, classification_titles, medium_display, description)
+        VALUES (new.id, new.title, new.artist_display, new.classification_titles, new.medium_display, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS artworks_fts_delete AFTER DELETE ON artworks BEGIN
+        INSERT INTO artworks_fts(artworks_fts, rowid, title, artist_display, classification_titles, medium_display, description)
+        VALUES ('delete', old.id, old.title, old.artist_display, old.classification_titles, old.medium_display, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS artworks_fts_update AFTER UPDATE ON artworks BEGIN
+        INSERT INTO artworks_fts(artworks_fts, rowid, title, artist_display, classification_titles, medium_display, description)
+        VALUES ('delete', old.id, old.title, old.artist_display, old.classification_titles, old.medium_display, old.description);
+        INSERT INTO artworks_fts(rowid, title, artist_display, classification_titles, medium_display, description)
+        VALUES (new.id, new.title, new.artist_display, new.classification_titles, new.medium_display, new.description);
+    END""",
+    "INSERT INTO artworks_fts(artworks_fts) VALUES ('rebuild')",
+]
+
+
+def init_search_index(connection=None):
+    """Create the full-text index for the bound database. Safe to run again on an existing database."""
+    connection = connection or db.session.connection()
+    statements = SQLITE_DDL if connection.dialect.name == 'sqlite' else POSTGRES_DDL
+    for statement in statements:
+        connection.execute(text(statement))
+
+
+@event.listens_for(Artwork.__table__, 'after_create')
+def create_search_index(target, connection, **kwargs):
+    """Build the index together with the artworks table when db.create_all() creates it."""
+    init_search_index(connection)
+
+
+def search_artworks(query, limit=24, offset=0):
+    """Artworks matching every word of the query, most relevant first."""
+    words = re.findall(r'\w+', query or '')
+    if not words:
+        return []
+
+    if db.session.get_bind().dialect.name == 'sqlite':
+        # Title and artist weigh most, then classification, medium and description (bm25: lower is better)
+        rows = db.session.execute(text(
+            "SELECT rowid FROM artworks_fts WHERE artworks_fts MATCH :match "
+            "ORDER BY bm25(artworks_fts, 10.0, 10.0, 4.0, 2.0, 1.0), rowid LIMIT :limit OFFSET :offset"
+        ), {'match': ' '.join(f'"{word}"' for word in words), 'limit': limit, 'offset': offset})
+    else:
+        rows = db.session.execute(text(
+            "SELECT id FROM artworks, plainto_tsquery('english', :query) AS query WHERE search_vector @@ query "
+            "ORDER BY ts_rank_cd(search_vector, query) DESC, id LIMIT :limit OFFSET :offset"
+        ), {'query': ' '.join(words), 'limit': limit, 'offset': offset})
+
+    return Artwork.get_many(artwork_id for (artwork_id,) in rows)
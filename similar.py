@@ -0,0 +1,288 @@
+"""   Similar.py
+
+Content-based "similar artworks" for the artwork detail page.
+
+Every artwork is one row of a NumPy feature matrix built from:
+- its color (CIELAB, see colors.py)
+- the midpoint of its date range
+- its type and place of origin, one-hot
+- its classifications, multi-hot
+- a hashed TF-IDF vector of its description
+
+Each block is scaled by a weight, so the Euclidean distance between two rows adds up how far apart two
+artworks are on every feature. The nearest rows of every artwork are found with chunked matrix products
+and stored in the similar_artworks table, so the detail page reads them with one indexed query
+(SimilarArtwork.artworks_for).
+
+Artworks whose neighbors are missing or older than their updated_at are refreshed incrementally. The
+jobs worker keeps the matrix in memory and queues a refresh after every ingest job (see jobs.py). Each
+refresh updates the rows of the changed artworks and recomputes their neighbors. It also recomputes the
+neighbors of any artwork that a changed one now sits closer to than its current last neighbor, or that
+lists a changed one among its neighbors (it may have moved away).
+
+- To rebuild every artwork's neighbors (e.g. after a dump import):
+- Open Terminal
+- Type in:  python similar.py
+- Options:  --refresh to only recompute new and changed artworks (e.g. from cron) """
+
+import argparse
+import logging
+import math
+import re
+import time
+import zlib
+from collections import Counter
+from datetime import datetime
+import numpy as np
+from sqlalchemy import exists, func, or_
+from colors import hsl_to_lab
+from models import Artwork, SimilarArtwork, db, split_classifications
+
+logger = logging.getLogger(__name__)
+
+SIMILAR_PER_ARTWORK = 12
+COLOR_WEIGHT = 1.0
+DATE_WEIGHT = 1.0
+DATE_SCALE_YEARS = 100            # Artworks this many years apart are as far apart as a different type
+TYPE_WEIGHT = 1.0
+CLASSIFICATION_WEIGHT = 1.0
+ORIGIN_WEIGHT = 0.7
+TEXT_WEIGHT = 0.7
+CLASSIFICATION_VOCABULARY = 200   # Most common classifications and origins get a column; rarer ones are left out
+ORIGIN_VOCABULARY = 100
+TEXT_DIMENSIONS = 128             # Hashed description terms; 0 leaves descriptions out
+CHUNK_ROWS = 128                  # Artworks per distance block, which holds CHUNK_ROWS x catalog floats
+TOKEN = re.compile(r'[a-z]{3,}')
+
+FEATURE_COLUMNS = (Artwork.id, Artwork.color_h, Artwork.color_s, Artwork.color_l, Artwork.date_start, Artwork.date_end,
+                   Artwork.type_id, Artwork.classification_titles, Artwork.place_of_origin, Artwork.description)
+
+
+def date_midpoint(date_start, date_end):
+    if date_start is None and date_end is None:
+        return None
+    if date_start is None or date_end is None:
+        return date_start if date_end is None else date_end
+    return (date_start + date_end) / 2
+
+
+def description_terms(description):
+    """Counts of hashed description words per TEXT_DIMENSIONS bucket."""
+    return Counter(zlib.crc32(word.encode()) % TEXT_DIMENSIONS for word in TOKEN.findall((description or '').lower()))
+
+
+def stale_filter():
+    """Artworks without neighbors computed since their last change."""
+    return ~exists().where(
+        SimilarArtwork.artwork_id == Artwork.id,
+        or_(Artwork.updated_at.is_(None), SimilarArtwork.computed_at >= Artwork.updated_at),
+    )
+
+
+class SimilarityIndex:
+    """Feature matrix of the catalog with chunked k-nearest-neighbor search."""
+
+    def __init__(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.matrix = np.empty((0, 0), dtype=np.float32)
+        self.norms = np.empty(0, dtype=np.float32)
+        self.positions = {}
+        self.built = False
+
+    def build(self):
+        """Load every artwork; vocabularies, column means and description IDF come from this load."""
+        started = time.monotonic()
+        classifications, origins, type_ids = Counter(), Counter(), set()
+        for titles, origin, type_id in db.session.query(Artwork.classification_titles, Artwork.place_of_origin, Artwork.type_id).yield_per(5000):
+            classifications.update(split_classifications(titles))
+            origins[origin] += 1
+            type_ids.add(type_id)
+        origins.pop(None, None)
+        type_ids.discard(None)
+
+        self.columns = {}
+        offset = 4  # Lab color (3) and date (1)
+        for block, values in (('type', sorted(type_ids)),
+                              ('classification', [name for name, _ in classifications.most_common(CLASSIFICATION_VOCABULARY)]),
+                              ('origin', [name for name, _ in origins.most_common(ORIGIN_VOCABULARY)])):
+            self.columns[block] = {value: offset + i for i, value in enumerate(values)}
+            offset += len(values)
+        self.text_offset = offset
+        self.width = offset + TEXT_DIMENSIONS
+
+        rows = db.session.query(*FEATURE_COLUMNS).order_by(Artwork.id).yield_per(5000)
+        ids, matrix, color_known, date_known = self.encode(rows)
+        self.color_mean = matrix[color_known, 0:3].mean(axis=0) if color_known.any() else np.zeros(3, dtype=np.float32)
+        self.date_mean = matrix[date_known, 3].mean() if date_known.any() else 0.0
+        document_frequency = (matrix[:, self.text_offset:] > 0).sum(axis=0)
+        self.idf = (np.log((1 + len(ids)) / (1 + document_frequency)) + 1).astype(np.float32)
+        self.finish(matrix, color_known, date_known)
+
+        self.ids, self.matrix = ids, matrix
+        self.norms = np.einsum('ij,ij->i', matrix, matrix)
+        self.positions = {int(artwork_id): i for i, artwork_id in enumerate(ids)}
+        self.built = True
+        logger.info(f"Similarity index built: {len(ids)} artworks x {self.width} features in {time.monotonic() - started:.1f}s.")
+
+    def encode(self, rows):
+        """Raw feature rows (unweighted, missing values flagged) for rows of FEATURE_COLUMNS."""
+        ids, hsl, dates, entries = [], [], [], []
+        for artwork_id, h, s, l, date_start, date_end, type_id, titles, origin, description in rows:
+            ids.append(artwork_id)
+            hsl.append((h, s, l) if h is not None else (0, 0, 0))
+            dates.append(date_midpoint(date_start, date_end))
+            columns = []
+            if type_id in self.columns['type']:
+                columns.append((self.columns['type'][type_id], 1.0))
+            known = [self.columns['classification'][name] for name in split_classifications(titles) if name in self.columns['classification']]
+            columns += [(column, 1.0 / math.sqrt(len(known))) for column in known]
+            if origin in self.columns['origin']:
+                columns.append((self.columns['origin'][origin], 1.0))
+            if TEXT_DIMENSIONS:
+                columns += [(self.text_offset + bucket, 1.0 + math.log(count)) for bucket, count in description_terms(description).items()]
+            entries.append((columns, h is not None))
+
+        matrix = np.zeros((len(ids), self.width), dtype=np.float32)
+        if ids:
+            hsl = np.array(hsl, dtype=np.float64)
+            matrix[:, 0:3] = hsl_to_lab(hsl[:, 0], hsl[:, 1], hsl[:, 2]) / 100
+        for i, (columns, _) in enumerate(entries):
+            for column, value in columns:
+                matrix[i, column] = value
+        date_known = np.array([date is not None for date in dates], dtype=bool)
+        matrix[date_known, 3] = [date / DATE_SCALE_YEARS for date in dates if date is not None]
+        color_known = np.array([known for _, known in entries], dtype=bool)
+        return np.array(ids, dtype=np.int64), matrix, color_known, date_known
+
+    def finish(self, matrix, color_known, date_known):
+        """Fill missing colors and dates with the catalog mean, weight the description terms and scale every block."""
+        matrix[~color_known, 0:3] = self.color_mean
+        matrix[~date_known, 3] = self.date_mean
+        text = matrix[:, self.text_offset:]
+        text *= self.idf
+        lengths = np.linalg.norm(text, axis=1, keepdims=True)
+        np.divide(text, lengths, out=text, where=lengths > 0)
+
+        # One-hot and unit blocks are scaled by 1/sqrt(2), so two different values are 1.0 apart before weighting
+        matrix[:, 0:3] *= COLOR_WEIGHT
+        matrix[:, 3] *= DATE_WEIGHT
+        for block, weight in (('type', TYPE_WEIGHT), ('classification', CLASSIFICATION_WEIGHT), ('origin', ORIGIN_WEIGHT)):
+            if self.columns[block]:
+                columns = list(self.columns[block].values())
+                matrix[:, min(columns):max(columns) + 1] *= weight / math.sqrt(2)
+        text *= TEXT_WEIGHT / math.sqrt(2)
+
+    def update(self, artwork_ids):
+        """Re-encode new and changed artworks into the matrix without rebuilding it."""
+        rows = db.session.query(*FEATURE_COLUMNS).filter(Artwork.id.in_(artwork_ids)).all()
+        if not rows:
+            return
+        ids, matrix, color_known, date_known = self.encode(rows)
+        self.finish(matrix, color_known, date_known)
+
+        new_ids, new_rows = [], []
+        for artwork_id, row in zip(ids, matrix):
+            position = self.positions.get(int(artwork_id))
+            if position is None:
+                self.positions[int(artwork_id)] = len(self.ids) + len(new_ids)
+                new_ids.append(artwork_id)
+                new_rows.append(row)
+            else:
+                self.matrix[position] = row
+        if new_ids:
+            self.ids = np.concatenate([self.ids, np.array(new_ids, dtype=np.int64)])
+            self.matrix = np.vstack([self.matrix, np.array(new_rows)])
+        self.norms = np.einsum('ij,ij->i', self.matrix, self.matrix)
+
+    def distances(self, positions):
+        """Euclidean distances from the given rows to every row, with each row's distance to itself set to inf."""
+        block = self.norms[positions, None] + self.norms[None, :] - 2 * (self.matrix[positions] @ self.matrix.T)
+        np.maximum(block, 0, out=block)
+        np.sqrt(block, out=block)
+        block[np.arange(len(positions)), positions] = np.inf
+        return block
+
+    def nearest(self, block, k=SIMILAR_PER_ARTWORK):
+        """[(similar_id, score)] of each row of a distance block, closest first; score is 1 / (1 + distance)."""
+        k = min(k, block.shape[1] - 1)
+        if k <= 0:
+            return [[] for _ in range(len(block))]
+        nearest = np.argpartition(block, k - 1, axis=1)[:, :k]
+        results = []
+        for row, candidates in zip(block, nearest):
+            candidates = candidates[np.argsort(row[candidates])]
+            results.append([(int(self.ids[i]), float(1 / (1 + row[i]))) for i in candidates])
+        return results
+
+    def recompute(self, positions, computed_at):
+        """Compute and store the neighbors of the artworks at the given matrix positions, a chunk per commit."""
+        for start in range(0, len(positions), CHUNK_ROWS):
+            chunk = positions[start:start + CHUNK_ROWS]
+            save_similar({int(self.ids[position]): neighbors for position, neighbors in zip(chunk, self.nearest(self.distances(chunk)))}, computed_at)
+
+    def rebuild_all(self):
+        """Build the matrix and recompute the neighbors of every artwork."""
+        started = time.monotonic()
+        computed_at = datetime.utcnow()
+        self.build()
+        self.recompute(np.arange(len(self.ids)), computed_at)
+        SimilarArtwork.query.filter(SimilarArtwork.computed_at < computed_at).delete(synchronize_session=False)
+        db.session.commit()
+        return {'artworks': len(self.ids), 'elapsed': time.monotonic() - started}
+
+    def refresh(self):
+        """Recompute the neighbors of new and changed artworks and of the artworks they moved closer to or away from."""
+        started = time.monotonic()
+        computed_at = datetime.utcnow()
+        stale_ids = [artwork_id for (artwork_id,) in db.session.query(Artwork.id).filter(stale_filter())]
+        if not self.built:
+            self.build()
+        elif stale_ids:
+            self.update(stale_ids)
+        stale = np.array(sorted(self.positions[artwork_id] for artwork_id in stale_ids if artwork_id in self.positions), dtype=np.int64)
+        if not len(stale):
+            return {'stale': 0, 'affected': 0, 'elapsed': time.monotonic() - started}
+
+        # Distance to each artwork's stored last neighbor (inf while its list isn't full); a stale artwork closer than that joins the list
+        last = np.full(len(self.ids), np.inf, dtype=np.float32)
+        full = min(SIMILAR_PER_ARTWORK, len(self.ids) - 1)
+        for artwork_id, score, count in db.session.query(SimilarArtwork.artwork_id, func.min(SimilarArtwork.score), func.count()).group_by(SimilarArtwork.artwork_id):
+            if artwork_id in self.positions and count >= full:
+                last[self.positions[artwork_id]] = 1 / score - 1
+        closest = np.full(len(self.ids), np.inf, dtype=np.float32)
+        for start in range(0, len(stale), CHUNK_ROWS):
+            chunk = stale[start:start + CHUNK_ROWS]
+            block = self.distances(chunk)
+            np.minimum(closest, block.min(axis=0), out=closest)
+            save_similar({int(self.ids[position]): neighbors for position, neighbors in zip(chunk, self.nearest(block))}, computed_at)
+
+        listing = [self.positions[artwork_id] for (artwork_id,) in db.session.query(SimilarArtwork.artwork_id).filter(
+            SimilarArtwork.similar_id.in_(stale_ids)).distinct() if artwork_id in self.positions]
+        affected = np.setdiff1d(np.union1d(np.nonzero(closest < last)[0], np.array(listing, dtype=np.int64)), stale)
+        self.recompute(affected, computed_at)
+        return {'stale': len(stale), 'affected': len(affected), 'elapsed': time.monotonic() - started}
+
+
+def save_similar(neighbors_by_artwork, computed_at):
+    """Replace the stored neighbors of the given artworks."""
+    SimilarArtwork.query.filter(SimilarArtwork.artwork_id.in_(list(neighbors_by_artwork))).delete(synchronize_session=False)
+    rows = [{'artwork_id': artwork_id, 'similar_id': similar_id, 'score': score, 'computed_at': computed_at}
+            for artwork_id, neighbors in neighbors_by_artwork.items() for similar_id, score in neighbors]
+    if rows:
+        db.session.execute(SimilarArtwork.__table__.insert(), rows)
+    db.session.commit()
+
+
+similarity_index = SimilarityIndex()
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description='Precompute similar artworks for the detail page.')
+    parser.add_argument('--refresh', action='store_true', help='Only recompute new and changed artworks')
+    args = parser.parse_args()
+
+    with create_app(with_routes=False).app_context():
+        summary = similarity_index.refresh() if args.refresh else similarity_index.rebuild_all()
+        print(f"Similar artworks: {summary}")
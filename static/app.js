@@ -33,6 +33,67 @@ document.addEventListener('DOMContentLoaded', function () {
 });
 
 
+// Background job status logic:
+// Polls /jobs/<id> while a background artwork fetch is running and shows its progress
+
+const jobStatus = document.getElementById('job-status');
+if (jobStatus) {
+    const pollJob = () => {
+        fetch(`/jobs/${jobStatus.dataset.jobId}`)
+            .then(response => response.json())
+            .then(job => {
+                if (job.status === 'done') {
+                    jobStatus.textContent = 'New artworks are ready!';
+                } else if (job.status === 'failed') {
+                    jobStatus.textContent = 'Fetching new artworks failed.';
+                } else {
+                    jobStatus.textContent = `Fetching new artworks... ${job.progress} of ${job.total || '?'}`;
+                    setTimeout(pollJob, 2000); // Poll again in 2 seconds
+                }
+            })
+            .catch(error => console.error('Error:', error));
+    };
+    pollJob();
+}
+
+
+// Search typeahead logic:
+// Fills a datalist under every search bar with suggestions from /search/suggest as the user types
+
+document.querySelectorAll('input[name="query"]').forEach((input, i) => {
+    const list = document.createElement('datalist');
+    list.id = `query-suggestions-${i}`;
+    input.after(list);
+    input.setAttribute('list', list.id);
+    input.setAttribute('autocomplete', 'off');
+
+    let timer;
+    input.addEventListener('input', function () {
+        clearTimeout(timer);
+        const prefix = input.value.trim();
+        if (prefix.length < 2) {
+            list.replaceChildren();
+            return;
+        }
+        // Wait for a pause in typing before asking the server
+        timer = setTimeout(() => {
+            fetch(`/search/suggest?q=${encodeURIComponent(prefix)}`)
+                .then(response => response.json())
+                .then(data => {
+                    if (data.query !== input.value.trim()) return; // A newer keystroke already changed the input
+                    list.replaceChildren(...data.suggestions.map(suggestion => {
+                        const option = document.createElement('option');
+                        option.value = suggestion.label;
+                        option.label = suggestion.kind;
+                        return option;
+                    }));
+                })
+                .catch(error => console.error('Error:', error));
+        }, 150);
+    });
+});
+
+
 // Color picker logic:
 document.getElementById('color-picker').addEventListener('input', function () {
     const hexColor = this.value; // Get the selected hex color value
@@ -0,0 +1,206 @@
+"""Typeahead suggestions for the search bar.
+
+Every worker keeps an in-memory prefix index of artwork titles, artist names and artwork types: a sorted
+list of lowercase keys, one per word start (so "mon" finds "Claude Monet"), searched with bisect. Each
+distinct label is weighted by how many artworks carry it plus how often those artworks were favorited.
+The top completions of every one and two letter prefix are precomputed, since those ranges are too wide
+to rank per keystroke. Newly ingested artworks go into a small pending list that is merged into the
+sorted keys once it grows, and the whole index is rebuilt in the background every REBUILD_SECONDS to
+pick up new favorites."""
+
+import bisect
+import heapq
+import logging
+import threading
+import time
+from array import array
+from flask import current_app
+from sqlalchemy import func
+from cache import LRUCache
+from models import Artwork, Favorite, Type, artworks_ingested, db
+
+logger = logging.getLogger(__name__)
+
+KINDS = ('title', 'artist', 'type')
+KEY_LENGTH = 32              # Keys are truncated; longer prefixes are checked against the label itself
+PENDING_LIMIT = 2000         # Pending keys are merged into the sorted keys past this many
+PRECOMPUTED_PREFIX = 2
+REBUILD_SECONDS = 3600
+STOPWORDS = {'a', 'an', 'and', 'at', 'by', 'for', 'in', 'of', 'on', 'the', 'to', 'with'}
+
+
+def normalize(text):
+    return ' '.join(text.lower().split())
+
+
+def word_starts(label):
+    """The label from its first word and from every later word that isn't a stopword."""
+    words = normalize(label).split(' ')
+    return {' '.join(words[i:]) for i in range(len(words)) if i == 0 or words[i] not in STOPWORDS}
+
+
+def artist_name(artist_display):
+    """AIC artist_display reads "Name\\nNationality, dates"; only the name is suggested."""
+    return (artist_display or '').split('\n')[0].strip()
+
+
+class SuggestIndex:
+    """Weighted prefix index; readers never lock, writers swap in new key lists under the lock."""
+
+    def __init__(self, top_k=20):
+        self.top_k = top_k
+        self.lock = threading.Lock()
+        self.results = LRUCache(maxsize=4096)
+        self.load([], array('B'), array('f'), {}, set())
+        self.built_at = None
+        self.rebuilding = False
+
+    def load(self, labels, kinds, weights, entries, indexed):
+        self.labels = labels        # entry -> label as first seen
+        self.kinds = kinds          # entry -> index into KINDS
+        self.weights = weights      # entry -> artworks + favorites
+        self.entries = entries      # (kind, normalized label) -> entry
+        self.indexed = indexed      # artwork IDs already counted
+        pairs = sorted((key[:KEY_LENGTH], entry) for entry, label in enumerate(labels) for key in word_starts(label))
+        self.sorted_keys = ([key for key, _ in pairs], array('I', (entry for _, entry in pairs)))
+        self.pending = []           # sorted (key, entry) not merged into sorted_keys yet
+        self.top = self.precompute()
+        self.results.clear()
+
+    def build(self):
+        """Load every title, artist and type with its artwork and favorite counts."""
+        started = time.monotonic()
+        favorites = dict(db.session.query(Favorite.artwork_id, func.count(Favorite.id)).group_by(Favorite.artwork_id).all())
+        labels, kinds, weights, entries, indexed = [], array('B'), array('f'), {}, set()
+
+        def add(kind, label, weight):
+            entry = entries.setdefault((kind, normalize(label)), len(labels))
+            if entry == len(labels):
+                labels.append(label)
+                kinds.append(kind)
+                weights.append(0)
+            weights[entry] += weight
+
+        for artwork_id, title, artist_display in db.session.query(Artwork.id, Artwork.title, Artwork.artist_display).yield_per(5000):
+            weight = 1 + favorites.get(artwork_id, 0)
+            if title:
+                add(0, title, weight)
+            if artist_name(artist_display):
+                add(1, artist_name(artist_display), weight)
+            indexed.add(artwork_id)
+        for name, count in db.session.query(Type.name, func.count(Artwork.id)).join(Artwork, Artwork.type_id == Type.id).group_by(Type.name):
+            add(2, name, count)
+
+        with self.lock:
+            self.load(labels, kinds, weights, entries, indexed)
+            self.built_at = time.monotonic()
+        logger.info(f"Suggestion index built: {len(labels)} labels, {len(self.sorted_keys[0])} keys in {time.monotonic() - started:.2f}s.")
+
+    def precompute(self):
+        """Best entries of every one and two letter prefix, from one pass over the entries by weight."""
+        top = {}
+        for entry in sorted(range(len(self.labels)), key=lambda entry: -self.weights[entry]):
+            for key in word_starts(self.labels[entry]):
+                for length in range(1, PRECOMPUTED_PREFIX + 1):
+                    bucket = top.setdefault(key[:length], [])
+                    if len(bucket) < self.top_k and entry not in bucket:
+                        bucket.append(entry)
+        return top
+
+    def add(self, rows):
+        """Count newly ingested (artwork id, title, artist_display, type name) rows into the index."""
+        with self.lock:
+            for artwork_id, title, artist_display, type_name in rows:
+                if artwork_id in self.indexed:
+                    continue
+                self.indexed.add(artwork_id)
+                for kind, label in ((0, title), (1, artist_name(artist_display)), (2, type_name)):
+                    if label:
+                        self.add_label(kind, label)
+            if len(self.pending) > PENDING_LIMIT:
+                keys, key_entries = self.sorted_keys
+                pairs = list(heapq.merge(zip(keys, key_entries), self.pending))
+                self.sorted_keys = ([key for key, _ in pairs], array('I', (entry for _, entry in pairs)))
+                self.pending = []
+            self.results.clear()
+
+    def add_label(self, kind, label):
+        entry = self.entries.get((kind, normalize(label)))
+        if entry is None:
+            entry = self.entries[(kind, normalize(label))] = len(self.labels)
+            self.labels.append(label)
+            self.kinds.append(kind)
+            self.weights.append(0)
+            pending = list(self.pending)
+            for key in word_starts(label):
+                bisect.insort(pending, (key[:KEY_LENGTH], entry))
+            self.pending = pending
+        self.weights[entry] += 1
+
+        for key in word_starts(label):
+            for length in range(1, PRECOMPUTED_PREFIX + 1):
+                bucket = [other for other in self.top.get(key[:length], []) if other != entry] + [entry]
+                self.top[key[:length]] = sorted(bucket, key=lambda other: -self.weights[other])[:self.top_k]
+
+    def candidates(self, prefix):
+        """Entries with a word start beginning with prefix."""
+        key = prefix[:KEY_LENGTH]
+        (keys, key_entries), pending = self.sorted_keys, self.pending
+        found = set(key_entries[bisect.bisect_left(keys, key):bisect.bisect_left(keys, key + '\uffff')])
+        found.update(entry for _, entry in pending[bisect.bisect_left(pending, (key,)):bisect.bisect_left(pending, (key + '\uffff',))])
+        if len(prefix) > KEY_LENGTH:
+            found = {entry for entry in found if any(start.startswith(prefix) for start in word_starts(self.labels[entry]))}
+        return found
+
+    def suggest(self, prefix, k=8):
+        """Return the k best [{'label', 'kind'}] completions of prefix."""
+        prefix = normalize(prefix)
+        k = min(k, self.top_k)
+        if not prefix:
+            return []
+        suggestions = self.results.get((prefix, k))
+        if suggestions is None:
+            if len(prefix) <= PRECOMPUTED_PREFIX:
+                best = self.top.get(prefix, [])[:k]
+            else:
+                best = heapq.nlargest(k, self.candidates(prefix), key=lambda entry: self.weights[entry])
+            suggestions = [{'label': self.labels[entry], 'kind': KINDS[self.kinds[entry]]} for entry in best]
+            self.results.set((prefix, k), suggestions)
+        return suggestions
+
+    def ensure_built(self):
+        """Build on first use; once REBUILD_SECONDS old, rebuild in a background thread while serving the old index."""
+        if self.built_at is None:
+            self.build()
+        elif time.monotonic() - self.built_at > REBUILD_SECONDS and not self.rebuilding:
+            self.rebuilding = True
+            app = current_app._get_current_object()
+
+            def rebuild():
+                try:
+                    with app.app_context():
+                        self.build()
+                except Exception as e:
+                    logger.warning(f"Suggestion index rebuild failed: {e}")
+                finally:
+                    self.rebuilding = False
+
+            threading.Thread(target=rebuild, daemon=True).start()
+
+    def on_ingested(self, sender, ids=(), **kwargs):
+        if self.built_at is None or not ids:
+            return  # The first build reads everything
+        rows = db.session.query(Artwork.id, Artwork.title, Artwork.artist_display, Type.name).outerjoin(
+            Type, Artwork.type_id == Type.id
+        ).filter(Artwork.id.in_(list(ids))).all()
+        self.add(rows)
+
+
+suggest_index = SuggestIndex()
+artworks_ingested.connect(suggest_index.on_ingested, weak=False)
+
+
+def suggest(prefix, k=8):
+    """Top-k typeahead completions (titles, artists, types) of what was typed so far."""
+    suggest_index.ensure_built()
+    return suggest_index.suggest(prefix, k)
@@ -0,0 +1,105 @@
+"""   Sync.py
+
+Incremental catalog sync. Pulls only the artworks the AIC API reports as modified since the last run,
+ordered by (updated_at, id), and upserts each page in bulk; rows whose content hash is unchanged are
+skipped by Artwork.bulk_upsert. After every saved page the high-water mark (the last updated_at and id seen)
+is committed as a checkpoint, so a crashed or interrupted sync resumes where it stopped; a page that
+fails to save stops the run without moving the checkpoint. The first run
+without a checkpoint walks the whole catalog; import_dump.py leaves a checkpoint behind so a sync after a
+dump import only fetches what changed since the dump.
+
+- To run once (e.g. from cron every 15 minutes):
+- Open Terminal
+- Type in:  python sync.py
+- Options:  --since 2024-07-01T00:00:00Z to start from a given time, --max-pages N to bound one run """
+
+import argparse
+import json
+import logging
+import time
+import requests
+import api
+from api import ARTWORK_FIELDS, TokenBucket, request_json, save_artworks
+from models import SyncCheckpoint
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_NAME = 'delta_sync'
+SYNC_PAGE_SIZE = 100
+SYNC_FIELDS = ARTWORK_FIELDS + ',updated_at'
+EPOCH = '1970-01-01T00:00:00Z'
+
+
+def changed_since_params(mark, last_id, limit=SYNC_PAGE_SIZE):
+    """Search params for the next page of artworks modified after (mark, last_id), oldest first.
+
+    The keyset condition is updated_at > mark, or updated_at == mark with a larger id, so pages never
+    overlap or skip rows that share a timestamp."""
+    query = {'bool': {'should': [
+        {'range': {'updated_at': {'gt': mark}}},
+        {'bool': {'must': [{'term': {'updated_at': mark}}, {'range': {'id': {'gt': last_id}}}]}},
+    ], 'minimum_should_match': 1}}
+    body = {'query': query, 'sort': [{'updated_at': 'asc'}, {'id': 'asc'}], 'fields': SYNC_FIELDS.split(','), 'limit': limit}
+    return {'params': json.dumps(body)}
+
+
+def sync(since=None, max_pages=None, limit=SYNC_PAGE_SIZE, api_url=None, session=None, bucket=None, on_page=None):
+    """Fetch and save every artwork changed since the checkpoint (or `since`); returns a summary.
+
+    api_url defaults to api.API_URL at call time. on_page, if given, is called with the running summary
+    after each page (used for job progress)."""
+    api_url = api_url or api.API_URL
+    checkpoint = {'updated_at': since, 'last_id': 0} if since else SyncCheckpoint.load(CHECKPOINT_NAME, {'updated_at': EPOCH, 'last_id': 0})
+    bucket = bucket or TokenBucket()
+    summary = {'pages': 0, 'fetched': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0, 'failed': 0, 'complete': False, 'error': None}
+    started = time.monotonic()
+    logger.info(f"Syncing artworks changed since {checkpoint['updated_at']} (after id {checkpoint['last_id']}).")
+
+    while max_pages is None or summary['pages'] < max_pages:
+        try:
+            params = changed_since_params(checkpoint['updated_at'], checkpoint['last_id'], limit)
+            page = request_json(f"{api_url}/search", params, session=session, bucket=bucket).get('data', [])
+        except (requests.RequestException, ValueError) as e:
+            logger.error(f"Sync stopped at {checkpoint}: {e}")
+            summary['error'] = str(e)
+            break
+
+        if page:
+            counts = save_artworks(page)
+            for key in ('inserted', 'updated', 'unchanged', 'failed'):
+                summary[key] += counts[key]
+            summary['fetched'] += len(page)
+            if counts['failed']:
+                # Keep the checkpoint before this page, so the next run fetches it again
+                summary['error'] = f"{counts['failed']} of {len(page)} artworks after {checkpoint} failed to save"
+                logger.error(f"Sync stopped: {summary['error']}")
+                break
+            summary['pages'] += 1
+
+            last = page[-1]
+            checkpoint = {'updated_at': last.get('updated_at') or checkpoint['updated_at'], 'last_id': last['id']}
+            SyncCheckpoint.save(CHECKPOINT_NAME, checkpoint)
+            if on_page:
+                on_page(summary)
+
+        if len(page) < limit:
+            summary['complete'] = True
+            break
+
+    summary['checkpoint'] = checkpoint
+    summary['elapsed'] = time.monotonic() - started
+    logger.info(f"Sync {'finished' if summary['complete'] else 'paused'}: {summary['fetched']} fetched in {summary['pages']} pages, "
+                f"{summary['inserted']} inserted, {summary['updated']} updated, {summary['unchanged']} unchanged.")
+    return summary
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description='Pull artworks changed since the last sync.')
+    parser.add_argument('--since', help='ISO timestamp to sync from, ignoring the stored checkpoint')
+    parser.add_argument('--max-pages', type=int, help='Stop after this many pages (the next run resumes)')
+    args = parser.parse_args()
+
+    with create_app(with_routes=False).app_context():
+        sync(since=args.since, max_pages=args.max_pages)
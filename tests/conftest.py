@@ -0,0 +1,74 @@
+import json
+from datetime import timedelta
+from pathlib import Path
+import pytest
+import requests
+from app import create_app
+from models import User, db
+from views import CURR_USER_KEY
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+
+
+def make_app(tmp_path, with_routes, **overrides):
+    return create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'curated.db'}",
+        'SQLALCHEMY_BINDS': {},
+        'SECRET_KEY': 'test',
+        'SEARCH_CACHE_BACKEND': 'memory',
+        'WARM_START': False,
+        'IMAGE_CACHE_DIR': str(tmp_path / 'images'),
+        **overrides,
+    }, with_routes=with_routes)
+
+
+@pytest.fixture
+def app(tmp_path):
+    """App on a fresh SQLite database, with the tables created and an app context pushed."""
+    app = make_app(tmp_path, with_routes=False)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def web_app(tmp_path):
+    """Like `app`, with the routes and request hooks."""
+    app = make_app(tmp_path, with_routes=True, TESTING=True)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(web_app):
+    return web_app.test_client()
+
+
+@pytest.fixture
+def user(web_app):
+    user = User(username='seurat', email='seurat@example.com', password='not-a-hash', first_name='Georges')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def log_in(client, user):
+    with client.session_transaction() as session:
+        session[CURR_USER_KEY] = user.id
+
+
+def load_fixture(name):
+    return json.loads((FIXTURES / name).read_text())
+
+
+def json_response(payload, status_code=200):
+    """A requests.Response carrying a JSON body, as returned by Session.get."""
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(payload).encode()
+    response.headers['Content-Type'] = 'application/json'
+    response.elapsed = timedelta(0)
+    return response
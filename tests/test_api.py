@@ -0,0 +1,22 @@
+import api
+from conftest import json_response
+from sync import sync
+
+
+class RecordingSession:
+    def __init__(self):
+        self.urls = []
+
+    def get(self, url, params=None, timeout=None):
+        self.urls.append(url)
+        return json_response({'data': []})
+
+
+def test_api_url_is_resolved_when_called(app, monkeypatch):
+    monkeypatch.setattr(api, 'API_URL', 'http://stub.test/api/v1/artworks')
+    session = RecordingSession()
+
+    api.fetch_artworks_concurrently(1, 3, batch_size=2, session=session)
+    sync(session=session)
+
+    assert session.urls == ['http://stub.test/api/v1/artworks', 'http://stub.test/api/v1/artworks/search']
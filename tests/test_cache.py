@@ -0,0 +1,36 @@
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from cache import SQLCacheBackend
+from models import CachedResponse, db
+
+
+def test_sql_backend_hits_leave_the_session_alone(app):
+    backend = SQLCacheBackend()
+    backend.set('monet', [{'id': 16568}], ttl=300)
+    statements = []
+    event.listen(db.engine, 'before_cursor_execute', lambda conn, cursor, statement, *args: statements.append(statement))
+
+    assert backend.get('monet') == [{'id': 16568}]
+    assert backend.get('monet') == [{'id': 16568}]
+    assert not any(statement.startswith('UPDATE') for statement in statements)
+    assert not db.session.dirty and not db.session.info.get('wrote')
+
+
+def test_sql_backend_touches_stale_hits(app):
+    backend = SQLCacheBackend()
+    backend.set('monet', [{'id': 16568}], ttl=3600)
+    long_ago = datetime.utcnow() - timedelta(minutes=30)
+    db.session.get(CachedResponse, 'monet').accessed_at = long_ago
+    db.session.commit()
+
+    assert backend.get('monet') == [{'id': 16568}]
+    db.session.expire_all()
+    assert db.session.get(CachedResponse, 'monet').accessed_at > long_ago
+
+
+def test_sql_backend_misses_expired_entries(app):
+    backend = SQLCacheBackend()
+    backend.set('monet', [{'id': 16568}], ttl=-1)
+    assert backend.get('monet') is None
+    backend.set('hopper', [{'id': 111628}], ttl=300)
+    assert backend.size() == 1  # set() prunes the expired row
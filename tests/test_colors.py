@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta
+from colors import ColorIndex
+from models import Artwork, db
+
+
+def add_artwork(artwork_id, h, s, l, updated_at):
+    """Save an artwork the way another process would: straight to the table, without artworks_ingested."""
+    db.session.add(Artwork(id=artwork_id, title=f"Artwork {artwork_id}", color_h=h, color_s=s, color_l=l, updated_at=updated_at))
+    db.session.commit()
+
+
+def test_search_picks_up_artworks_saved_by_other_processes(app):
+    now = datetime.utcnow()
+    add_artwork(1, 220, 80, 40, now)
+    index = ColorIndex(catch_up_seconds=0)
+    assert [artwork_id for artwork_id, _ in index.search(220, 80, 40)] == [1]
+
+    # Committed late by a long ingest, so stamped before the newest row the index has seen
+    add_artwork(2, 222, 78, 42, now - timedelta(minutes=1))
+    add_artwork(3, 221, 80, 40, now + timedelta(minutes=1))
+
+    assert {artwork_id for artwork_id, _ in index.search(220, 80, 40)} == {1, 2, 3}
+    assert index.updated_through == now + timedelta(minutes=1)
+
+
+def test_catch_up_waits_for_its_interval(app):
+    add_artwork(1, 10, 90, 50, datetime.utcnow())
+    index = ColorIndex(catch_up_seconds=3600)
+    index.build()
+
+    add_artwork(2, 10, 90, 50, datetime.utcnow())
+
+    assert [artwork_id for artwork_id, _ in index.search(10, 90, 50)] == [1]
@@ -0,0 +1,23 @@
+import pytest
+import config
+from app import create_app
+
+
+def test_database_url_and_secret_key_come_from_the_environment():
+    settings = config.from_env({'DATABASE_URL': 'postgres://curated@db/curated', 'SECRET_KEY': 'from-env'})
+    assert settings['SQLALCHEMY_DATABASE_URI'] == 'postgresql://curated@db/curated'
+    assert settings['SECRET_KEY'] == 'from-env'
+
+
+@pytest.mark.parametrize('environ, missing', [
+    ({}, 'DATABASE_URL and SECRET_KEY'),
+    ({'DATABASE_URL': 'sqlite://'}, 'SECRET_KEY'),
+    ({'SECRET_KEY': 'from-env'}, 'DATABASE_URL'),
+])
+def test_startup_fails_without_required_settings(monkeypatch, environ, missing):
+    monkeypatch.delenv('DATABASE_URL', raising=False)
+    monkeypatch.delenv('SECRET_KEY', raising=False)
+    for key, value in environ.items():
+        monkeypatch.setenv(key, value)
+    with pytest.raises(RuntimeError, match=f"Set {missing} in the environment"):
+        create_app(with_routes=False)
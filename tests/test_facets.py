@@ -0,0 +1,58 @@
+from werkzeug.datastructures import MultiDict
+from facets import facet_counts, facet_options, facet_counts_cache, filter_artworks, parse_filters
+from models import Artwork
+
+
+def payload(artwork_id, date_start, date_end, origin='France', artwork_type='Painting', classifications=('painting',)):
+    return {'id': artwork_id, 'title': f"Artwork {artwork_id}", 'date_start': date_start, 'date_end': date_end,
+            'place_of_origin': origin, 'artwork_type_title': artwork_type, 'classification_titles': list(classifications)}
+
+
+def add_catalog():
+    facet_counts_cache.clear()
+    Artwork.bulk_upsert([
+        payload(1, 1884, 1886),
+        payload(2, 1899, 1901),
+        payload(3, 1900, 1900, origin='United States'),
+        payload(4, 1942, 1942, origin='United States', classifications=('painting', 'oil on canvas')),
+        payload(5, 1760, 1765, origin='England', artwork_type='Print', classifications=('print',)),
+        payload(6, -100, -90, origin='Italy', artwork_type='Sculpture', classifications=('sculpture',)),
+        payload(7, -101, -101, origin='Italy', artwork_type='Sculpture', classifications=('sculpture',)),
+        payload(8, -1, 5, origin='Italy', artwork_type='Sculpture', classifications=('sculpture',)),
+    ])
+
+
+def test_eras_are_centuries_of_the_start_year(app):
+    add_catalog()
+
+    counts = facet_counts({})
+
+    # Oldest first; BC years belong to the century counted back from 1 BC
+    assert counts['era'] == [('-200', 1), ('-100', 2), ('1700', 1), ('1800', 2), ('1900', 2)]
+    labels = [label for label, _, _, _ in facet_options({}, counts)['era']]
+    assert labels == ['200s BC', '100s BC', '1700s', '1800s', '1900s']
+
+
+def test_era_filter_matches_overlapping_date_ranges(app):
+    add_catalog()
+    filters = parse_filters(MultiDict({'date_from': '1900', 'date_to': '1999'}))
+
+    artworks, next_after_id = filter_artworks(filters)
+
+    # Artwork 2 starts in 1899 but runs into the 1900s
+    assert [artwork.id for artwork in artworks] == [2, 3, 4]
+    assert next_after_id is None
+
+
+def test_each_facet_is_counted_under_the_other_filters(app):
+    add_catalog()
+
+    counts = facet_counts({'origin': 'United States', 'type': 'Painting'})
+
+    assert counts['type'] == [('Painting', 2)]
+    assert counts['origin'] == [('France', 2), ('United States', 2)]  # Not narrowed by its own filter
+    assert counts['classification'] == [('painting', 2), ('oil on canvas', 1)]
+    assert counts['era'] == [('1900', 2)]
+
+    options = facet_options({'origin': 'United States'}, counts)['origin']
+    assert options == [('France', 2, {'origin': 'France'}, False), ('United States', 2, {'origin': None}, True)]
@@ -0,0 +1,55 @@
+from sqlalchemy import event
+from conftest import log_in
+from models import Artwork, Favorite, db
+
+
+def add_artwork(artwork_id=27992):
+    db.session.add(Artwork(id=artwork_id, title='A Sunday on La Grande Jatte'))
+    db.session.commit()
+
+
+def test_toggle(client, user):
+    add_artwork()
+    log_in(client, user)
+
+    assert client.post('/artwork/27992/favorite').get_json()['liked'] is True
+    assert Favorite.query.filter_by(user_id=user.id, artwork_id=27992).count() == 1
+    assert client.post('/artwork/27992/favorite').get_json()['liked'] is False
+    assert Favorite.query.count() == 0
+
+
+def test_concurrent_add_reports_the_existing_favorite(client, user):
+    add_artwork()
+    log_in(client, user)
+    user_id = user.id
+
+    # Another request inserts the same favorite between this request's check and its insert
+    raced = []
+    def race(session, flush_context, instances):
+        if not raced:
+            raced.append(True)
+            with db.engine.begin() as connection:
+                connection.execute(Favorite.__table__.insert().values(user_id=user_id, artwork_id=27992))
+    session_class = db.session.registry().__class__
+    event.listen(session_class, 'before_flush', race)
+    try:
+        response = client.post('/artwork/27992/favorite')
+    finally:
+        event.remove(session_class, 'before_flush', race)
+
+    assert response.status_code == 200
+    assert response.get_json()['liked'] is True
+    assert Favorite.query.filter_by(user_id=user_id, artwork_id=27992).count() == 1
+
+
+def test_favoriting_a_missing_artwork_is_a_404(client, user):
+    # SQLite only enforces the artwork foreign key when asked to
+    @event.listens_for(db.engine, 'connect')
+    def enforce_foreign_keys(connection, record):
+        connection.execute('PRAGMA foreign_keys = ON')
+    db.engine.dispose()
+    log_in(client, user)
+
+    response = client.post('/artwork/404/favorite')
+    assert response.status_code == 404
+    assert Favorite.query.count() == 0
@@ -0,0 +1,32 @@
+from datetime import datetime
+from conftest import log_in
+from models import Artwork, db
+
+
+def add_artwork():
+    db.session.add(Artwork(id=1, title='Nighthawks', artist_display='Edward Hopper', updated_at=datetime(2024, 1, 1)))
+    db.session.commit()
+
+
+def test_unchanged_page_answers_304_on_its_etag(client):
+    add_artwork()
+    first = client.get('/artwork/1')
+    assert first.status_code == 200
+
+    again = client.get('/artwork/1', headers={'If-None-Match': first.headers['ETag']})
+
+    assert again.status_code == 304
+
+
+def test_last_modified_alone_does_not_answer_304(client, user):
+    add_artwork()
+    anonymous = client.get('/artwork/1')
+    log_in(client, user)
+
+    # The artwork is unchanged, but the page now shows the logged-in navigation and favorite button
+    revalidated = client.get('/artwork/1', headers={'If-Modified-Since': anonymous.headers['Last-Modified']})
+    assert revalidated.status_code == 200
+
+    stale = client.get('/artwork/1', headers={'If-None-Match': anonymous.headers['ETag'],
+                                              'If-Modified-Since': anonymous.headers['Last-Modified']})
+    assert stale.status_code == 200
@@ -0,0 +1,97 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from conftest import make_app
+from models import db
+
+IMAGE_ID = '831a05de-d3f6-f4fa-a460-23008dd58dda'
+
+
+class StubIIIF:
+    """IIIF image server knowing one image; records the paths it was asked for."""
+
+    def __init__(self):
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stub.requests.append(self.path)
+                # /iiif/2/<image_id>/full/<width>,/0/default.jpg
+                image_id, width = self.path.split('/')[3], self.path.split('/')[5].rstrip(',')
+                if image_id != IMAGE_ID:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = b'\xff\xd8' + width.encode() * 100
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/jpeg')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/iiif/2"
+
+
+@pytest.fixture
+def iiif():
+    stub = StubIIIF()
+    yield stub
+    stub.server.shutdown()
+    stub.server.server_close()
+
+
+@pytest.fixture
+def client(tmp_path, iiif):
+    app = make_app(tmp_path, with_routes=True, TESTING=True, IIIF_URL=iiif.url)
+    with app.app_context():
+        db.create_all()
+        yield app.test_client()
+        db.session.remove()
+
+
+def test_derivative_is_fetched_once_and_cached_on_disk(client, iiif, tmp_path):
+    response = client.get(f"/images/{IMAGE_ID}/400.jpg")
+    assert response.status_code == 200
+    assert response.data == b'\xff\xd8' + b'400' * 100
+    assert iiif.requests == [f"/iiif/2/{IMAGE_ID}/full/400,/0/default.jpg"]
+    with open(os.path.join(tmp_path, 'images', f"{IMAGE_ID}_400.jpg"), 'rb') as f:
+        assert f.read() == response.data
+
+    # Served from disk the second time
+    again = client.get(f"/images/{IMAGE_ID}/400.jpg")
+    assert again.data == response.data
+    assert len(iiif.requests) == 1
+
+
+def test_cache_headers_and_conditional_get(client):
+    response = client.get(f"/images/{IMAGE_ID}/200.jpg")
+    assert response.headers['ETag'] == f'"{IMAGE_ID}-200"'
+    assert response.cache_control.immutable
+    assert response.cache_control.public
+    assert response.cache_control.max_age == 365 * 24 * 3600
+
+    not_modified = client.get(f"/images/{IMAGE_ID}/200.jpg", headers={'If-None-Match': response.headers['ETag']})
+    assert not_modified.status_code == 304
+    assert not_modified.data == b''
+
+
+def test_upstream_miss_is_a_404(client, iiif, tmp_path):
+    response = client.get('/images/00000000-0000-0000-0000-000000000000/400.jpg')
+    assert response.status_code == 404
+    assert len(iiif.requests) == 1
+    assert not os.path.exists(os.path.join(tmp_path, 'images', '00000000-0000-0000-0000-000000000000_400.jpg'))
+
+
+def test_unknown_widths_never_reach_upstream(client, iiif):
+    assert client.get(f"/images/{IMAGE_ID}/401.jpg").status_code == 404
+    assert iiif.requests == []
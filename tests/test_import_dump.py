@@ -0,0 +1,37 @@
+import json
+import tarfile
+from import_dump import is_artwork_file, read_entries
+
+
+def make_dump(root):
+    """A small dump unpacked under a directory that is itself named artworks."""
+    dump = root / 'artworks' / 'dump'
+    for name, record in [('json/artworks/2.json', {'id': 2}), ('json/artworks/10.json', {'id': 10}),
+                         ('json/agents/1.json', {'id': 1}), ('json/artworks/README.txt', None)]:
+        (dump / name).parent.mkdir(parents=True, exist_ok=True)
+        (dump / name).write_text(json.dumps(record))
+    return dump
+
+
+def test_is_artwork_file():
+    assert is_artwork_file('json/artworks/27992.json')
+    assert is_artwork_file('artic-api-data/json/artworks/27992.json')
+    assert not is_artwork_file('json/agents/27992.json')
+    assert not is_artwork_file('artworks/json/agents/27992.json')
+    assert not is_artwork_file('json/artworks/README.txt')
+    assert not is_artwork_file('27992.json')
+
+
+def test_read_entries_ignores_the_directories_above_the_dump(tmp_path):
+    dump = make_dump(tmp_path)
+    ids = [json.loads(raw)['id'] for name, raw in read_entries(str(dump))]
+    assert ids == [10, 2]
+    assert [json.loads(raw)['id'] for name, raw in read_entries(str(dump), skip=1)] == [2]
+
+
+def test_read_entries_from_an_archive(tmp_path):
+    dump = make_dump(tmp_path)
+    archive_path = tmp_path / 'artic-api-data.tar.gz'
+    with tarfile.open(archive_path, 'w:gz') as archive:
+        archive.add(dump, arcname='artic-api-data')
+    assert sorted(json.loads(raw)['id'] for name, raw in read_entries(str(archive_path))) == [2, 10]
@@ -0,0 +1,96 @@
+import json
+from datetime import datetime, timedelta
+import jobs
+from conftest import log_in
+from models import IngestJob
+
+
+def fake_fetch(summaries):
+    """fetch_artworks_concurrently returning the given summaries, one per call."""
+    def fetch(start_id, end_id, batch_size, keep_data=True, on_batch=None):
+        return {'batches': 2, 'unchanged': 0, 'failed': 0, 'elapsed': 0.1, **summaries.pop(0)}
+    return fetch
+
+
+def test_id_range_with_failed_batches_is_retried_after_a_backoff(app, monkeypatch):
+    monkeypatch.setattr(jobs, 'fetch_artworks_concurrently', fake_fetch([
+        {'fetched': 0, 'inserted': 0, 'updated': 0, 'failed_batches': [[1, 100], [101, 200]]},
+        {'fetched': 100, 'inserted': 100, 'updated': 0, 'failed_batches': [[101, 200]]},
+        {'fetched': 0, 'inserted': 0, 'updated': 0, 'failed_batches': [[1, 100], [101, 200]]},
+    ]))
+    job = jobs.enqueue_id_range(1, 201)
+
+    jobs.run_job(jobs.claim_job())
+    assert job.status == 'queued'
+    assert job.run_after > datetime.utcnow() + jobs.RETRY_BACKOFF / 2
+    assert '2 of 2 batches failed' in job.error
+    assert jobs.claim_job() is None  # Still backing off
+
+    for attempt in (2, 3):
+        job.run_after = datetime.utcnow() - timedelta(seconds=1)
+        jobs.run_job(jobs.claim_job())
+        assert job.attempts == attempt
+    assert job.status == 'failed'
+    assert job.finished_at is not None
+
+    # The partly saved range still refreshes the similar artworks
+    assert IngestJob.query.filter_by(kind='similar_refresh', status='queued').count() == 1
+
+
+def test_similar_refresh_is_queued_only_when_rows_changed(app, monkeypatch):
+    monkeypatch.setattr(jobs, 'fetch_artworks_concurrently', fake_fetch([
+        {'fetched': 200, 'inserted': 0, 'updated': 0, 'unchanged': 200, 'failed_batches': []},
+        {'fetched': 200, 'inserted': 0, 'updated': 3, 'unchanged': 197, 'failed_batches': []},
+    ]))
+
+    unchanged = jobs.enqueue_id_range(1, 201)
+    jobs.run_job(jobs.claim_job())
+    assert unchanged.status == 'done'
+    assert json.loads(unchanged.result)['fetched'] == 200
+    assert IngestJob.query.filter_by(kind='similar_refresh').count() == 0
+
+    changed = jobs.enqueue_id_range(1, 201)
+    jobs.run_job(jobs.claim_job())
+    assert changed.status == 'done'
+    assert IngestJob.query.filter_by(kind='similar_refresh').count() == 1
+
+
+def test_empty_range_is_done(app, monkeypatch):
+    monkeypatch.setattr(jobs, 'fetch_artworks_concurrently', fake_fetch([
+        {'fetched': 0, 'inserted': 0, 'updated': 0, 'failed_batches': []},
+    ]))
+    job = jobs.enqueue_id_range(900001, 900201)
+    jobs.run_job(jobs.claim_job())
+    assert job.status == 'done'
+    assert job.error is None
+
+
+def test_incomplete_sync_is_retried(app, monkeypatch):
+    monkeypatch.setattr(jobs, 'sync', lambda on_page=None: {
+        'fetched': 100, 'inserted': 100, 'updated': 0, 'unchanged': 0, 'failed': 0, 'complete': False,
+        'error': '503 Server Error', 'elapsed': 1.0})
+    job = jobs.enqueue_sync()
+    jobs.run_job(jobs.claim_job())
+    assert job.status == 'queued'
+    assert job.error == '503 Server Error'
+    assert job.run_after is not None
+
+
+def test_job_status_is_only_shown_to_the_user_who_started_it(client, user):
+    job = jobs.enqueue_id_range(1, 201)
+    assert client.get(f"/jobs/{job.id}").status_code == 401
+
+    log_in(client, user)
+    assert client.get(f"/jobs/{job.id}").status_code == 404
+
+    with client.session_transaction() as session:
+        session['ingest_job_id'] = job.id
+    assert client.get(f"/jobs/{job.id}").json['status'] == 'queued'
+    with client.session_transaction() as session:
+        assert session['ingest_job_id'] == job.id
+
+    # Forgotten once finished, so the dashboard stops polling it
+    job.status = 'done'
+    assert client.get(f"/jobs/{job.id}").json['status'] == 'done'
+    with client.session_transaction() as session:
+        assert 'ingest_job_id' not in session
@@ -0,0 +1,21 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from conftest import make_app
+from metrics import request_stats
+from models import db
+
+
+def test_failed_statements_leave_no_timing_behind(tmp_path):
+    app = make_app(tmp_path, with_routes=True, TESTING=True)
+    with app.test_request_context():
+        connection = db.session.connection()
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                connection.execute(text('SELECT * FROM no_such_table'))
+        assert connection.connection.info.get('query_started') == []
+
+        connection.execute(text('SELECT 1'))
+        stats = request_stats()
+        assert stats['sql_count'] == 1
+        assert 0 <= stats['sql_time'] < 1
@@ -0,0 +1,56 @@
+from sqlalchemy import event
+from api import get_suggested_artworks
+from models import Artwork, Favorite, Suggestion, User, db
+from recommend import update_for_favorite
+
+
+def seed_favorites():
+    """A user who favorited two Monets before suggestion lists existed, and four more Monets to suggest."""
+    user = User(username='morisot', email='morisot@example.com', password='not-a-hash')
+    db.session.add(user)
+    db.session.add_all(Artwork(id=artwork_id, title=f"Water Lilies {artwork_id}", artist_display='Claude Monet',
+                               artwork_type_title='Painting', date_start=1900 + artwork_id) for artwork_id in range(1, 7))
+    db.session.flush()
+    db.session.add_all([Favorite(user_id=user.id, artwork_id=1), Favorite(user_id=user.id, artwork_id=2)])
+    db.session.commit()
+    return user
+
+
+def test_page_loads_never_write(app):
+    user = seed_favorites()
+    writes = []
+
+    def record_writes(conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith('SELECT'):
+            writes.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', record_writes)
+    try:
+        get_suggested_artworks(user)
+        get_suggested_artworks(user)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record_writes)
+
+    assert writes == []
+    assert Suggestion.query.count() == 0
+
+
+def test_first_toggle_builds_the_list_in_full(app):
+    user = seed_favorites()
+    db.session.add(Favorite(user_id=user.id, artwork_id=3))
+    db.session.commit()
+
+    update_for_favorite(user.id, 3, liked=True)
+
+    assert user.suggestions_built_at is not None
+    # Candidates come from every favorite, not only the one toggled
+    assert {suggestion.artwork_id for suggestion in Suggestion.query.filter_by(user_id=user.id)} == {4, 5, 6}
+    assert {artwork.id for artwork in get_suggested_artworks(user)} == {4, 5, 6}
+
+    # Later toggles update the built list incrementally
+    built_at = user.suggestions_built_at
+    db.session.add(Favorite(user_id=user.id, artwork_id=4))
+    db.session.commit()
+    update_for_favorite(user.id, 4, liked=True)
+    db.session.refresh(user)
+    assert user.suggestions_built_at == built_at
+    assert {suggestion.artwork_id for suggestion in Suggestion.query.filter_by(user_id=user.id)} == {5, 6}
@@ -0,0 +1,30 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+from models import Artwork
+from render_cache import artwork_version
+
+ROOT = Path(__file__).parent.parent
+PRINT_VERSIONS = """
+from models import Artwork
+from render_cache import artwork_version
+print(artwork_version(Artwork(id=1, title='Nighthawks', date_start=1942)))
+print(artwork_version({'id': 1, 'title': 'Nighthawks', 'is_liked': True}))
+"""
+
+
+def versions_with_hash_seed(seed):
+    env = {**os.environ, 'PYTHONHASHSEED': str(seed)}
+    return subprocess.run([sys.executable, '-c', PRINT_VERSIONS], cwd=ROOT, env=env, capture_output=True, text=True, check=True).stdout
+
+
+def test_version_is_the_same_in_every_process():
+    assert versions_with_hash_seed(1) == versions_with_hash_seed(2)
+
+
+def test_version_follows_the_data():
+    artwork = Artwork(id=1, title='Nighthawks', date_start=1942)
+    assert artwork_version(artwork) == artwork_version(Artwork(id=1, title='Nighthawks', date_start=1942))
+    assert artwork_version(artwork) != artwork_version(Artwork(id=1, title='Nighthawks', date_start=1943))
+    assert artwork_version({'id': 1, 'is_liked': True}) == artwork_version({'id': 1, 'is_liked': False})
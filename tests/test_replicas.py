@@ -0,0 +1,67 @@
+import shutil
+import sqlite3
+import pytest
+from conftest import log_in, make_app
+from models import Artwork, IngestJob, User, db
+from replicas import replica_health
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Primary and replica SQLite files holding the same user and artwork; later writes reach only the primary."""
+    replica_health.clear()
+    app = make_app(tmp_path, with_routes=True, TESTING=True,
+                   SQLALCHEMY_BINDS={'replica_0': f"sqlite:///{tmp_path / 'replica.db'}"})
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, username='hopper', email='hopper@example.com', password='not-a-hash'))
+        db.session.add(Artwork(id=111628, title='Nighthawks'))
+        db.session.commit()
+        db.engine.dispose()
+        shutil.copy(tmp_path / 'curated.db', tmp_path / 'replica.db')
+
+        # Only on the primary: the replica has not caught up with this job yet
+        db.session.add(IngestJob(id=7, kind='id_range', dedupe_key='id_range:1:101', params='{}', status='queued'))
+        db.session.commit()
+        db.session.remove()
+        yield app
+        db.session.remove()
+    # init_app registered a metadata for the replica bind on the shared db; later apps have no such bind
+    db.metadatas.pop('replica_0', None)
+
+
+def favorites_in(path):
+    with sqlite3.connect(path) as connection:
+        return connection.execute('SELECT user_id, artwork_id FROM favorites').fetchall()
+
+
+def test_reads_use_the_replica(app):
+    with app.test_request_context():
+        assert db.session.get(IngestJob, 7) is None
+        assert db.session.get(Artwork, 111628).title == 'Nighthawks'
+    # Outside a request (scripts, the worker) everything uses the primary
+    assert db.session.get(IngestJob, 7) is not None
+
+
+def test_writes_go_to_the_primary_and_stick(app, tmp_path):
+    client = app.test_client()
+    log_in(client, db.session.get(User, 1))
+    with client.session_transaction() as session:
+        session['ingest_job_id'] = 7
+    assert client.get('/jobs/7').status_code == 404  # Read from the replica
+
+    assert client.post('/artwork/111628/favorite').get_json()['liked'] is True
+    assert favorites_in(tmp_path / 'curated.db') == [(1, 111628)]
+    assert favorites_in(tmp_path / 'replica.db') == []
+
+    # After writing, the user's next requests read from the primary
+    assert client.get('/jobs/7').status_code == 200
+
+
+def test_reads_after_a_write_in_the_same_request_use_the_primary(app):
+    with app.test_request_context():
+        assert db.session.get(IngestJob, 7) is None
+        db.session.add(IngestJob(id=8, kind='id_range', dedupe_key='id_range:101:201', params='{}', status='queued'))
+        db.session.commit()
+        assert db.session.get(IngestJob, 7) is not None
+        assert db.session.get(IngestJob, 8) is not None
@@ -0,0 +1,55 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import inspect, text
+from models import ADDED_COLUMNS, Artwork, db, upgrade_schema
+
+# The artworks table as the first release created it
+ORIGINAL_ARTWORKS = """CREATE TABLE artworks (
+    id INTEGER NOT NULL, title VARCHAR NOT NULL, alt_titles VARCHAR, artist_display VARCHAR, date_start INTEGER,
+    date_end INTEGER, date_display VARCHAR, place_of_origin VARCHAR, classification_titles VARCHAR, edition VARCHAR,
+    color VARCHAR, dimensions VARCHAR, description VARCHAR, image_id VARCHAR, artwork_type_title VARCHAR,
+    api_link VARCHAR, medium_display VARCHAR, type_id INTEGER, PRIMARY KEY (id), FOREIGN KEY(type_id) REFERENCES types (id)
+)"""
+
+
+def test_upgrade_adds_columns_and_indexes_to_an_existing_table(app):
+    db.drop_all()
+    db.session.execute(text(ORIGINAL_ARTWORKS))
+    db.session.execute(text("INSERT INTO artworks (id, title) VALUES (1, 'Nighthawks')"))
+    db.session.commit()
+    db.create_all()
+
+    upgrade_schema()
+    upgrade_schema()  # Safe to run again
+    db.session.commit()
+
+    inspector = inspect(db.engine)
+    columns = {column['name'] for column in inspector.get_columns('artworks')}
+    assert set(ADDED_COLUMNS['artworks']) <= columns
+    assert {index.name for index in Artwork.__table__.indexes} <= {index['name'] for index in inspector.get_indexes('artworks')}
+    assert db.session.get(Artwork, 1).content_hash is None
+
+
+# The favorites table as created before it had a unique (user_id, artwork_id) index
+ORIGINAL_FAVORITES = """CREATE TABLE favorites (
+    id INTEGER NOT NULL, user_id INTEGER NOT NULL, artwork_id INTEGER NOT NULL, PRIMARY KEY (id),
+    FOREIGN KEY(user_id) REFERENCES users (id) ON DELETE cascade, FOREIGN KEY(artwork_id) REFERENCES artworks (id) ON DELETE cascade
+)"""
+
+
+def test_upgrade_removes_duplicate_favorites_and_enforces_uniqueness(app):
+    db.drop_all()
+    db.session.execute(text(ORIGINAL_FAVORITES))
+    db.session.execute(text("INSERT INTO favorites (id, user_id, artwork_id) VALUES (1, 1, 10), (2, 1, 10), (3, 1, 11), (4, 2, 10), (5, 1, 10)"))
+    db.session.commit()
+    db.create_all()
+
+    upgrade_schema()
+    db.session.commit()
+
+    rows = db.session.execute(text('SELECT id, user_id, artwork_id FROM favorites ORDER BY id')).fetchall()
+    assert rows == [(1, 1, 10), (3, 1, 11), (4, 2, 10)]
+    assert 'uq_favorites_user_artwork' in {index['name'] for index in inspect(db.engine).get_indexes('favorites')}
+    with pytest.raises(IntegrityError):
+        db.session.execute(text('INSERT INTO favorites (user_id, artwork_id) VALUES (1, 10)'))
+    db.session.rollback()
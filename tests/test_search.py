@@ -0,0 +1,54 @@
+import pytest
+import api
+from conftest import json_response
+from models import Artwork
+from search import search_artworks
+
+
+def payload(artwork_id, title, artist='Claude Monet', description=None):
+    return {'id': artwork_id, 'title': title, 'artist_display': artist, 'artwork_type_title': 'Painting',
+            'classification_titles': ['painting'], 'description': description, 'image_id': None}
+
+
+@pytest.fixture
+def api_calls(monkeypatch):
+    """Requests the app sends to the AIC API, answered with one artwork."""
+    calls = []
+
+    def get(url, params=None, timeout=None):
+        calls.append((url, params))
+        return json_response({'data': [payload(90001, 'Water Lilies from the API')]})
+    monkeypatch.setattr(api.http, 'get', get)
+    api.search_cache.clear()
+    return calls
+
+
+def test_local_index_answers_without_the_api(app, api_calls):
+    Artwork.bulk_upsert([payload(artwork_id, f"Water Lilies {artwork_id}") for artwork_id in range(1, 16)]
+                        + [payload(100, 'The Houses of Parliament', description='<p>Painted after the water lilies.</p>'),
+                           payload(101, 'Nighthawks', artist='Edward Hopper')])
+
+    results = api.fetch_artworks_by_query(query='water lilies')
+
+    assert api_calls == []
+    assert {artwork['id'] for artwork in results} == set(range(1, 16)) | {100}
+    assert results[-1]['id'] == 100  # A description match ranks below title matches
+
+
+def test_too_few_local_hits_fall_back_to_the_api(app, api_calls):
+    Artwork.bulk_upsert([payload(1, 'Water Lilies')])
+
+    results = api.fetch_artworks_by_query(query='water lilies')
+
+    assert len(api_calls) == 1
+    assert api_calls[0][1]['q'] == 'water lilies'
+    assert [artwork['id'] for artwork in results] == [90001]
+    # The API's answer is stored, so the local index finds it next time
+    assert [artwork.id for artwork in search_artworks('lilies api')] == [90001]
+
+
+def test_index_follows_updates(app):
+    Artwork.bulk_upsert([payload(1, 'Water Lilies')])
+    Artwork.bulk_upsert([payload(1, 'Haystacks')])
+    assert search_artworks('lilies') == []
+    assert [artwork.id for artwork in search_artworks('haystacks')] == [1]
@@ -0,0 +1,69 @@
+from models import Artwork, SimilarArtwork, db
+from similar import SIMILAR_PER_ARTWORK, SimilarityIndex
+
+CLUSTERS = {
+    'paintings': {'artwork_type_title': 'Painting', 'place_of_origin': 'France', 'date_start': 1880, 'color': {'h': 220, 's': 80, 'l': 40}},
+    'prints': {'artwork_type_title': 'Print', 'place_of_origin': 'Japan', 'date_start': 1800, 'color': {'h': 10, 's': 90, 'l': 50}},
+    'sculptures': {'artwork_type_title': 'Sculpture', 'place_of_origin': 'Italy', 'date_start': -100, 'color': {'h': 40, 's': 5, 'l': 70}},
+}
+CLUSTER_SIZE = SIMILAR_PER_ARTWORK + 2   # Every neighbor list fills up inside its own cluster
+
+
+def payload(artwork_id, cluster, offset_years):
+    values = CLUSTERS[cluster]
+    date = values['date_start'] + offset_years
+    return {'id': artwork_id, 'title': f"{cluster} {artwork_id}", **values, 'date_start': date, 'date_end': date}
+
+
+def seed_catalog():
+    Artwork.bulk_upsert([payload(100 * i + j, cluster, 10 * j) for i, cluster in enumerate(CLUSTERS, start=1) for j in range(CLUSTER_SIZE)])
+
+
+def neighbors(artwork_id):
+    return [artwork.id for artwork in SimilarArtwork.artworks_for(artwork_id, limit=SIMILAR_PER_ARTWORK)]
+
+
+def computed_at(artwork_id):
+    return db.session.query(SimilarArtwork.computed_at).filter_by(artwork_id=artwork_id).first()[0]
+
+
+def test_neighbors_stay_within_the_closest_features(app):
+    seed_catalog()
+    summary = SimilarityIndex().rebuild_all()
+
+    assert summary['artworks'] == 3 * CLUSTER_SIZE
+    assert neighbors(100)[:3] == [101, 102, 103]  # Nearest dates first
+    assert all(100 <= other < 200 for other in neighbors(100))
+    assert all(300 <= other < 400 for other in neighbors(305))
+
+
+def test_refresh_adds_new_artworks_to_their_neighbors_lists(app):
+    seed_catalog()
+    index = SimilarityIndex()
+    index.rebuild_all()
+    print_computed_at = computed_at(200)
+    assert index.refresh()['stale'] == 0
+
+    Artwork.bulk_upsert([payload(150, 'paintings', 1)])
+    summary = index.refresh()
+
+    assert summary['stale'] == 1
+    assert 0 < summary['affected'] < CLUSTER_SIZE   # Only paintings the new one is closer to than their last neighbor
+    assert neighbors(150)[:2] == [100, 101]
+    assert neighbors(100)[0] == 150
+    assert computed_at(200) == print_computed_at
+
+
+def test_refresh_moves_changed_artworks(app):
+    seed_catalog()
+    index = SimilarityIndex()
+    index.rebuild_all()
+
+    # A print re-cataloged as a painting from France
+    Artwork.bulk_upsert([payload(205, 'paintings', 51)])
+    summary = index.refresh()
+
+    assert summary['stale'] == 1
+    assert neighbors(205)[:2] == [105, 106]
+    assert 205 in neighbors(105)
+    assert 205 not in neighbors(204)
@@ -0,0 +1,52 @@
+import pytest
+import suggest
+from models import Artwork, artworks_ingested
+from suggest import SuggestIndex
+
+
+def payload(artwork_id, title, artist='Claude Monet\nFrench, 1840-1926', artwork_type='Painting'):
+    return {'id': artwork_id, 'title': title, 'artist_display': artist, 'artwork_type_title': artwork_type}
+
+
+@pytest.fixture
+def index(app):
+    """A built index that follows ingests, like the one every worker keeps."""
+    Artwork.bulk_upsert([payload(1, 'Water Lilies'), payload(2, 'The Water Lily Pond'), payload(3, 'Water Lilies'),
+                         payload(4, 'Nighthawks', artist='Edward Hopper\nAmerican, 1882-1967')])
+    index = SuggestIndex()
+    index.build()
+    artworks_ingested.connect(index.on_ingested)
+    yield index
+    artworks_ingested.disconnect(index.on_ingested)
+
+
+def labels(suggestions):
+    return [suggestion['label'] for suggestion in suggestions]
+
+
+def test_prefixes_match_any_word_start_ignoring_case(index):
+    # Heavier labels first: two artworks are titled Water Lilies
+    assert labels(index.suggest('WATER')) == ['Water Lilies', 'The Water Lily Pond']
+    assert labels(index.suggest('  lil ')) == ['Water Lilies', 'The Water Lily Pond']
+    assert index.suggest('mon') == [{'label': 'Claude Monet', 'kind': 'artist'}]
+    assert labels(index.suggest('th')) == ['The Water Lily Pond']  # Stopwords only match as the first word
+    assert index.suggest('the ') == index.suggest('the')
+    assert index.suggest('x') == [] and index.suggest('') == []
+
+
+def test_ingested_artworks_are_suggested(index, monkeypatch):
+    assert index.suggest('nymph') == []
+    index.suggest('wa')
+
+    Artwork.bulk_upsert([payload(5, 'Nymphéas'), payload(6, 'Wanderer above the Sea of Fog', artist='Caspar David Friedrich')])
+
+    assert labels(index.suggest('NYMPH')) == ['Nymphéas']
+    assert 'Wanderer above the Sea of Fog' in labels(index.suggest('wa'))  # Precomputed prefixes and cached results follow
+    assert labels(index.suggest('fog')) == ['Wanderer above the Sea of Fog']
+
+    # Pending keys merged into the sorted keys are still found
+    monkeypatch.setattr(suggest, 'PENDING_LIMIT', 0)
+    Artwork.bulk_upsert([payload(7, 'Haystacks')])
+    assert index.pending == []
+    assert labels(index.suggest('hays')) == ['Haystacks']
+    assert labels(index.suggest('nymph')) == ['Nymphéas']
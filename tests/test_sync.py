@@ -0,0 +1,100 @@
+import json
+from conftest import json_response, load_fixture
+from models import Artwork, SyncCheckpoint, db
+import sync as sync_module
+from sync import CHECKPOINT_NAME, EPOCH, sync
+
+
+class RecordedPages:
+    """Session replaying recorded /search pages, each keyed by the (updated_at, id) keyset it was fetched after."""
+
+    def __init__(self, pages):
+        self.pages = {(page['after']['updated_at'], page['after']['last_id']): page['data'] for page in pages}
+        self.requests = []
+
+    def get(self, url, params=None, timeout=None):
+        should = json.loads(params['params'])['query']['bool']['should']
+        mark = should[0]['range']['updated_at']['gt']
+        last_id = should[1]['bool']['must'][1]['range']['id']['gt']
+        self.requests.append((mark, last_id))
+        if (mark, last_id) not in self.pages:
+            return json_response({'data': []})
+        return json_response({'data': self.pages[(mark, last_id)]})
+
+
+class NoWait:
+    def acquire(self):
+        pass
+
+
+def run_sync(recording, **kwargs):
+    return sync(limit=recording['limit'], api_url='http://api.test', session=RecordedPages(recording['pages']), bucket=NoWait(), **kwargs)
+
+
+def test_keyset_walk_fetches_every_page_once(app):
+    recording = load_fixture('sync_pages.json')
+    session = RecordedPages(recording['pages'])
+
+    summary = sync(limit=recording['limit'], api_url='http://api.test', session=session, bucket=NoWait())
+
+    # Each request resumes after the last (updated_at, id) of the page before, including across timestamp ties
+    assert session.requests == [(page['after']['updated_at'], page['after']['last_id']) for page in recording['pages']]
+    assert summary['complete']
+    assert summary['pages'] == 3
+    assert summary['fetched'] == summary['inserted'] == 7
+    assert Artwork.query.count() == 7
+
+    last = recording['pages'][-1]['data'][-1]
+    assert SyncCheckpoint.load(CHECKPOINT_NAME) == {'updated_at': last['updated_at'], 'last_id': last['id']}
+
+
+def test_interrupted_sync_resumes_from_checkpoint(app):
+    recording = load_fixture('sync_pages.json')
+
+    first = run_sync(recording, max_pages=1)
+    assert not first['complete']
+    assert first['inserted'] == 3
+
+    rest = run_sync(recording)
+    assert rest['complete']
+    assert rest['pages'] == 2
+    assert rest['inserted'] == 4
+    assert Artwork.query.count() == 7
+
+
+def test_unchanged_records_are_skipped(app):
+    recording = load_fixture('sync_pages.json')
+    run_sync(recording)
+    written = {artwork.id: artwork.updated_at for artwork in Artwork.query}
+
+    # The same pages again: every content hash matches, so nothing is written
+    again = run_sync(recording, since=EPOCH)
+    assert again['fetched'] == again['unchanged'] == 7
+    assert again['inserted'] == again['updated'] == 0
+    assert {artwork.id: artwork.updated_at for artwork in Artwork.query} == written
+
+    # One edited record is the only write
+    recording['pages'][1]['data'][0]['title'] = 'Water Lilies (Nymphéas)'
+    edited = run_sync(recording, since=EPOCH)
+    assert edited['updated'] == 1
+    assert edited['unchanged'] == 6
+    assert db.session.get(Artwork, recording['pages'][1]['data'][0]['id']).title == 'Water Lilies (Nymphéas)'
+
+
+def test_failed_save_keeps_the_checkpoint(app, monkeypatch):
+    recording = load_fixture('sync_pages.json')
+    run_sync(recording, max_pages=1)
+    saved = SyncCheckpoint.load(CHECKPOINT_NAME)
+
+    monkeypatch.setattr(sync_module, 'save_artworks', lambda page: {'inserted': 0, 'updated': 0, 'unchanged': 0, 'failed': len(page)})
+    failed = run_sync(recording)
+    assert not failed['complete']
+    assert failed['error']
+    assert failed['pages'] == 0
+    assert SyncCheckpoint.load(CHECKPOINT_NAME) == saved
+
+    # Once saving works again, the sync picks up the same page
+    monkeypatch.undo()
+    resumed = run_sync(recording)
+    assert resumed['complete']
+    assert resumed['inserted'] == 4
@@ -0,0 +1,502 @@
+# Curated, Flask App, July 2024
+# Written by Agamjot Sodhi
+
+# Routes of the app, registered by create_app() in app.py
+
+# Imports:
+from flask import Blueprint, render_template, redirect, session, g, flash, request, url_for, jsonify
+from forms import UserAddForm, UserEditForm, LoginForm, SearchForm, ArtworkTypeForm, ColorForm # WTForms inputs from forms.py
+from models import User, Artwork, Favorite, SearchHistory, ResultSet, IngestJob, SimilarArtwork, db     # SQLA table inputs from models.py
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+import json
+from api import fetch_artwork, fetch_artworks_by_query, get_suggested_artworks
+from sampling import sampler
+from recommend import update_for_favorite
+from categories import type_facets, browse_type
+from facets import parse_filters, filter_artworks, facet_counts, facet_options
+from likes import mark_liked, record_toggle
+from identity import load_identity, remember_identity, forget_identity
+from render_cache import render_artwork_page, artwork_version
+from images import serve_image
+from suggest import suggest
+from http_cache import conditional_page
+from jobs import enqueue_id_range
+import random
+from datetime import datetime
+
+bp = Blueprint('main', __name__)
+
+# Global Variables
+CURR_USER_KEY = "curr_user"
+RESULTS_PER_PAGE = 24
+
+# User Functions ##########################################################################################################################
+
+@bp.before_app_request
+def add_user_to_g():
+    """ If we're logged in, add curr user to Flask global. 
+    Uses the identity cached in the session; the full User row only loads when a route needs it (see identity.py). """
+    
+    g.user = load_identity(session[CURR_USER_KEY]) if CURR_USER_KEY in session else None
+
+def do_login(user):
+    """ Log in user, add to session. """
+    
+    session[CURR_USER_KEY] = user.id
+    remember_identity(user)
+
+def do_logout():
+    """Log out user, delete from session."""
+    
+    if CURR_USER_KEY in session:
+        del session[CURR_USER_KEY]
+    forget_identity()
+
+# User Routes ##############################################################################################################################
+
+@bp.route('/')
+def homepage():
+    """Redirect to the dashboard if logged in otherwise home.html to login/signup."""
+    
+    if g.user:
+        return redirect(url_for('.dashboard'))
+    else:
+        return render_template('home.html')
+      
+@bp.route('/signup', methods=["GET", "POST"])
+def signup():
+    """Handle New User Signup."""
+    
+    # Log out any current user
+    if CURR_USER_KEY in session:
+        del session[CURR_USER_KEY]
+
+    # Call user signup form from forms.py
+    form = UserAddForm()
+    
+    if form.validate_on_submit():
+        try:
+            # Create a new user
+            user = User.signup(
+                username=form.username.data,
+                password=form.password.data,
+                email=form.email.data,
+                first_name=form.first_name.data,
+                image_url=form.image_url.data or User.image_url.default.arg,
+            )
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()  # Handle duplicate username/email error
+            flash("Username or email already taken, please try again!", 'danger')
+            return render_template('users/signup.html', form=form)
+        
+        do_login(user)  # Log in the new user
+        return redirect("/dashboard")
+    
+    return render_template('users/signup.html', form=form)  # Display signup form if not submitted or invalid
+
+@bp.route('/login', methods=["GET", "POST"])
+def login():
+    """Handle User Login."""
+    
+    # Call login form from forms.py
+    form = LoginForm()
+    
+    if form.validate_on_submit():
+        # User.authenticate class method from models.py
+        user = User.authenticate(form.username.data, form.password.data)
+        if user:
+            do_login(user)
+            flash(f"Hello, {user.first_name}!", "success")
+            return redirect("/dashboard")
+        flash("Invalid credentials.", 'danger') # Handle incorrect credentials error
+        
+    return render_template('users/login.html', form=form)  # Display login form if not submitted or invalid
+
+
+@bp.route('/logout')
+def logout():
+    """Handle logout of user."""
+    
+    do_logout()
+    flash("You have successfully logged out.", 'success')
+    return redirect("/login")
+
+# Artwork Routes ##############################################################################################################################
+
+
+""" 
+Route: /dashboard
+
+This route handles the user dashboard page, providing search functionality for artworks. Users can search by query, category, or color. 
+
+- All API handling functions and there descriptions can be found in api.py in the project directory
+- The Chicago Art where the art records obtain from have a 100 artworks per call limit
+- start-id, end-id and batch size help fetch artwork in batches to meet limits """
+
+
+@bp.route('/dashboard', methods=["GET", "POST"])
+def dashboard():
+    """Show user dashboard with search functionality."""
+    
+    # Error handling
+    if not g.user:
+        flash("Access unauthorized. Please log in or create an account.", "danger")
+        return redirect("/home")
+
+    # Initialize forms
+    search_form = SearchForm()
+    type_form = ArtworkTypeForm()
+    color_form = ColorForm()
+    
+    # Populate the artwork type dropdown with category names and counts (cached, see categories.py)
+    type_form.artwork_type.choices = [(name, f"{name} ({count})") for name, count in type_facets()]
+
+    # To hold search results
+    search_results = []
+
+    # Handle Search by Query
+    if search_form.validate_on_submit() and search_form.submit.data:
+        query = search_form.query.data.strip()
+
+        if query:
+            search_results = fetch_artworks_by_query(query=query) # API function from api.py
+            
+        # Fetch artworks in batches in the background worker (see jobs.py) instead of inside this request
+        else:
+            job = enqueue_id_range(start_id=1, end_id=100, batch_size=50)
+            session['ingest_job_id'] = job.id
+            flash("Fetching new artworks in the background - they will appear shortly.", "success")
+            return redirect(url_for('.dashboard'))
+
+        # Saves user search terms - will be used for suggested artworks section
+        # The results themselves are kept as an expiring list of artwork IDs for /results to page through
+        if search_results:
+            SearchHistory.save_history(g.user.id, query)
+            result_set = ResultSet.save(g.user.id, [artwork['id'] for artwork in search_results])
+            session['search_result_id'] = result_set.id
+            return redirect(url_for('.results'))
+        else:
+            # If no artworks are found error handling
+            flash("No artworks found for the given query.", "danger")
+            return redirect(url_for('.dashboard'))
+
+    # Handle Search by Category - drop down menu
+    if type_form.validate_on_submit() and type_form.submit.data:
+        
+        # Get user selected artwork type from form and browse it page by page
+        return redirect(url_for('.category', type=type_form.artwork_type.data))
+
+    # Handle Search by Color
+    if color_form.validate_on_submit() and color_form.submit.data:
+        print("Color Form Submitted")
+        try:
+            # Parse selected color from form data
+            selected_color = json.loads(color_form.color.data)
+        except json.JSONDecodeError:
+            flash("Invalid color data.", "danger")
+            return redirect(url_for('.dashboard'))
+
+        # Rank artworks by perceptual distance to the selected HSL color (see colors.py, imported on first use)
+        from colors import search_by_color
+        try:
+            search_results = search_by_color(selected_color, k=36)
+        except (KeyError, TypeError):
+            flash("Invalid color data.", "danger")
+            return redirect(url_for('.dashboard'))
+
+        if search_results:
+            mark_liked(g.user, search_results)
+            return render_template('art/results.html', search_results=search_results)
+        else:
+            flash("No artworks found for the selected color.", "danger")
+            return redirect(url_for('.dashboard'))
+
+    # Get 4 suggested artworks using the helper function
+    suggested_artworks = get_suggested_artworks(g.user, limit=4)
+    
+    # Fetch 4 random artworks for display on the dashboard
+    random_artworks = sampler.sample(4)
+        
+    
+    mark_liked(g.user, random_artworks, suggested_artworks)
+    return render_template('art/dashboard.html', search_form=search_form, type_form=type_form, color_form=color_form, random_artworks=random_artworks, suggested_artworks=suggested_artworks, ingest_job_id=session.get('ingest_job_id'))
+
+ 
+""" Route: /results
+Returns all results from search bar/ drop down menu and color picker, displays each artwork from the user request. """
+
+@bp.route('/results')
+def results():
+    """Show search results."""
+    
+    query = request.args.get('query')  # Get the query from the search bar in the navbar
+    page = max(request.args.get('page', 1, type=int), 1)
+    
+    if query:
+        search_results = fetch_artworks_by_query(query=query) # Display results
+        if not search_results:
+            flash("No artworks found for the given query.", 'danger')
+            return redirect(url_for('.dashboard'))
+        total = len(search_results)
+        search_results = search_results[(page - 1) * RESULTS_PER_PAGE:page * RESULTS_PER_PAGE]
+    else:
+        search_result_id = session.get('search_result_id')
+        result_set = ResultSet.get_active(search_result_id) if search_result_id else None
+        if not result_set:
+            flash("No search results found.", 'danger')
+            return redirect(url_for('.dashboard'))
+
+        # Load only the current page of artworks with one IN query
+        artwork_ids = result_set.ids()
+        total = len(artwork_ids)
+        search_results = Artwork.get_many(artwork_ids[(page - 1) * RESULTS_PER_PAGE:page * RESULTS_PER_PAGE])
+
+    pages = max((total + RESULTS_PER_PAGE - 1) // RESULTS_PER_PAGE, 1)
+    prev_url = url_for('.results', query=query, page=page - 1) if page > 1 else None
+    next_url = url_for('.results', query=query, page=page + 1) if page < pages else None
+    mark_liked(g.user, search_results)
+    return render_template('art/results.html', search_results=search_results, page_label=f"Page {page} of {pages}", prev_url=prev_url, next_url=next_url)
+
+ 
+""" Route: /search/suggest
+Typeahead for the search bars: returns JSON completions (titles, artists, artwork types) of the ?q= prefix from
+the in-memory index in suggest.py. Types link to their category page, everything else to the search results. """
+
+@bp.route('/search/suggest')
+def search_suggest():
+    """Return typeahead suggestions as JSON."""
+
+    query = request.args.get('q', '')[:100]
+    k = min(max(request.args.get('k', 8, type=int), 1), 20)
+
+    suggestions = [
+        {**suggestion, 'url': url_for('.category', type=suggestion['label']) if suggestion['kind'] == 'type' else url_for('.results', query=suggestion['label'])}
+        for suggestion in suggest(query, k)
+    ]
+    response = jsonify(query=query, suggestions=suggestions)
+    response.cache_control.public = True
+    response.cache_control.max_age = 300  # Same for every user; lets the browser reuse answers while typing and deleting
+    return response
+
+
+""" Route: /category
+Browse one artwork type from the dashboard drop down menu, one keyset page (artworks after the ?after= ID) at a time. """
+
+@bp.route('/category')
+def category():
+    """Show one page of artworks of a category."""
+
+    type_name = request.args.get('type', '')
+    after_id = request.args.get('after', 0, type=int)
+
+    search_results, next_after_id = browse_type(type_name, after_id)
+    if search_results is None:
+        flash("Invalid artwork type selected.", "danger")
+        return redirect(url_for('.dashboard'))
+    if not search_results:
+        flash("No artworks found for the selected category.", "danger")
+        return redirect(url_for('.dashboard'))
+
+    next_url = url_for('.category', type=type_name, after=next_after_id) if next_after_id else None
+    mark_liked(g.user, search_results)
+    return render_template('art/results.html', search_results=search_results, next_url=next_url)
+
+
+""" Route: /browse
+Filter the catalog by any combination of artwork type, classification, place of origin, era and color, with the number
+of artworks behind every facet value (see facets.py). Pages are keyset-paginated like /category (?after= ID). """
+
+@bp.route('/browse')
+def browse():
+    """Show one page of artworks matching the selected filters, next to the facet counts."""
+
+    filters = parse_filters(request.args)
+    after_id = request.args.get('after', 0, type=int)
+
+    search_results, next_after_id = filter_artworks(filters, after_id)
+
+    def filter_url(**changes):
+        """URL of this page with some filters changed (None removes one), starting over at the first page."""
+        return url_for('.browse', **{name: value for name, value in {**filters, **changes}.items() if value is not None})
+
+    facets = {
+        facet: [(label, count, filter_url(**changes), active) for label, count, changes, active in options]
+        for facet, options in facet_options(filters, facet_counts(filters)).items()
+    }
+    next_url = url_for('.browse', **filters, after=next_after_id) if next_after_id else None
+    mark_liked(g.user, search_results)
+    return render_template('art/browse.html', search_results=search_results, filters=filters, facets=facets,
+                           clear_url=url_for('.browse'), next_url=next_url)
+
+
+""" Route: /artwork/<int:artwork_id
+Fetch and display details of a specific artwork by its ID. If the artwork is not found in the database, 
+it fetches the data from an external API, saves it and renders the fetched data. IDs the API doesn't know are remembered for a while.
+Below the details, similar artworks are read from the precomputed neighbors (see similar.py). """
+
+@bp.route('/artwork/<int:artwork_id>')
+def artwork(artwork_id):
+    """Show details of a specific artwork."""
+    
+    artwork = Artwork.query.get(artwork_id)
+    if not artwork:
+        # Fetch (and save) the artwork from the API; concurrent and repeated misses are coalesced in api.py
+        data = fetch_artwork(artwork_id)
+        if not data:
+            flash("Artwork not found.", 'danger')
+            return redirect(url_for('.results'))
+
+        # Render straight from the fetched payload instead of reading the row back
+        artwork = Artwork(**Artwork.normalize(data), updated_at=datetime.utcnow())
+
+    similar = SimilarArtwork.artworks_for(artwork_id)
+
+    # Unchanged pages answer 304 without rendering (see http_cache.py)
+    mark_liked(g.user, [artwork], similar)
+    version = f"{artwork.content_hash or artwork_version(artwork)}:{[(other.id, other.is_liked) for other in similar]}"
+    return conditional_page(version, artwork.updated_at, artwork.is_liked, lambda: render_artwork_page(artwork, similar))
+
+""" Route: /images/<image_id>/<width>.jpg
+Serves an artwork image at one of the widths in images.IMAGE_WIDTHS from the local derivative cache,
+fetching it from the IIIF server on the first request. """
+@bp.route('/images/<image_id>/<int:width>.jpg')
+def image(image_id, width):
+    """Serve a resized artwork image."""
+    
+    return serve_image(image_id, width)
+
+""" Route: /explore
+Displays a page with 36 random artworks and includes a refresh button to load more. 
+The refresh button pages through one seeded shuffle of the catalog, so no artwork repeats until every artwork was shown. """
+@bp.route('/explore')
+def explore():
+    """Display 36 new artworks and a refresh button at the bottom"""
+    seed = request.args.get('seed', type=int)
+    page = request.args.get('page', 0, type=int)
+
+    # Start a new shuffle on the first visit and once the current one is exhausted
+    if seed is None:
+        seed, page = random.getrandbits(31), 0
+    random_artworks, has_more = sampler.shuffled_page(seed, page, 36)
+    next_seed, next_page = (seed, page + 1) if has_more else (random.getrandbits(31), 0)
+    
+    mark_liked(g.user, random_artworks)
+    return render_template('art/explore.html', random_artworks=random_artworks, seed=next_seed, page=next_page)
+
+""" Route: /favorites
+Displays all the artworks favorited by user. Redirects to the homepage if the user is not logged in."""
+@bp.route('/favorites')
+def favorites():
+    """Show all favorited artworks by the user."""
+    
+    if not g.user:
+        flash("Access unauthorized. Please log in or create an account.", "danger")
+        return redirect("/")
+
+    # Query all artworks favorited by the user
+    favorited_artworks = Artwork.query.join(Favorite).filter(Favorite.user_id == g.user.id).all()
+
+    return render_template('art/favorites.html', favorited_artworks=favorited_artworks)
+
+
+""" Route: /artwork/<int:artwork_id>/favorite (POST)
+Toggles the favorite status of an artwork for the logged-in user. 
+Returns a JSON response if artwork was favorited or unfavorited."""
+@bp.route('/artwork/<int:artwork_id>/favorite', methods=['POST'])
+def favorite_artwork(artwork_id):
+    """Toggle favorite status of an artwork asynchronously."""
+    
+    if not g.user:
+        return jsonify({"message": "Unauthorized"}), 401
+
+    # Check if already favorited
+    favorite = Favorite.query.filter_by(user_id=g.user.id, artwork_id=artwork_id).first()
+    
+    if favorite:
+        # If it is already favorited, unfavorite it
+        db.session.delete(favorite)
+        db.session.commit()
+        record_toggle(g.user.id, artwork_id, liked=False)
+        update_for_favorite(g.user.id, artwork_id, liked=False)
+        return jsonify({"message": "Artwork unfavorited successfully!", "liked": False}), 200
+    else:
+        # Otherwise, add to favorites - the unique (user_id, artwork_id) index rejects a concurrent double add
+        try:
+            db.session.add(Favorite(user_id=g.user.id, artwork_id=artwork_id))
+            db.session.commit()
+        except IntegrityError:
+            # Either a concurrent request added it first, or the artwork does not exist (foreign key)
+            db.session.rollback()
+            if Favorite.query.filter_by(user_id=g.user.id, artwork_id=artwork_id).first():
+                return jsonify({"message": "Artwork favorited successfully!", "liked": True}), 200
+            return jsonify({"message": "Artwork not found"}), 404
+        record_toggle(g.user.id, artwork_id, liked=True)
+        update_for_favorite(g.user.id, artwork_id, liked=True)
+        return jsonify({"message": "Artwork favorited successfully!", "liked": True}), 200
+
+
+""" Route: /jobs/<int:job_id>
+Returns the status and progress of the user's own background ingestion job as JSON, polled by the dashboard.
+Once the job is done or failed it is forgotten, so the dashboard stops showing and polling it. """
+@bp.route('/jobs/<int:job_id>')
+def job_status(job_id):
+    """Show the status of an ingestion job."""
+
+    if not g.user:
+        return jsonify({"message": "Unauthorized"}), 401
+    if session.get('ingest_job_id') != job_id:
+        return jsonify({"message": "Job not found"}), 404
+
+    job = IngestJob.query.get_or_404(job_id)
+    if job.status in ('done', 'failed'):
+        session.pop('ingest_job_id', None)
+    return jsonify(job.to_dict())
+
+
+"""Route: /profile
+Displays the user's profile page, including suggested artworks and a preview of their favorited artworks. """
+@bp.route('/profile')
+def profile():
+    """Show profile page."""
+    
+    if not g.user:
+        flash("Access unauthorized. Please log in or create an account.", "danger")
+        return redirect("/")
+    # Get 4 suggested artworks using the helper function
+    suggested_artworks = get_suggested_artworks(g.user, limit=8)
+    
+    # Fetch 4 random favorited artworks for the user
+    favorite_ids = [favorite_id for (favorite_id,) in db.session.query(Favorite.id).filter_by(user_id=g.user.id)]
+    favorite_ids = random.sample(favorite_ids, min(4, len(favorite_ids)))
+    favorites = Favorite.query.filter(Favorite.id.in_(favorite_ids)).options(joinedload(Favorite.artwork)).all()
+
+
+    mark_liked(g.user, suggested_artworks)
+    return render_template('profile/profile.html', user=g.user, suggested_artworks=suggested_artworks, favorites=favorites)
+
+"""Route: /profile/edit
+Allows the user to edit their profile information, including username, email, first name, and profile image."""
+@bp.route('/profile/edit', methods=["GET", "POST"])
+def edit_profile():
+    """Edit user's profile."""
+    
+    if not g.user:
+        flash("Access unauthorized.", "danger")
+        return redirect("/")
+
+    user = g.user.record
+    form = UserEditForm(obj=user)
+
+    if form.validate_on_submit():
+        user.username = form.username.data
+        user.email = form.email.data
+        user.first_name = form.first_name.data
+        user.image_url = form.image_url.data or User.image_url.default.arg
+        db.session.commit()
+        remember_identity(user)  # Refresh the cached identity with the new profile
+        flash("Profile updated successfully.", "success")
+        return redirect(url_for('.profile'))
+
+    return render_template('profile/edit.html', form=form)